@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark building a scene of many cubes with `bpy.ops` and in bulk
+
+With `bpy` installed, times adding `--objects` cubes one `bpy.ops` call at a
+time against `SceneBuilder`, as separate meshes and as instances of one
+mesh. Without it, only the builder's own overhead is timed, against a
+backend that does nothing. The time spent linking, one call per object, and
+setting matrices, one `foreach_set` per batch, is shown on its own
+"""
+# STD LIB imports
+import argparse
+import importlib.util
+import time
+
+import numpy
+
+# Relative imports
+from blenderpy import bulk
+
+CUBE_VERTICES = numpy.array([[x, y, z] for x in (-1, 1) for y in (-1, 1)
+                             for z in (-1, 1)], dtype=numpy.float32)
+
+CUBE_FACES = numpy.array([[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1],
+                          [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]])
+
+class NullBackend():
+    """Accepts everything and does nothing
+    """
+
+    def new_mesh(self, name):
+
+        return name
+
+    def set_geometry(self, *args):
+
+        pass
+
+    def add_material(self, mesh, material):
+
+        pass
+
+    def new_object(self, name, mesh):
+
+        return name
+
+    def set_matrices(self, collection, objects, matrices):
+
+        pass
+
+    def new_collection(self, name, parent):
+
+        return name
+
+    def get_scene_collection(self):
+
+        return None
+
+    def link(self, collection, objects):
+
+        pass
+
+    def update(self):
+
+        pass
+
+def get_transforms(count):
+
+    transforms = numpy.tile(numpy.eye(4, dtype=numpy.float32), (count, 1, 1))
+
+    side = int(numpy.ceil(count ** (1 / 3)))
+
+    index = numpy.arange(count)
+
+    transforms[:, 0, 3] = index % side * 3
+    transforms[:, 1, 3] = index // side % side * 3
+    transforms[:, 2, 3] = index // side // side * 3
+
+    return transforms
+
+def build_with_ops(bpy, transforms):
+
+    for transform in transforms:
+
+        bpy.ops.mesh.primitive_cube_add(location=transform[:3, 3].tolist())
+
+def build_meshes(backend, transforms):
+
+    with bulk.SceneBuilder(backend) as builder:
+
+        builder.add_batch(numpy.broadcast_to(CUBE_VERTICES,
+                                             (len(transforms),) + CUBE_VERTICES.shape),
+                          CUBE_FACES, transforms)
+
+    return builder.stats
+
+def build_instances(backend, transforms):
+
+    with bulk.SceneBuilder(backend) as builder:
+
+        builder.add_objects(builder.add_mesh("Cube", CUBE_VERTICES, CUBE_FACES),
+                            transforms)
+
+    return builder.stats
+
+def print_breakdown(stats):
+
+    print(f"{'':>20}  {stats['link_seconds']:8.3f} s linking in "
+          f"{stats['links']} calls, {stats['matrix_seconds']:8.3f} s setting "
+          f"matrices in {stats['link_batches']} batches")
+
+def clear(bpy):
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--ops-objects", type=int, default=1000,
+                        help="cubes added with bpy.ops, which is too slow for "
+                             "--objects")
+    args = parser.parse_args()
+
+    transforms = get_transforms(args.objects)
+
+    if importlib.util.find_spec("bpy") is None:
+
+        print("bpy is not installed, timing the builder against a backend "
+              "that does nothing")
+
+        for label, build in [("bulk meshes", build_meshes),
+                             ("bulk instances", build_instances)]:
+
+            start = time.perf_counter()
+
+            stats = build(NullBackend(), transforms)
+
+            print(f"{label:>20}: {time.perf_counter() - start:8.3f} s for "
+                  f"{args.objects} objects")
+
+            print_breakdown(stats)
+
+    else:
+
+        import bpy
+
+        clear(bpy)
+
+        start = time.perf_counter()
+
+        build_with_ops(bpy, transforms[:args.ops_objects])
+
+        seconds = time.perf_counter() - start
+
+        print(f"{'bpy.ops':>20}: {seconds:8.3f} s for {args.ops_objects} "
+              f"objects ({seconds / args.ops_objects * 1000:.2f} ms each)")
+
+        for label, build in [("bulk meshes", build_meshes),
+                             ("bulk instances", build_instances)]:
+
+            clear(bpy)
+
+            start = time.perf_counter()
+
+            stats = build(bulk.BpyBackend(bpy), transforms)
+
+            seconds = time.perf_counter() - start
+
+            print(f"{label:>20}: {seconds:8.3f} s for {args.objects} objects "
+                  f"({seconds / args.objects * 1000:.3f} ms each)")
+
+            print_breakdown(stats)
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark the Blender scripts directory lookup over a synthetic prefix
+
+Builds a throwaway interpreter prefix with roughly 100k entries in
+site-packages and times the old unbounded `os.walk`, the pruned search and
+the lookup through the index written by `bpy_post_install`
+"""
+# STD LIB imports
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import timeit
+
+# Relative imports
+import blenderpy
+
+def legacy_find_blender_scripts_directory(search_root):
+    """The lookup as it was before the pruned search, for comparison
+    """
+
+    for _dir, _dirs, _files in os.walk(search_root, followlinks=True):
+
+        if re.match(blenderpy.BLENDER_SCRIPTS_DIR_REGEX, os.path.basename(_dir)) and\
+           all([entry in _dirs for entry in ["datafiles", "scripts"]]):
+
+            return _dir
+
+    return None
+
+def make_prefix(root, entries):
+    """Lay out `entries` files across packages, then the scripts directory
+    """
+
+    site_packages = os.path.join(root, "venv", "lib", "python3.7", "site-packages")
+
+    files_per_package = 50
+
+    for package_index in range(entries // files_per_package):
+
+        package_dir = os.path.join(site_packages, f"package{package_index}", 
+                                   "sub")
+
+        os.makedirs(package_dir)
+
+        for file_index in range(files_per_package):
+
+            open(os.path.join(package_dir, f"module{file_index}.py"), "w").close()
+
+    scripts_dir = os.path.join(site_packages, "2.93")
+
+    for entry in ["datafiles", "scripts"]:
+
+        os.makedirs(os.path.join(scripts_dir, entry))
+
+    return scripts_dir
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bpy-bench-")
+
+    blenderpy.BLENDER_SCRIPTS_INDEX_PATH = os.path.join(root, "index.json")
+
+    try:
+
+        scripts_dir = make_prefix(root, args.entries)
+
+        lookups = {"os.walk": lambda: legacy_find_blender_scripts_directory(root),
+                   "pruned search": lambda: blenderpy.search_blender_scripts_directory(root),
+                   "index": lambda: blenderpy.find_blender_scripts_directory(root)}
+
+        blenderpy.write_blender_scripts_index(scripts_dir)
+
+        for name, lookup in lookups.items():
+
+            assert lookup() == scripts_dir
+
+            best = min(timeit.repeat(lookup, number=1, repeat=args.repeat))
+
+            print(f"{name:>14}: {best * 1000:10.2f} ms")
+
+    finally:
+
+        shutil.rmtree(root)
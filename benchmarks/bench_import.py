@@ -0,0 +1,374 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark importing `bpy` and `bmesh` and starting workers that use them
+
+Every import is timed in a fresh interpreter: the first run (cold, after
+dropping the page cache with `--drop-caches` as root), then `--repeat` warm
+runs. Also measured are where the time goes according to `-X importtime`,
+the resident memory right after the import, the Blender scripts directory
+lookup and the cost per worker of importing `bpy` inside the tasks of a
+`ProcessPoolExecutor`, as `tests/test_concurrent_futures.py` does
+
+The results are printed as JSON, tagged with the installed `bpy` version and
+`--label`/`--configure-args`, so that runs against wheels built from other
+`VERSION`s or configure arguments can be compared with `--compare`. Without
+`bpy` installed, stand-ins for `bpy` and `bmesh` that take
+`--import-seconds` to import are measured instead, or with `--require-bpy`
+the run is skipped
+"""
+# STD LIB imports
+import argparse
+import concurrent.futures
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Relative imports
+import blenderpy
+
+STANDIN_MODULES = {"bpy": """
+import os
+import time
+
+time.sleep(float(os.environ["BPY_STANDIN_IMPORT_SECONDS"]))
+
+MEMORY = bytearray(int(os.environ["BPY_STANDIN_IMPORT_MEGABYTES"]) * 1024 * 1024)
+
+class app():
+
+    version_string = "stand-in"
+""",
+                   "bmesh": """
+import bpy
+"""}
+
+# Runs in a fresh interpreter: imports the modules one after the other and
+# prints the seconds each took and the resident memory after
+PROBE = """
+import json
+import os
+import sys
+import time
+
+seconds = {}
+
+for name in sys.argv[1:]:
+
+    start = time.perf_counter()
+
+    __import__(name)
+
+    seconds[name] = time.perf_counter() - start
+
+try:
+
+    with open("/proc/self/statm", "r") as statm:
+
+        rss = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+except (OSError, ValueError, AttributeError):
+
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * \\
+          (1 if sys.platform == "darwin" else 1024)
+
+app = getattr(sys.modules[sys.argv[1]], "app", None)
+
+print(json.dumps({"seconds": seconds, "rss": rss,
+                  "version": getattr(app, "version_string", None)}))
+"""
+
+IMPORTTIME_REGEX = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def drop_caches() -> bool:
+    """Empty the page cache so the next import reads from disk; root only
+    """
+
+    try:
+
+        os.sync()
+
+        with open("/proc/sys/vm/drop_caches", "w") as drop:
+
+            drop.write("3\n")
+
+        return True
+
+    except (OSError, AttributeError):
+
+        return False
+
+def run_probe(modules, env):
+
+    output = subprocess.run([sys.executable, "-c", PROBE] + modules, env=env,
+                            check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+def summarize(values):
+
+    return {"min": min(values), "median": statistics.median(values),
+            "max": max(values), "runs": len(values)}
+
+def measure_imports(modules, repeat, env, caches_dropped):
+    """Cold and warm import seconds of every module and the RSS after
+    """
+
+    cold = run_probe(modules, env)
+
+    warm = [run_probe(modules, env) for _ in range(repeat)]
+
+    return {"cold": dict(cold["seconds"], caches_dropped=caches_dropped),
+            "warm": {name: summarize([run["seconds"][name] for run in warm])
+                     for name in modules},
+            "rss_after_import": summarize([run["rss"] for run in warm]),
+            "version": cold["version"]}
+
+def parse_importtime(stderr, top):
+    """The modules that took longest to import, from `-X importtime`
+
+    Returns:
+        the total microseconds and the `top` modules by their own time
+    """
+
+    entries = []
+
+    for line in stderr.splitlines():
+
+        match = IMPORTTIME_REGEX.match(line)
+
+        if match:
+
+            entries.append({"module": match.group(4),
+                            "self_us": int(match.group(1)),
+                            "cumulative_us": int(match.group(2)),
+                            "depth": len(match.group(3)) // 2})
+
+    # Top level imports are those the command itself made
+    total = sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0)
+
+    return {"total_us": total,
+            "top": sorted(entries, key=lambda entry: entry["self_us"],
+                          reverse=True)[:top]}
+
+def measure_importtime(modules, env, top):
+
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import " + ", ".join(modules)], env=env, check=True,
+                            stderr=subprocess.PIPE, universal_newlines=True).stderr
+
+    return parse_importtime(stderr, top)
+
+def measure_scripts_lookup(repeat):
+    """The lookup `bpy_post_install` makes, with and without its index
+    """
+
+    search_root = blenderpy.get_python_scripts_directory()
+
+    results = {"search_root": search_root,
+               "found": blenderpy.find_blender_scripts_directory(search_root)}
+
+    for name, use_index in [("indexed", True), ("search", False)]:
+
+        seconds = []
+
+        for _ in range(repeat):
+
+            start = time.perf_counter()
+
+            blenderpy.find_blender_scripts_directory(search_root, use_index=use_index)
+
+            seconds.append(time.perf_counter() - start)
+
+        results[name] = summarize(seconds)
+
+    return results
+
+def import_task(module_name, item):
+
+    importlib.import_module(module_name)
+
+    return item
+
+def noop_task(module_name, item):
+
+    return item
+
+def measure_worker_overhead(module_name, workers, tasks, repeat):
+    """Seconds per worker that importing in the task adds to a batch
+    """
+
+    def batch(task):
+
+        start = time.perf_counter()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+
+            list(executor.map(task, [module_name] * tasks, range(tasks)))
+
+        return time.perf_counter() - start
+
+    baseline = [batch(noop_task) for _ in range(repeat)]
+    importing = [batch(import_task) for _ in range(repeat)]
+
+    return {"workers": workers, "tasks": tasks,
+            "noop_batch": summarize(baseline),
+            "import_batch": summarize(importing),
+            "per_worker": (statistics.median(importing) -
+                           statistics.median(baseline)) / workers}
+
+def get_distribution_version(name):
+
+    try:
+
+        import pkg_resources
+
+        return pkg_resources.get_distribution(name).version
+
+    except Exception:
+
+        return None
+
+def flatten(results, prefix=""):
+    """`{"a": {"b": 1}}` as `{"a.b": 1}`, numbers only
+    """
+
+    flat = {}
+
+    for key, value in results.items():
+
+        if isinstance(value, dict):
+
+            flat.update(flatten(value, f"{prefix}{key}."))
+
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+
+            flat[f"{prefix}{key}"] = value
+
+    return flat
+
+def compare(before_path, after_path):
+
+    with open(before_path, "r") as before_file, open(after_path, "r") as after_file:
+
+        before, after = json.load(before_file), json.load(after_file)
+
+    print(f"{'':40} {before['meta']['label'] or before_path:>16} "
+          f"{after['meta']['label'] or after_path:>16}")
+
+    before, after = flatten(before["results"]), flatten(after["results"])
+
+    for key in sorted(set(before) & set(after)):
+
+        change = f"{(after[key] - before[key]) / before[key]:+8.1%}" if before[key] else ""
+
+        print(f"{key:40} {before[key]:16.6g} {after[key]:16.6g} {change}")
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--top", type=int, default=20,
+                        help="how many modules of the -X importtime breakdown")
+    parser.add_argument("--drop-caches", action="store_true",
+                        help="drop the page cache before the cold import (root)")
+    parser.add_argument("--require-bpy", action="store_true",
+                        help="skip instead of measuring stand-ins without bpy")
+    parser.add_argument("--import-seconds", type=float, default=0.5)
+    parser.add_argument("--import-megabytes", type=int, default=64)
+    parser.add_argument("--label", default=None,
+                        help="tag for the results, e.g. the wheel measured")
+    parser.add_argument("--configure-args", default=None,
+                        help="CMake configure arguments the wheel was built with")
+    parser.add_argument("--output", default=None, help="write the JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two earlier outputs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+
+        compare(*args.compare)
+
+        sys.exit(0)
+
+    standin = importlib.util.find_spec("bpy") is None
+
+    meta = {"label": args.label,
+            "configure_args": args.configure_args,
+            "bpy_distribution": get_distribution_version("bpy"),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "standin": standin,
+            "time": time.time()}
+
+    if standin and args.require_bpy:
+
+        print(json.dumps({"meta": meta, "skipped": "bpy is not installed"}))
+
+        sys.exit(0)
+
+    root = tempfile.mkdtemp(prefix="bpy-bench-")
+
+    env = dict(os.environ)
+
+    if standin:
+
+        for name, source in STANDIN_MODULES.items():
+
+            with open(os.path.join(root, f"{name}.py"), "w") as module:
+
+                module.write(source)
+
+        # Fresh interpreters get the path from the environment, workers from
+        # the parent
+        sys.path.insert(0, root)
+        env["PYTHONPATH"] = os.pathsep.join([root] + [path for path in
+                                                      [env.get("PYTHONPATH")] if path])
+        os.environ["BPY_STANDIN_IMPORT_SECONDS"] = env["BPY_STANDIN_IMPORT_SECONDS"] = \
+                                                   str(args.import_seconds)
+        os.environ["BPY_STANDIN_IMPORT_MEGABYTES"] = env["BPY_STANDIN_IMPORT_MEGABYTES"] = \
+                                                     str(args.import_megabytes)
+
+    try:
+
+        modules = ["bpy", "bmesh"]
+
+        caches_dropped = drop_caches() if args.drop_caches else False
+
+        imports = measure_imports(modules, args.repeat, env, caches_dropped)
+
+        meta["bpy_version"] = imports.pop("version")
+
+        results = {"import": imports,
+                   "importtime": measure_importtime(modules, env, args.top),
+                   "scripts_lookup": measure_scripts_lookup(args.repeat),
+                   "worker_overhead": measure_worker_overhead("bpy", args.workers,
+                                                              args.tasks, args.repeat)}
+
+    finally:
+
+        shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps({"meta": meta, "results": results}, indent=2)
+
+    if args.output:
+
+        with open(args.output, "w") as output_file:
+
+            output_file.write(output)
+
+    print(output)
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark the warm worker pool against importing `bpy` in every task
+
+The naive pattern from `tests/test_concurrent_futures.py` starts a
+`ProcessPoolExecutor` for a batch of work and imports `bpy` inside the task,
+so every batch pays for starting Blender in every worker. The warm pool
+imports it once per worker and is reused across batches. Without `bpy`
+installed, a stand-in module that takes `--import-seconds` to import and
+holds `--import-megabytes` of memory is used instead
+"""
+# STD LIB imports
+import argparse
+import concurrent.futures
+import importlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Relative imports
+from blenderpy import pool
+
+STANDIN_MODULE = """
+import os
+import time
+
+time.sleep(float(os.environ["BPY_STANDIN_IMPORT_SECONDS"]))
+
+MEMORY = bytearray(int(os.environ["BPY_STANDIN_IMPORT_MEGABYTES"]) * 1024 * 1024)
+"""
+
+def naive_task(module_name, item):
+
+    module = importlib.import_module(module_name)
+
+    return item, module.__name__
+
+def warm_task(item):
+
+    return item, pool.get_module().__name__
+
+def run_naive(module_name, batches, tasks, workers):
+
+    for _ in range(batches):
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+
+            list(executor.map(naive_task, [module_name] * tasks, range(tasks)))
+
+def run_warm(module_name, batches, tasks, workers):
+
+    with pool.WarmPool(workers=workers, module=module_name) as warm_pool:
+
+        for _ in range(batches):
+
+            list(warm_pool.map(warm_task, range(tasks)))
+
+    return warm_pool
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default=None,
+                        help="module to import (default: bpy if installed, "
+                             "else the stand-in)")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--import-seconds", type=float, default=1.0)
+    parser.add_argument("--import-megabytes", type=int, default=64)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bpy-bench-")
+
+    module_name = args.module
+
+    if module_name is None and importlib.util.find_spec("bpy") is not None:
+
+        module_name = "bpy"
+
+    if module_name is None:
+
+        module_name = "bpy_standin"
+
+        with open(os.path.join(root, "bpy_standin.py"), "w") as standin:
+
+            standin.write(STANDIN_MODULE)
+
+        # Children get the parent's `sys.path` and environment
+        sys.path.insert(0, root)
+        os.environ["BPY_STANDIN_IMPORT_SECONDS"] = str(args.import_seconds)
+        os.environ["BPY_STANDIN_IMPORT_MEGABYTES"] = str(args.import_megabytes)
+
+    try:
+
+        print(f"{args.batches} batches of {args.tasks} tasks on {args.workers} "
+              f"workers importing {module_name}")
+
+        start = time.perf_counter()
+
+        run_naive(module_name, args.batches, args.tasks, args.workers)
+
+        print(f"{'import per batch':>20}: {time.perf_counter() - start:8.2f} s")
+
+        start = time.perf_counter()
+
+        warm_pool = run_warm(module_name, args.batches, args.tasks, args.workers)
+
+        print(f"{'warm pool':>20}: {time.perf_counter() - start:8.2f} s "
+              f"({warm_pool.stats['workers_started']} workers started)")
+
+    finally:
+
+        shutil.rmtree(root, ignore_errors=True)
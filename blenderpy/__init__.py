@@ -1,93 +1,291 @@
-#! /usr/bin/python
-# -*- coding: utf-8
-"""Installation / uninstallation helper scripts
-"""
-
-import os
-import pathlib
-import platform
-import re
-import sys
-import typing
-from typing import Optional
-
-# Monkey-patch 3.4 and below
-
-if sys.version_info < (3,5):
-
-    def home_path() -> pathlib.Path:
-
-        return pathlib.Path(os.path.expanduser("~"))
-
-    pathlib.Path.home = home_path
-
-BLENDER_SCRIPTS_DIR_PATTERN = r"\d\.\d\d"
-BLENDER_SCRIPTS_DIR_REGEX = re.compile(BLENDER_SCRIPTS_DIR_PATTERN)
-
-EXECUTABLE_DIR = pathlib.Path(sys.executable).parent
-
-BLENDER_SCRIPTS_INSTALL_DIR_LINUX = os.path.join(str(EXECUTABLE_DIR.parent.absolute()), 
-                                                 "lib", "python"+str(sys.version_info[0])+"."+str(sys.version_info[1]), 
-                                                 "site-packages")
-BLENDER_SCRIPTS_INSTALL_DIR_MACOS = os.path.join(str(EXECUTABLE_DIR.parent.absolute()), 
-                                                 "lib", "python"+str(sys.version_info[0])+"."+str(sys.version_info[1]), 
-                                                 "Resources")
-BLENDER_SCRIPTS_INSTALL_DIR_WINDOWS = str(EXECUTABLE_DIR.absolute())
-
-PYTHON_SCRIPTS_DIR_WINDOWS_SYSPYTHON = str(EXECUTABLE_DIR.parent.absolute())
-PYTHON_SCRIPTS_DIR_WINDOWS_VENPYTHON = str(EXECUTABLE_DIR.parent.parent.absolute())
-PYTHON_SCRIPTS_DIR_UNIX = str(EXECUTABLE_DIR.parent.parent.absolute())
-
-SYSTEM_NAME = platform.system()
-
-def find_blender_scripts_directory(search_root: str) -> Optional[str]:
-
-    for _dir, _dirs, _files in os.walk(search_root, followlinks=True):
-
-        if re.match(BLENDER_SCRIPTS_DIR_REGEX, os.path.basename(_dir)) and\
-           all([entry in _dirs for entry in ["datafiles", "scripts"]]):
-
-            return _dir
-
-    return None
-
-def get_python_scripts_directory() -> str:
-    if SYSTEM_NAME in ["Darwin", "Linux"]:
-
-        return PYTHON_SCRIPTS_DIR_UNIX
-
-    elif SYSTEM_NAME == "Windows":
-
-        if os.path.basename(str(EXECUTABLE_DIR)).casefold() \
-           == "scripts".casefold():
-
-           # User is in venv (probably)
-
-           return PYTHON_SCRIPTS_DIR_WINDOWS_VENPYTHON
-
-        else:
-
-            # User is in system python (probably)
-
-            return PYTHON_SCRIPTS_DIR_WINDOWS_SYSPYTHON
-
-    else:
-
-        raise Exception("Cannot determine system type: "+SYSTEM_NAME)
-
-def get_blender_scripts_install_dir() -> str:
-    if SYSTEM_NAME == "Darwin":
-
-        return BLENDER_SCRIPTS_INSTALL_DIR_MACOS
-
-    elif SYSTEM_NAME == "Linux":
-
-        return BLENDER_SCRIPTS_INSTALL_DIR_LINUX
-
-    elif SYSTEM_NAME == "Windows":
-
-        return BLENDER_SCRIPTS_INSTALL_DIR_WINDOWS
-
-    else:
-
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Installation / uninstallation helper scripts
+"""
+
+import collections
+import json
+import os
+import pathlib
+import platform
+import re
+import sys
+import typing
+from typing import Optional
+
+# Monkey-patch 3.4 and below
+
+if sys.version_info < (3,5):
+
+    def home_path() -> pathlib.Path:
+
+        return pathlib.Path(os.path.expanduser("~"))
+
+    pathlib.Path.home = home_path
+
+BLENDER_SCRIPTS_DIR_PATTERN = r"\d\.\d\d"
+BLENDER_SCRIPTS_DIR_REGEX = re.compile(BLENDER_SCRIPTS_DIR_PATTERN)
+
+EXECUTABLE_DIR = pathlib.Path(sys.executable).parent
+
+BLENDER_SCRIPTS_INSTALL_DIR_LINUX = os.path.join(str(EXECUTABLE_DIR.parent.absolute()), 
+                                                 "lib", "python"+str(sys.version_info[0])+"."+str(sys.version_info[1]), 
+                                                 "site-packages")
+BLENDER_SCRIPTS_INSTALL_DIR_MACOS = os.path.join(str(EXECUTABLE_DIR.parent.absolute()), 
+                                                 "lib", "python"+str(sys.version_info[0])+"."+str(sys.version_info[1]), 
+                                                 "Resources")
+BLENDER_SCRIPTS_INSTALL_DIR_WINDOWS = str(EXECUTABLE_DIR.absolute())
+
+PYTHON_SCRIPTS_DIR_WINDOWS_SYSPYTHON = str(EXECUTABLE_DIR.parent.absolute())
+PYTHON_SCRIPTS_DIR_WINDOWS_VENPYTHON = str(EXECUTABLE_DIR.parent.parent.absolute())
+PYTHON_SCRIPTS_DIR_UNIX = str(EXECUTABLE_DIR.parent.parent.absolute())
+
+SYSTEM_NAME = platform.system()
+
+# The Blender scripts directory is always a shallow child of the search root;
+# the search gives up below this many levels
+BLENDER_SCRIPTS_SEARCH_DEPTH = 6
+
+# Directories that never hold the Blender scripts directory; descending into
+# them is what made the old `os.walk` take tens of seconds in large prefixes
+BLENDER_SCRIPTS_SEARCH_PRUNED_NAMES = {"__pycache__", ".git", ".hg", ".svn",
+                                       "node_modules", "include"}
+BLENDER_SCRIPTS_SEARCH_PRUNED_SUFFIXES = (".dist-info", ".egg-info", ".data")
+
+# Pseudo filesystems, only pruned when found at the filesystem root
+BLENDER_SCRIPTS_SEARCH_PRUNED_ROOT_NAMES = {"dev", "proc", "sys"}
+
+# The Blender scripts directory is installed as a direct child of these, so 
+# their children are checked but never descended into
+BLENDER_SCRIPTS_SEARCH_LEAF_PARENTS = {"site-packages", "dist-packages",
+                                       "resources"}
+
+# Written by `bpy_post_install` so later lookups don't need to search at all
+BLENDER_SCRIPTS_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          "blender_scripts_index.json")
+
+# Every file `bpy_post_install` placed, so uninstalling needs no walk either
+BLENDER_SCRIPTS_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             "blender_scripts_manifest.txt")
+
+def is_blender_scripts_directory(path: str) -> bool:
+    """Whether `path` looks like the Blender "version folder"
+
+    That is a folder named like `2.93` holding `datafiles` and `scripts`
+    """
+
+    return bool(re.match(BLENDER_SCRIPTS_DIR_REGEX, os.path.basename(path))) and\
+           all([os.path.isdir(os.path.join(path, entry)) for entry in 
+                ["datafiles", "scripts"]])
+
+def read_blender_scripts_index() -> Optional[str]:
+    """Get the Blender scripts directory recorded by `bpy_post_install`
+
+    Returns `None` when there is no index or the recorded path is stale
+    """
+
+    try:
+
+        with open(BLENDER_SCRIPTS_INDEX_PATH, "r") as index_file:
+
+            scripts_dir = json.load(index_file)["scripts_dir"]
+
+    except (OSError, ValueError, KeyError, TypeError):
+
+        return None
+
+    if isinstance(scripts_dir, str) and is_blender_scripts_directory(scripts_dir):
+
+        return scripts_dir
+
+    return None
+
+def write_blender_scripts_index(scripts_dir: str):
+    """Record where the Blender scripts directory was installed
+    """
+
+    temp_path = BLENDER_SCRIPTS_INDEX_PATH + ".tmp"
+
+    with open(temp_path, "w") as index_file:
+
+        json.dump({"scripts_dir": os.path.abspath(scripts_dir)}, index_file)
+
+    os.replace(temp_path, BLENDER_SCRIPTS_INDEX_PATH)
+
+def read_blender_scripts_manifest() -> Optional[typing.List[str]]:
+    """Paths relative to the Blender scripts directory of every installed file
+    """
+
+    try:
+
+        with open(BLENDER_SCRIPTS_MANIFEST_PATH, "r") as manifest_file:
+
+            return [os.path.normpath(line.rstrip("\n")) for line in 
+                    manifest_file if line.strip()]
+
+    except OSError:
+
+        return None
+
+def write_blender_scripts_manifest(files: typing.Iterable[str]):
+    """Record the files placed in the Blender scripts directory
+    """
+
+    temp_path = BLENDER_SCRIPTS_MANIFEST_PATH + ".tmp"
+
+    with open(temp_path, "w") as manifest_file:
+
+        manifest_file.writelines([_file.replace(os.sep, "/") + "\n" for 
+                                  _file in files])
+
+    os.replace(temp_path, BLENDER_SCRIPTS_MANIFEST_PATH)
+
+def remove_blender_scripts_index():
+    """Forget the recorded Blender scripts directory and its files, if any
+    """
+
+    for path in [BLENDER_SCRIPTS_INDEX_PATH, BLENDER_SCRIPTS_MANIFEST_PATH]:
+
+        if os.path.isfile(path):
+
+            os.remove(path)
+
+def _is_within(path: str, root: str) -> bool:
+
+    path = os.path.normcase(os.path.abspath(path))
+    root = os.path.normcase(os.path.abspath(root))
+
+    try:
+
+        return os.path.commonpath([path, root]) == root
+
+    except ValueError: # Different drives on Windows
+
+        return False
+
+def _is_pruned(entry: os.DirEntry, at_filesystem_root: bool) -> bool:
+
+    return entry.name in BLENDER_SCRIPTS_SEARCH_PRUNED_NAMES or\
+           entry.name.endswith(BLENDER_SCRIPTS_SEARCH_PRUNED_SUFFIXES) or\
+           (at_filesystem_root and 
+            entry.name in BLENDER_SCRIPTS_SEARCH_PRUNED_ROOT_NAMES)
+
+def search_blender_scripts_directory(search_root: str, 
+                                     max_depth: int = BLENDER_SCRIPTS_SEARCH_DEPTH) -> Optional[str]:
+    """Breadth-first search for the Blender scripts directory under `search_root`
+
+    Symlinks are followed, but every directory is visited at most once so 
+    link cycles cannot trap the search
+    """
+
+    visited = set()
+    pending = collections.deque([(search_root, 0)])
+
+    while pending:
+
+        _dir, depth = pending.popleft()
+
+        try:
+
+            _stat = os.stat(_dir)
+
+        except OSError:
+
+            continue
+
+        if (_stat.st_dev, _stat.st_ino) in visited:
+
+            continue
+
+        visited.add((_stat.st_dev, _stat.st_ino))
+
+        descend = depth + 1 < max_depth and \
+                  os.path.basename(_dir).casefold() not in \
+                  BLENDER_SCRIPTS_SEARCH_LEAF_PARENTS
+
+        try:
+
+            with os.scandir(_dir) as entries:
+
+                subdirs = [entry for entry in entries if 
+                           entry.is_dir(follow_symlinks=True)]
+
+        except OSError:
+
+            continue
+
+        for entry in subdirs:
+
+            if re.match(BLENDER_SCRIPTS_DIR_REGEX, entry.name) and\
+               is_blender_scripts_directory(entry.path):
+
+                return entry.path
+
+        if descend:
+
+            at_filesystem_root = os.path.dirname(os.path.abspath(_dir)) == \
+                                 os.path.abspath(_dir)
+
+            pending.extend([(entry.path, depth + 1) for entry in subdirs if
+                            not _is_pruned(entry, at_filesystem_root)])
+
+    return None
+
+def find_blender_scripts_directory(search_root: str, 
+                                   use_index: bool = True) -> Optional[str]:
+    """Get the Blender scripts directory inside `search_root`
+
+    The location recorded by `bpy_post_install` is used when it is still 
+    valid, otherwise the directory is searched for
+    """
+
+    if use_index:
+
+        scripts_dir = read_blender_scripts_index()
+
+        if scripts_dir is not None and _is_within(scripts_dir, search_root):
+
+            return scripts_dir
+
+    return search_blender_scripts_directory(search_root)
+
+def get_python_scripts_directory() -> str:
+    if SYSTEM_NAME in ["Darwin", "Linux"]:
+
+        return PYTHON_SCRIPTS_DIR_UNIX
+
+    elif SYSTEM_NAME == "Windows":
+
+        if os.path.basename(str(EXECUTABLE_DIR)).casefold() \
+           == "scripts".casefold():
+
+           # User is in venv (probably)
+
+           return PYTHON_SCRIPTS_DIR_WINDOWS_VENPYTHON
+
+        else:
+
+            # User is in system python (probably)
+
+            return PYTHON_SCRIPTS_DIR_WINDOWS_SYSPYTHON
+
+    else:
+
+        raise Exception("Cannot determine system type: "+SYSTEM_NAME)
+
+def get_blender_scripts_install_dir() -> str:
+    if SYSTEM_NAME == "Darwin":
+
+        return BLENDER_SCRIPTS_INSTALL_DIR_MACOS
+
+    elif SYSTEM_NAME == "Linux":
+
+        return BLENDER_SCRIPTS_INSTALL_DIR_LINUX
+
+    elif SYSTEM_NAME == "Windows":
+
+        return BLENDER_SCRIPTS_INSTALL_DIR_WINDOWS
+
+    else:
+
         raise Exception("Cannot determine system type: "+SYSTEM_NAME)
\ No newline at end of file
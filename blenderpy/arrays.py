@@ -0,0 +1,346 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""numpy arrays of `bpy` collection properties, without Python loops
+
+Wraps `foreach_get` and `foreach_set` with the shape and dtype every common
+property needs, reads several collections at once into one array, and takes
+the arrays from a pool of buffers so that reading the same property again
+allocates nothing. An array from the pool is only valid until the next read
+under the same key; pass `out` or copy it to keep it
+"""
+
+import collections
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy
+
+# Components and dtype of common properties; `foreach_get` wants float32 for
+# float properties, int32 for integer ones and bool for booleans
+PROPERTY_LAYOUTS = {"co": ((3,), numpy.float32),
+                    "normal": ((3,), numpy.float32),
+                    "uv": ((2,), numpy.float32),
+                    "color": ((4,), numpy.float32),
+                    "vertex_index": ((), numpy.int32),
+                    "vertices": ((3,), numpy.int32), # of triangles and edges
+                    "material_index": ((), numpy.int32),
+                    "select": ((), numpy.bool_),
+                    "hide": ((), numpy.bool_),
+                    "location": ((3,), numpy.float32),
+                    "rotation_euler": ((3,), numpy.float32),
+                    "scale": ((3,), numpy.float32),
+                    "matrix_world": ((4, 4), numpy.float32)}
+
+# Stored column by column in Blender; indexed row by row like `mathutils`
+MATRIX_PROPERTIES = {"matrix_world", "matrix_local", "matrix_basis",
+                     "matrix_parent_inverse"}
+
+def get_layout(attribute: str, components: Optional[Tuple[int, ...]] = None,
+               dtype=None) -> Tuple[Tuple[int, ...], numpy.dtype]:
+    """Shape of one item and dtype of `attribute`
+    """
+
+    default_components, default_dtype = PROPERTY_LAYOUTS.get(
+        attribute, ((4, 4), numpy.float32) if attribute in MATRIX_PROPERTIES else
+                   ((), numpy.float32))
+
+    return (tuple(components) if components is not None else default_components,
+            numpy.dtype(dtype if dtype is not None else default_dtype))
+
+class BufferPool():
+    """One growing buffer per key and dtype, handed out as views
+    """
+
+    # How much a buffer grows past what is asked, so that slowly growing
+    # meshes don't allocate on every read
+    GROWTH = 1.5
+
+    def __init__(self):
+
+        self._buffers = {} # type: Dict[Tuple[str, str], numpy.ndarray]
+
+        self.stats = collections.Counter()
+
+    def get(self, key: str, shape: Tuple[int, ...], dtype) -> numpy.ndarray:
+
+        dtype = numpy.dtype(dtype)
+
+        size = int(numpy.prod(shape))
+
+        buffer = self._buffers.get((key, dtype.str))
+
+        if buffer is None or buffer.size < size:
+
+            buffer = numpy.empty(size if buffer is None else
+                                 max(size, int(buffer.size * self.GROWTH)), dtype)
+
+            self._buffers[(key, dtype.str)] = buffer
+
+            self.stats["allocations"] += 1
+
+        else:
+
+            self.stats["reuses"] += 1
+
+        return buffer[:size].reshape(shape)
+
+    def clear(self):
+
+        self._buffers.clear()
+
+    @property
+    def nbytes(self) -> int:
+
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+DEFAULT_POOL = BufferPool()
+
+def _flat(array: numpy.ndarray) -> numpy.ndarray:
+
+    if not array.flags["C_CONTIGUOUS"]:
+
+        raise ValueError("foreach_get and foreach_set need a contiguous array")
+
+    return array.reshape(-1)
+
+def get_array(collection, attribute: str, out: Optional[numpy.ndarray] = None,
+              components: Optional[Tuple[int, ...]] = None, dtype=None,
+              pool: Optional[BufferPool] = None,
+              key: Optional[str] = None) -> numpy.ndarray:
+    """`attribute` of every item in `collection`, shaped `(len, *components)`
+
+    Matrices come back indexed `[item, row, column]`. Without `out` the array
+    is a view of a pool buffer, reused by the next read under `key` (the
+    attribute by default)
+    """
+
+    components, dtype = get_layout(attribute, components, dtype)
+
+    shape = (len(collection),) + components
+
+    if out is None:
+
+        out = (pool or DEFAULT_POOL).get(key or attribute, shape, dtype)
+
+    elif out.shape != shape or out.dtype != dtype:
+
+        raise ValueError(f"out has shape {out.shape} and dtype {out.dtype}, "
+                         f"{attribute} needs {shape} and {dtype}")
+
+    collection.foreach_get(attribute, _flat(out))
+
+    if attribute in MATRIX_PROPERTIES:
+
+        return out.transpose(0, 2, 1)
+
+    return out
+
+def set_array(collection, attribute: str, values: numpy.ndarray,
+              components: Optional[Tuple[int, ...]] = None, dtype=None,
+              pool: Optional[BufferPool] = None, key: Optional[str] = None):
+    """Set `attribute` of every item in `collection` from `values`
+
+    `values` is converted into a pool buffer when it isn't contiguous or of
+    the right dtype, or holds matrices
+    """
+
+    components, dtype = get_layout(attribute, components, dtype)
+
+    shape = (len(collection),) + components
+
+    values = numpy.asarray(values)
+
+    if attribute in MATRIX_PROPERTIES:
+
+        buffer = (pool or DEFAULT_POOL).get(key or attribute, shape, dtype)
+
+        buffer[...] = values.reshape(shape).transpose(0, 2, 1)
+
+        values = buffer
+
+    elif values.dtype != dtype or not values.flags["C_CONTIGUOUS"]:
+
+        buffer = (pool or DEFAULT_POOL).get(key or attribute, shape, dtype)
+
+        buffer[...] = values.reshape(shape)
+
+        values = buffer
+
+    collection.foreach_set(attribute, _flat(values))
+
+def get_offsets(collections: Sequence) -> numpy.ndarray:
+    """Where each collection starts in the arrays of `get_many`, plus the end
+    """
+
+    offsets = numpy.zeros(len(collections) + 1, dtype=numpy.int64)
+
+    numpy.cumsum([len(collection) for collection in collections], out=offsets[1:])
+
+    return offsets
+
+def get_many(collections: Sequence, attribute: str,
+             components: Optional[Tuple[int, ...]] = None, dtype=None,
+             pool: Optional[BufferPool] = None,
+             key: Optional[str] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """`attribute` of the items of several collections, one after the other
+
+    Returns:
+        one array for all of them and the offsets where each one starts, so
+        that collection `i` is `array[offsets[i]:offsets[i + 1]]`
+    """
+
+    components, dtype = get_layout(attribute, components, dtype)
+
+    offsets = get_offsets(collections)
+
+    out = (pool or DEFAULT_POOL).get(key or f"{attribute}[]",
+                                     (int(offsets[-1]),) + components, dtype)
+
+    for index, collection in enumerate(collections):
+
+        # A slice of a contiguous array is contiguous, so this reads in place
+        collection.foreach_get(attribute, _flat(out[offsets[index]:offsets[index + 1]]))
+
+    if attribute in MATRIX_PROPERTIES:
+
+        return out.transpose(0, 2, 1), offsets
+
+    return out, offsets
+
+def set_many(collections: Sequence, attribute: str, values: numpy.ndarray,
+             components: Optional[Tuple[int, ...]] = None, dtype=None,
+             pool: Optional[BufferPool] = None, key: Optional[str] = None):
+    """Set `attribute` of several collections from one array, laid out as
+    `get_many` returns it
+    """
+
+    components, dtype = get_layout(attribute, components, dtype)
+
+    offsets = get_offsets(collections)
+
+    shape = (int(offsets[-1]),) + components
+
+    values = numpy.asarray(values)
+
+    if attribute in MATRIX_PROPERTIES or values.dtype != dtype or \
+       not values.flags["C_CONTIGUOUS"]:
+
+        buffer = (pool or DEFAULT_POOL).get(key or f"{attribute}[]", shape, dtype)
+
+        buffer[...] = values.reshape(shape).transpose(0, 2, 1) if \
+                      attribute in MATRIX_PROPERTIES else values.reshape(shape)
+
+        values = buffer
+
+    for index, collection in enumerate(collections):
+
+        collection.foreach_set(attribute, _flat(values[offsets[index]:offsets[index + 1]]))
+
+def get_coordinates(mesh, out: Optional[numpy.ndarray] = None,
+                    pool: Optional[BufferPool] = None) -> numpy.ndarray:
+    """Vertex coordinates of `mesh`, `(vertices, 3)`
+    """
+
+    return get_array(mesh.vertices, "co", out=out, pool=pool)
+
+def set_coordinates(mesh, values: numpy.ndarray, pool: Optional[BufferPool] = None):
+
+    set_array(mesh.vertices, "co", values, pool=pool)
+
+def get_normals(mesh, out: Optional[numpy.ndarray] = None,
+                pool: Optional[BufferPool] = None) -> numpy.ndarray:
+    """Vertex normals of `mesh`, `(vertices, 3)`
+    """
+
+    return get_array(mesh.vertices, "normal", out=out, pool=pool)
+
+def get_uvs(mesh, layer: Optional[str] = None, out: Optional[numpy.ndarray] = None,
+            pool: Optional[BufferPool] = None) -> numpy.ndarray:
+    """UVs of every loop of `mesh` in `layer` (the active one by default),
+    `(loops, 2)`
+    """
+
+    uv_layer = mesh.uv_layers[layer] if layer is not None else mesh.uv_layers.active
+
+    return get_array(uv_layer.data, "uv", out=out, pool=pool)
+
+def set_uvs(mesh, values: numpy.ndarray, layer: Optional[str] = None,
+            pool: Optional[BufferPool] = None):
+
+    uv_layer = mesh.uv_layers[layer] if layer is not None else mesh.uv_layers.active
+
+    set_array(uv_layer.data, "uv", values, pool=pool)
+
+def get_colors(mesh, layer: Optional[str] = None, out: Optional[numpy.ndarray] = None,
+               pool: Optional[BufferPool] = None) -> numpy.ndarray:
+    """RGBA of every loop of `mesh` in the color `layer` (the active one by
+    default), `(loops, 4)`
+    """
+
+    color_layer = mesh.vertex_colors[layer] if layer is not None else \
+                  mesh.vertex_colors.active
+
+    return get_array(color_layer.data, "color", out=out, pool=pool)
+
+def set_colors(mesh, values: numpy.ndarray, layer: Optional[str] = None,
+               pool: Optional[BufferPool] = None):
+
+    color_layer = mesh.vertex_colors[layer] if layer is not None else \
+                  mesh.vertex_colors.active
+
+    set_array(color_layer.data, "color", values, pool=pool)
+
+def _as_collection(objects: Iterable):
+    """`objects` as something with `foreach_get`; a plain list of objects
+    is read one by one
+    """
+
+    return objects if hasattr(objects, "foreach_get") else _ObjectList(list(objects))
+
+class _ObjectList():
+    """`foreach_get` and `foreach_set` over a list of `bpy` objects
+    """
+
+    def __init__(self, objects: List):
+
+        self.objects = objects
+
+    def __len__(self) -> int:
+
+        return len(self.objects)
+
+    def foreach_get(self, attribute: str, buffer: numpy.ndarray):
+
+        rows = buffer.reshape(len(self.objects), -1)
+
+        for row, _object in zip(rows, self.objects):
+
+            value = getattr(_object, attribute)
+
+            # Column by column, as `foreach_get` lays matrices out
+            row[...] = numpy.asarray(value, dtype=buffer.dtype).T.reshape(-1) if \
+                       attribute in MATRIX_PROPERTIES else \
+                       numpy.asarray(value, dtype=buffer.dtype).reshape(-1)
+
+    def foreach_set(self, attribute: str, buffer: numpy.ndarray):
+
+        rows = buffer.reshape(len(self.objects), -1)
+
+        for row, _object in zip(rows, self.objects):
+
+            setattr(_object, attribute, row.reshape(4, 4).T.tolist() if
+                    attribute in MATRIX_PROPERTIES else row.tolist())
+
+def get_matrices(objects: Iterable, attribute: str = "matrix_world",
+                 pool: Optional[BufferPool] = None) -> numpy.ndarray:
+    """World matrices of many objects, `(objects, 4, 4)` indexed by row
+
+    `objects` is best a `bpy` collection such as `bpy.data.objects` or
+    `collection.objects`, which are read in one call
+    """
+
+    return get_array(_as_collection(objects), attribute, pool=pool)
+
+def set_matrices(objects: Iterable, values: numpy.ndarray,
+                 attribute: str = "matrix_world", pool: Optional[BufferPool] = None):
+
+    set_array(_as_collection(objects), attribute, values, pool=pool)
@@ -0,0 +1,212 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Local cache of built Blender `bin` trees
+
+Compiling Blender takes a long time; when nothing that affects the output has
+changed the `bin` tree from a previous build is restored instead
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import sysconfig
+import time
+from typing import Dict, List, Optional
+
+# Relative imports
+from blenderpy.fileops import file_sha256
+
+BUILD_CACHE_DIR_ENV = "BLENDERPY_BUILD_CACHE"
+BUILD_CACHE_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                       "blenderpy", "builds")
+
+# Gigabytes, a single Blender `bin` tree is usually a few hundred megabytes
+BUILD_CACHE_DEFAULT_SIZE_LIMIT = 10
+
+BUILD_CACHE_MANIFEST_NAME = "manifest.json"
+BUILD_CACHE_TREE_NAME = "bin"
+
+def get_default_build_cache_dir() -> str:
+
+    return os.environ.get(BUILD_CACHE_DIR_ENV, BUILD_CACHE_DEFAULT_DIR)
+
+def hash_tree(root: str) -> Dict[str, List]:
+    """Map every file below `root` to its size and sha256
+
+    Paths are relative to `root` and always use forward slashes
+    """
+
+    result = {}
+
+    for _dir, _dirs, _files in os.walk(root):
+
+        for _file in _files:
+
+            path = os.path.join(_dir, _file)
+
+            result[os.path.relpath(path, root).replace(os.sep, "/")] = \
+                [os.path.getsize(path), file_sha256(path)]
+
+    return result
+
+def get_build_cache_key(version: str, cmake_configure_args: List[str]) -> str:
+    """Key a build by everything that changes the binaries it produces
+    """
+
+    key_data = {"version": version,
+                "abi": sysconfig.get_config_var("EXT_SUFFIX") or
+                       sys.implementation.cache_tag,
+                "python": list(sys.version_info[:2]),
+                "platform": sysconfig.get_platform(),
+                "cmake_configure_args": list(cmake_configure_args)}
+
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True)
+                                     .encode("utf-8")).hexdigest()
+
+class BuildCache():
+    """A size-limited, least-recently-used store of built `bin` trees
+
+    Every entry is a folder named by its key holding the tree and a manifest
+    of the hashes of its files. The manifest's modification time is the
+    entry's last use
+    """
+
+    def __init__(self, root: Optional[str] = None,
+                 size_limit: float = BUILD_CACHE_DEFAULT_SIZE_LIMIT):
+
+        self.root = root if root is not None else get_default_build_cache_dir()
+
+        self.size_limit = int(size_limit * 1024 ** 3)
+
+    def entry_path(self, key: str) -> str:
+
+        return os.path.join(self.root, key)
+
+    def read_manifest(self, key: str) -> Optional[dict]:
+
+        try:
+
+            with open(os.path.join(self.entry_path(key),
+                                   BUILD_CACHE_MANIFEST_NAME), "r") as manifest:
+
+                return json.load(manifest)
+
+        except (OSError, ValueError):
+
+            return None
+
+    def restore(self, key: str, destination: str) -> bool:
+        """Copy the cached tree for `key` to `destination`
+
+        The copy is checked against the entry's manifest; a corrupted entry
+        is dropped from the cache and reported as a miss
+        """
+
+        manifest = self.read_manifest(key)
+
+        if manifest is None:
+
+            return False
+
+        if os.path.exists(destination):
+
+            shutil.rmtree(destination)
+
+        shutil.copytree(os.path.join(self.entry_path(key),
+                                     BUILD_CACHE_TREE_NAME), destination)
+
+        if hash_tree(destination) != manifest["files"]:
+
+            shutil.rmtree(destination)
+
+            self.remove(key)
+
+            return False
+
+        # Mark as most recently used
+
+        os.utime(os.path.join(self.entry_path(key), BUILD_CACHE_MANIFEST_NAME))
+
+        return True
+
+    def store(self, key: str, source: str):
+        """Add the tree at `source` to the cache under `key`
+
+        The entry is assembled in a temporary folder and renamed into place,
+        so an interrupted store never leaves a half-written entry behind
+        """
+
+        os.makedirs(self.root, exist_ok=True)
+
+        temp_path = os.path.join(self.root, f".{key}.{os.getpid()}.tmp")
+
+        if os.path.exists(temp_path):
+
+            shutil.rmtree(temp_path)
+
+        shutil.copytree(source, os.path.join(temp_path, BUILD_CACHE_TREE_NAME))
+
+        files = hash_tree(os.path.join(temp_path, BUILD_CACHE_TREE_NAME))
+
+        with open(os.path.join(temp_path, BUILD_CACHE_MANIFEST_NAME),
+                  "w") as manifest:
+
+            json.dump({"key": key, "created": time.time(),
+                       "size": sum([entry[0] for entry in files.values()]),
+                       "files": files}, manifest)
+
+        self.remove(key)
+
+        os.rename(temp_path, self.entry_path(key))
+
+        self.evict()
+
+    def remove(self, key: str):
+
+        if os.path.isdir(self.entry_path(key)):
+
+            shutil.rmtree(self.entry_path(key))
+
+    def entries(self) -> List[str]:
+        """Keys of complete entries, least recently used first
+        """
+
+        if not os.path.isdir(self.root):
+
+            return []
+
+        keys = [key for key in os.listdir(self.root) if not key.startswith(".")
+                and os.path.isfile(os.path.join(self.entry_path(key),
+                                                BUILD_CACHE_MANIFEST_NAME))]
+
+        return sorted(keys, key=lambda _key: os.path.getmtime(
+                          os.path.join(self.entry_path(_key),
+                                       BUILD_CACHE_MANIFEST_NAME)))
+
+    def size(self) -> int:
+
+        return sum([(self.read_manifest(key) or {}).get("size", 0) for key in
+                    self.entries()])
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its limit
+        """
+
+        entries = self.entries()
+
+        sizes = {key: (self.read_manifest(key) or {}).get("size", 0) for key in
+                 entries}
+
+        total = sum(sizes.values())
+
+        for key in entries:
+
+            if total <= self.size_limit:
+
+                break
+
+            self.remove(key)
+
+            total -= sizes[key]
@@ -0,0 +1,234 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Host-aware settings for compiling Blender
+
+Picks the number of compile jobs, a separate (smaller) number of link jobs,
+the CMake generator and a compiler cache from the cores and memory available,
+then applies them to the commands from `bpybuild.make.get_make_commands`
+"""
+
+import os
+import platform
+import re
+import shutil
+from typing import Callable, Dict, List, Optional
+
+BUILD_PROFILE_AUTO = "auto"
+BUILD_PROFILE_LOW_MEMORY = "low-memory"
+BUILD_PROFILE_MAX = "max"
+
+BUILD_PROFILES = [BUILD_PROFILE_AUTO, BUILD_PROFILE_LOW_MEMORY, BUILD_PROFILE_MAX]
+
+# Rough peak memory of one job while building Blender, in bytes; linking the
+# python module is by far the most expensive step
+COMPILE_JOB_MEMORY = int(1.5 * 1024 ** 3)
+LINK_JOB_MEMORY = 8 * 1024 ** 3
+
+COMPILER_LAUNCHERS = ["ccache", "sccache"]
+
+CMAKE_GENERATOR_PATTERN = r"^CMAKE_GENERATOR:INTERNAL=(.*)$"
+CMAKE_GENERATOR_REGEX = re.compile(CMAKE_GENERATOR_PATTERN, re.MULTILINE)
+
+def get_cpu_count() -> int:
+    """Cores this process may run on, which can be fewer than the machine has
+    """
+
+    if hasattr(os, "sched_getaffinity"):
+
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+def get_available_memory() -> Optional[int]:
+    """Memory available for new work in bytes, `None` if it can't be told
+    """
+
+    try:
+
+        with open("/proc/meminfo", "r") as meminfo:
+
+            for line in meminfo:
+
+                if line.startswith("MemAvailable:"):
+
+                    return int(line.split()[1]) * 1024
+
+    except (OSError, ValueError):
+
+        pass
+
+    try:
+
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+    except (AttributeError, ValueError, OSError):
+
+        return None
+
+def get_cmake_cache_generator(build_path: str) -> Optional[str]:
+    """The generator an existing build folder was configured with
+
+    CMake refuses to switch generators in a configured folder
+    """
+
+    try:
+
+        with open(os.path.join(build_path, "CMakeCache.txt"), "r") as cmake_cache:
+
+            match = CMAKE_GENERATOR_REGEX.search(cmake_cache.read())
+
+    except OSError:
+
+        return None
+
+    return match.group(1).strip() if match else None
+
+class BuildProfile():
+    """The chosen settings, and how they change the build commands
+    """
+
+    def __init__(self, name: str, jobs: int, link_jobs: int,
+                 generator: Optional[str] = None, launcher: Optional[str] = None,
+                 cpu_count: Optional[int] = None, memory: Optional[int] = None):
+
+        self.name = name
+        self.jobs = jobs
+        self.link_jobs = link_jobs
+        self.generator = generator
+        self.launcher = launcher
+        self.cpu_count = cpu_count
+        self.memory = memory
+
+    def to_dict(self) -> Dict:
+
+        return {"name": self.name, "jobs": self.jobs, "link_jobs": self.link_jobs,
+                "generator": self.generator, "launcher": self.launcher,
+                "cpu_count": self.cpu_count, "memory": self.memory}
+
+    def __str__(self) -> str:
+
+        return (f"{self.name} profile: {self.jobs} compile jobs, "
+                f"{self.link_jobs} link jobs, generator "
+                f"{self.generator or 'default'}, compiler launcher "
+                f"{self.launcher or 'none'}")
+
+    def configure_args(self) -> List[str]:
+
+        args = []
+
+        if self.generator is not None:
+
+            args += ["-G", self.generator]
+
+        # Only Ninja knows job pools; other generators can't limit linking
+        if self.generator == "Ninja":
+
+            args += [f"-DCMAKE_JOB_POOLS=compile={self.jobs};link={self.link_jobs}",
+                     "-DCMAKE_JOB_POOL_COMPILE=compile",
+                     "-DCMAKE_JOB_POOL_LINK=link"]
+
+        if self.launcher is not None:
+
+            args += [f"-DCMAKE_C_COMPILER_LAUNCHER={self.launcher}",
+                     f"-DCMAKE_CXX_COMPILER_LAUNCHER={self.launcher}"]
+
+        return args
+
+    def apply(self, commands: List[List[str]]) -> List[List[str]]:
+        """Adjust the configure and build commands from `bpybuild`
+
+        `bpybuild` configures with `cmake ... -S<source> -B<build>` and builds
+        with `make -C <build> install`, or `cmake --build <build> ...` on
+        Windows
+        """
+
+        result = []
+
+        for command in commands:
+
+            command = [arg for arg in command if arg != ""]
+
+            if command[0] == "cmake" and "--build" not in command:
+
+                args = self.configure_args()
+
+                if "-G" in command: # bpybuild picked Visual Studio already
+
+                    args = args[2:] if self.generator is not None else args
+
+                command = command[:1] + args + command[1:]
+
+            elif command[0] == "make" and self.generator == "Ninja":
+
+                command = ["cmake", "--build", command[command.index("-C") + 1],
+                           "--target", "install", "--parallel", str(self.jobs)]
+
+            elif command[0] == "make":
+
+                command = command[:1] + ["-j", str(self.jobs)] + command[1:]
+
+            elif command[0] == "cmake":
+
+                command = command + ["--parallel", str(self.jobs)]
+
+            result.append(command)
+
+        return result
+
+def get_build_profile(name: str = BUILD_PROFILE_AUTO, jobs: Optional[int] = None,
+                      build_path: Optional[str] = None,
+                      cpu_count: Optional[int] = None, memory: Optional[int] = None,
+                      which: Callable[[str], Optional[str]] = shutil.which) -> BuildProfile:
+    """Choose build settings for this host
+
+    `auto` runs as many compile jobs as there are cores and memory for;
+    `low-memory` halves the memory budget and links one at a time; `max`
+    uses every core regardless of memory. `jobs` overrides the compile jobs
+    """
+
+    if name not in BUILD_PROFILES:
+
+        raise Exception(f"Unknown build profile {name}, "
+                        f"choose one of {', '.join(BUILD_PROFILES)}")
+
+    cpu_count = cpu_count if cpu_count is not None else get_cpu_count()
+    memory = memory if memory is not None else get_available_memory()
+
+    # Without knowing the memory, assume enough for every core
+    memory_budget = memory if memory is not None else \
+                    cpu_count * max(COMPILE_JOB_MEMORY, LINK_JOB_MEMORY)
+
+    if name == BUILD_PROFILE_LOW_MEMORY:
+
+        memory_budget //= 2
+
+    compile_jobs = cpu_count if name == BUILD_PROFILE_MAX else \
+                   min(cpu_count, memory_budget // COMPILE_JOB_MEMORY)
+
+    link_jobs = 1 if name == BUILD_PROFILE_LOW_MEMORY else \
+                memory_budget // LINK_JOB_MEMORY
+
+    compile_jobs = max(1, jobs if jobs is not None else compile_jobs)
+    link_jobs = max(1, min(compile_jobs, link_jobs))
+
+    generator = None
+
+    # Visual Studio is chosen by bpybuild on Windows
+    if platform.system() != "Windows" and which("ninja") is not None:
+
+        generator = "Ninja"
+
+    if build_path is not None and \
+       get_cmake_cache_generator(build_path) not in [None, generator]:
+
+        generator = get_cmake_cache_generator(build_path)
+
+        if generator not in ["Ninja", "Unix Makefiles"]:
+
+            generator = None
+
+    launcher = next((launcher for launcher in COMPILER_LAUNCHERS if
+                     which(launcher) is not None), None)
+
+    return BuildProfile(name, compile_jobs, link_jobs, generator, launcher,
+                        cpu_count, memory)
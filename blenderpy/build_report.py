@@ -0,0 +1,182 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Timing and resource usage of the phases of a wheel build
+
+Every phase records wall time, CPU time (this process and its children), the
+peak RSS of child processes and the bytes written, so slow phases can be
+found and regressions compared between Blender versions
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+try:
+
+    import resource
+
+except ImportError: # Windows
+
+    resource = None
+
+BUILD_REPORT_SUFFIX = ".build-report.json"
+
+# `ru_maxrss` is in kilobytes everywhere but macOS, where it is in bytes
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# Accounted output is counted in 512 byte blocks
+BLOCK_SIZE = 512
+
+def _read_self_bytes_written() -> Optional[int]:
+
+    try:
+
+        with open("/proc/self/io", "r") as io_file:
+
+            for line in io_file:
+
+                if line.startswith("wchar:"):
+
+                    return int(line.split()[1])
+
+    except (OSError, ValueError):
+
+        pass
+
+    return None
+
+def _snapshot() -> Dict[str, Optional[float]]:
+
+    snapshot = {"wall_time": time.perf_counter(),
+                "cpu_time": time.process_time(),
+                "child_peak_rss": None,
+                "bytes_written": _read_self_bytes_written()}
+
+    if resource is not None:
+
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        snapshot["cpu_time"] += children.ru_utime + children.ru_stime
+        snapshot["child_peak_rss"] = children.ru_maxrss * MAXRSS_SCALE
+
+        # Children can't be read from /proc once they have exited, so their
+        # writes are estimated from their block output count
+        snapshot["bytes_written"] = (snapshot["bytes_written"] or 0) +\
+                                    children.ru_oublock * BLOCK_SIZE
+
+    return snapshot
+
+class PhaseTimer():
+    """Measures one phase of the build, either as a context manager or
+    through `start` and `stop`
+    """
+
+    def __init__(self, report: "BuildReport", name: str, **details):
+
+        self.report = report
+        self.name = name
+        self.details = details
+        self.parent = None
+        self._start = None
+
+    def start(self) -> "PhaseTimer":
+
+        self.parent = self.report.current_phase()
+        self.report._active.append(self)
+        self._start = _snapshot()
+
+        return self
+
+    def stop(self):
+
+        end = _snapshot()
+
+        if self in self.report._active:
+
+            self.report._active.remove(self)
+
+        result = {"name": self.name, "parent": self.parent,
+                  "started": self._start["wall_time"] - self.report.created}
+
+        for measure in ["wall_time", "cpu_time", "bytes_written"]:
+
+            if end[measure] is None or self._start[measure] is None:
+
+                result[measure] = None
+
+            else:
+
+                result[measure] = end[measure] - self._start[measure]
+
+        # The peak RSS of children can only be read as a high water mark over
+        # every child so far; it is reported when this phase raised it
+        result["child_peak_rss"] = end["child_peak_rss"] if\
+                                   end["child_peak_rss"] is not None and\
+                                   end["child_peak_rss"] > \
+                                   (self._start["child_peak_rss"] or 0) else\
+                                   None
+
+        result.update(self.details)
+
+        self.report.phases.append(result)
+
+    def __enter__(self) -> "PhaseTimer":
+
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.stop()
+
+class BuildReport():
+    """The collected phases of one build, written out as JSON
+
+    Phases are listed in the order they finished; `started` is the offset in
+    seconds from the creation of the report
+    """
+
+    def __init__(self):
+
+        self.metadata = {}
+        self.phases = []
+        self.created = time.perf_counter()
+        self._active = []
+
+    def current_phase(self) -> Optional[str]:
+
+        return self._active[-1].name if self._active else None
+
+    def phase(self, name: str, **details) -> PhaseTimer:
+
+        return PhaseTimer(self, name, **details)
+
+    def to_dict(self) -> dict:
+
+        return {"metadata": self.metadata, "phases": self.phases}
+
+    def write(self, path: str):
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with open(path, "w") as report_file:
+
+            json.dump(self.to_dict(), report_file, indent=2)
+
+def get_build_report_path(dist_dir: str, wheel_name: str) -> str:
+    """The report of the wheel `wheel_name` (its file name without `.whl`),
+    next to it in `dist_dir`
+    """
+
+    return os.path.join(dist_dir, wheel_name + BUILD_REPORT_SUFFIX)
+
+def get_build_report(distribution) -> BuildReport:
+    """The report shared by every command of `distribution`
+    """
+
+    if getattr(distribution, "build_report", None) is None:
+
+        distribution.build_report = BuildReport()
+
+    return distribution.build_report
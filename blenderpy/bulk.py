@@ -0,0 +1,348 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Build scenes with thousands of objects through `bpy.data`
+
+Every `bpy.ops` call that adds an object updates the view layer and evaluates
+the dependency graph, so adding objects one operator at a time gets slower
+with every object in the scene. `SceneBuilder` creates meshes from numpy
+arrays with `foreach_set`, creates objects and links them through `bpy.data`,
+which updates nothing, and updates the view layer once when it's done.
+Objects are still created and linked one call each, since `bpy` has no call
+that does either for many at once; their matrices are set with one
+`foreach_set` per batch of links
+
+Blender is only reached through a backend; `BpyBackend` is the real one and
+tests pass a fake one
+"""
+
+import collections
+import time
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy
+
+# Relative imports
+from blenderpy import arrays
+
+Faces = Union[numpy.ndarray, Tuple[numpy.ndarray, numpy.ndarray]]
+
+def get_loops(faces: Faces) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Polygon loop starts, loop totals and the vertex of every loop
+
+    `faces` is either an `(faces, corners)` array where all faces have as
+    many corners, or a pair of the corners of every face and all of their
+    vertex indices one after the other
+    """
+
+    if isinstance(faces, tuple):
+
+        loop_totals, loop_vertices = faces
+
+        loop_totals = numpy.asarray(loop_totals, dtype=numpy.int32)
+        loop_vertices = numpy.asarray(loop_vertices, dtype=numpy.int32).reshape(-1)
+
+    else:
+
+        faces = numpy.asarray(faces, dtype=numpy.int32)
+
+        if faces.ndim != 2:
+
+            raise ValueError(f"faces has shape {faces.shape}, expected "
+                             f"(faces, corners)")
+
+        loop_totals = numpy.full(len(faces), faces.shape[1], dtype=numpy.int32)
+        loop_vertices = faces.reshape(-1)
+
+    if int(loop_totals.sum()) != len(loop_vertices):
+
+        raise ValueError(f"{len(loop_vertices)} face vertices for faces with "
+                         f"{int(loop_totals.sum())} corners")
+
+    loop_starts = numpy.zeros(len(loop_totals), dtype=numpy.int32)
+
+    numpy.cumsum(loop_totals[:-1], out=loop_starts[1:])
+
+    return loop_starts, loop_totals, loop_vertices
+
+class BpyBackend():
+    """What `SceneBuilder` does in Blender, one method per kind of change
+    """
+
+    def __init__(self, bpy):
+
+        self.bpy = bpy
+
+    def new_mesh(self, name: str):
+
+        return self.bpy.data.meshes.new(name)
+
+    def set_geometry(self, mesh, vertices: numpy.ndarray, loop_starts: numpy.ndarray,
+                     loop_totals: numpy.ndarray, loop_vertices: numpy.ndarray,
+                     material_indices: Optional[numpy.ndarray]):
+
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set("co", vertices.reshape(-1))
+
+        mesh.loops.add(len(loop_vertices))
+        mesh.loops.foreach_set("vertex_index", loop_vertices)
+
+        mesh.polygons.add(len(loop_starts))
+        mesh.polygons.foreach_set("loop_start", loop_starts)
+        mesh.polygons.foreach_set("loop_total", loop_totals)
+
+        if material_indices is not None:
+
+            mesh.polygons.foreach_set("material_index", material_indices)
+
+        # Derives the edges; this updates the mesh only, not the scene
+        mesh.update(calc_edges=True)
+
+    def add_material(self, mesh, material):
+
+        mesh.materials.append(material)
+
+    def new_object(self, name: str, mesh):
+
+        return self.bpy.data.objects.new(name, mesh)
+
+    def set_matrices(self, collection, objects: List, matrices: numpy.ndarray):
+        """`matrix_world` of `objects`, just linked into `collection`
+
+        `foreach_set` only works on a whole collection, so the matrices of
+        the objects linked before them are read and written back as well
+        """
+
+        linked = collection.objects
+
+        if len(linked) > len(objects):
+
+            every = arrays.get_matrices(linked, pool=arrays.BufferPool())
+
+            every[len(linked) - len(objects):] = matrices
+
+            matrices = every
+
+        arrays.set_matrices(linked, matrices)
+
+    def new_collection(self, name: str, parent):
+
+        collection = self.bpy.data.collections.new(name)
+
+        parent.children.link(collection)
+
+        return collection
+
+    def get_scene_collection(self):
+
+        return self.bpy.context.scene.collection
+
+    def link(self, collection, objects: List):
+        """One `link` call per object; there is no call for many
+        """
+
+        link = collection.objects.link
+
+        for _object in objects:
+
+            link(_object)
+
+    def update(self):
+
+        self.bpy.context.view_layer.update()
+
+class SceneBuilder():
+    """Adds meshes and objects in batches, then updates the scene once
+
+    Use as a context manager, or call `finish` when done; until then the
+    new objects are in `bpy.data` but not evaluated
+    """
+
+    def __init__(self, backend, collection=None, link_batch_size: int = 1000):
+
+        self.backend = backend
+        self.collection = collection
+        self.link_batch_size = link_batch_size
+
+        self.stats = collections.Counter()
+
+        # id of a collection -> the collection, the objects to link into it
+        # and their matrices
+        self._unlinked = collections.OrderedDict()
+
+        self._started = time.perf_counter()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+
+        if exc_type is None:
+
+            self.finish()
+
+    def _get_collection(self, collection):
+
+        if collection is not None:
+
+            return collection
+
+        if self.collection is None:
+
+            self.collection = self.backend.get_scene_collection()
+
+        return self.collection
+
+    def new_collection(self, name: str, parent=None):
+
+        self.stats["collections"] += 1
+
+        return self.backend.new_collection(name, self._get_collection(parent))
+
+    def add_mesh(self, name: str, vertices: numpy.ndarray, faces: Faces,
+                 material_indices: Optional[numpy.ndarray] = None,
+                 materials: Sequence = ()):
+        """A mesh from `(vertices, 3)` coordinates and faces, see `get_loops`
+        """
+
+        vertices = numpy.ascontiguousarray(vertices, dtype=numpy.float32)
+
+        if vertices.ndim != 2 or vertices.shape[1] != 3:
+
+            raise ValueError(f"vertices has shape {vertices.shape}, expected "
+                             f"(vertices, 3)")
+
+        loop_starts, loop_totals, loop_vertices = get_loops(faces)
+
+        if len(loop_vertices) and (loop_vertices.min() < 0 or
+                                   loop_vertices.max() >= len(vertices)):
+
+            raise ValueError(f"faces refer to vertices outside of the "
+                             f"{len(vertices)} given")
+
+        if material_indices is not None:
+
+            material_indices = numpy.ascontiguousarray(material_indices,
+                                                       dtype=numpy.int32)
+
+            if len(material_indices) != len(loop_starts):
+
+                raise ValueError(f"{len(material_indices)} material indices "
+                                 f"for {len(loop_starts)} faces")
+
+        mesh = self.backend.new_mesh(name)
+
+        self.backend.set_geometry(mesh, vertices, loop_starts, loop_totals,
+                                  loop_vertices, material_indices)
+
+        for material in materials:
+
+            self.backend.add_material(mesh, material)
+
+        self.stats["meshes"] += 1
+        self.stats["vertices"] += len(vertices)
+        self.stats["faces"] += len(loop_starts)
+
+        return mesh
+
+    def add_objects(self, meshes, transforms: numpy.ndarray,
+                    name: str = "Object", collection=None) -> List:
+        """One object per `(4, 4)` transform, indexed by row like `mathutils`
+
+        `meshes` is one mesh shared by all the objects, i.e. instances, or
+        one mesh per object. The transforms are set once the objects are
+        linked
+        """
+
+        transforms = numpy.asarray(transforms, dtype=numpy.float32).reshape(-1, 4, 4)
+
+        if isinstance(meshes, (list, tuple)):
+
+            if len(meshes) != len(transforms):
+
+                raise ValueError(f"{len(meshes)} meshes for {len(transforms)} "
+                                 f"transforms")
+
+        else:
+
+            meshes = [meshes] * len(transforms)
+
+        objects = [self.backend.new_object(f"{name}.{self.stats['objects'] + index:06d}",
+                                           mesh) for index, mesh in enumerate(meshes)]
+
+        self.stats["objects"] += len(objects)
+
+        collection = self._get_collection(collection)
+
+        _, unlinked, matrices = self._unlinked.setdefault(id(collection),
+                                                          (collection, [], []))
+
+        unlinked.extend(objects)
+        matrices.append(transforms)
+
+        if len(unlinked) >= self.link_batch_size:
+
+            self._link()
+
+        return objects
+
+    def add_batch(self, vertices: numpy.ndarray, faces: Faces,
+                  transforms: Optional[numpy.ndarray] = None,
+                  material_indices: Optional[numpy.ndarray] = None,
+                  materials: Sequence = (), name: str = "Object",
+                  collection=None) -> List:
+        """Many objects whose meshes share a topology
+
+        `vertices` is `(objects, vertices, 3)`, one mesh each; `faces` and
+        `material_indices` are those of every mesh. `transforms` default to
+        the identity
+        """
+
+        vertices = numpy.asarray(vertices, dtype=numpy.float32)
+
+        if vertices.ndim != 3:
+
+            raise ValueError(f"vertices has shape {vertices.shape}, expected "
+                             f"(objects, vertices, 3)")
+
+        if transforms is None:
+
+            transforms = numpy.broadcast_to(numpy.eye(4, dtype=numpy.float32),
+                                            (len(vertices), 4, 4))
+
+        meshes = [self.add_mesh(f"{name}.{self.stats['meshes']:06d}", mesh_vertices,
+                                faces, material_indices, materials) for
+                  mesh_vertices in vertices]
+
+        return self.add_objects(meshes, transforms, name=name, collection=collection)
+
+    def _link(self):
+
+        for collection, unlinked, matrices in self._unlinked.values():
+
+            started = time.perf_counter()
+
+            self.backend.link(collection, unlinked)
+
+            linked = time.perf_counter()
+
+            self.backend.set_matrices(collection, unlinked, numpy.concatenate(matrices))
+
+            self.stats["link_seconds"] += linked - started
+            self.stats["matrix_seconds"] += time.perf_counter() - linked
+            self.stats["links"] += len(unlinked)
+            self.stats["link_batches"] += 1
+
+        self._unlinked.clear()
+
+    def finish(self):
+        """Link what's left and update the scene, once
+        """
+
+        self._link()
+
+        self.backend.update()
+
+        self.stats["updates"] += 1
+
+        self.stats["seconds"] = time.perf_counter() - self._started
@@ -0,0 +1,161 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Cached resolution of the Blender versions compatible with this interpreter
+
+`bpybuild.sources.get_compatible_sources` lists every Blender tag in `git` and
+every library folder in `svn`, which takes minutes. The result only depends on
+the operating system, the Python version and the bitness, so it is kept on
+disk and reused until it expires; in offline mode it is used however old
+"""
+
+import json
+import os
+import platform
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pkg_resources
+
+COMPATIBILITY_CACHE_DIR_ENV = "BLENDERPY_COMPATIBILITY_CACHE"
+COMPATIBILITY_CACHE_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                               "blenderpy", "compatibility")
+
+# Hours, new Blender releases don't appear more often than that
+COMPATIBILITY_CACHE_DEFAULT_TTL = 24
+
+BITNESS = struct.calcsize("P") * 8
+
+def get_default_compatibility_cache_dir() -> str:
+
+    return os.environ.get(COMPATIBILITY_CACHE_DIR_ENV,
+                          COMPATIBILITY_CACHE_DEFAULT_DIR)
+
+def get_compatibility_key() -> str:
+    """What the compatible versions depend on: os, Python version and bitness
+    """
+
+    return (f"{platform.system()}-py{sys.version_info[0]}.{sys.version_info[1]}-"
+            f"{BITNESS}bit").lower()
+
+def describe_sources(compatible_sources: Dict[Any, Tuple[List, List]]) -> Dict[str, dict]:
+    """Turn `bpybuild` repository objects into plain descriptors
+
+    `BlenderGit` is described by its url and tag, `BlenderSvn` by its url
+    """
+
+    return {str(version): {"git": [{"url": _git.BASE_URL, "tag": _git.tag} for
+                                   _git in gits],
+                           "svn": [{"url": _svn.url} for _svn in svns]}
+            for version, (gits, svns) in compatible_sources.items()}
+
+class CompatibilityCacheError(Exception):
+    """Raised when offline and nothing has been resolved before
+    """
+
+    pass
+
+class CompatibilityCache():
+    """The compatible versions resolved before, one file per compatibility key
+    """
+
+    def __init__(self, root: Optional[str] = None,
+                 ttl: float = COMPATIBILITY_CACHE_DEFAULT_TTL,
+                 offline: bool = False):
+
+        self.root = root if root is not None else get_default_compatibility_cache_dir()
+
+        self.ttl = ttl * 3600
+
+        self.offline = offline
+
+    @property
+    def path(self) -> str:
+
+        return os.path.join(self.root, f"compatible-sources-"
+                                       f"{get_compatibility_key()}.json")
+
+    def load(self) -> Optional[Dict[str, dict]]:
+        """The cached descriptors, or `None` if missing or expired
+        """
+
+        try:
+
+            with open(self.path, "r") as cache_file:
+
+                cached = json.load(cache_file)
+
+            if not self.offline and time.time() - cached["created"] > self.ttl:
+
+                return None
+
+            return cached["versions"]
+
+        except (OSError, ValueError, KeyError, TypeError):
+
+            return None
+
+    def store(self, versions: Dict[str, dict]):
+
+        os.makedirs(self.root, exist_ok=True)
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+
+        with open(temp_path, "w") as cache_file:
+
+            json.dump({"created": time.time(), "key": get_compatibility_key(),
+                       "versions": versions}, cache_file, indent=2)
+
+        os.replace(temp_path, self.path)
+
+    def resolve(self, resolve: Callable[[], Dict[Any, Tuple[List, List]]]) -> Dict[str, dict]:
+        """The cached descriptors, calling `resolve` only when there are none
+        """
+
+        versions = self.load()
+
+        if versions is not None:
+
+            return versions
+
+        if self.offline:
+
+            raise CompatibilityCacheError(f"No compatible Blender versions cached "
+                                          f"in {self.path} and offline")
+
+        versions = describe_sources(resolve())
+
+        self.store(versions)
+
+        return versions
+
+def get_compatible_sources(cache: CompatibilityCache,
+                           resolve: Callable[[], Dict[Any, Tuple[List, List]]],
+                           git_factory: Callable[[str], Any],
+                           svn_factory: Callable[[str], Any]) -> Dict[Any, Tuple[List, List]]:
+    """Drop-in for `bpybuild.sources.get_compatible_sources` that uses `cache`
+
+    `git_factory` builds a `BlenderGit` from a tag and `svn_factory` a
+    `BlenderSvn` from a url, neither of which goes online
+    """
+
+    result = {}
+
+    for version, descriptors in cache.resolve(resolve).items():
+
+        gits = []
+
+        for descriptor in descriptors["git"]:
+
+            _git = git_factory(descriptor["tag"])
+
+            _git.BASE_URL = descriptor["url"]
+
+            gits.append(_git)
+
+        result[pkg_resources.parse_version(version)] = \
+            (gits, [svn_factory(descriptor["url"]) for descriptor in
+                    descriptors["svn"]])
+
+    return result
@@ -0,0 +1,603 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""A resident daemon that keeps `bpy` workers warm for short-lived tools
+
+Tools that `import bpy` themselves pay seconds of startup on every run. The
+daemon holds a `WarmPool` and takes jobs over a Unix socket instead, so a
+tool only pays for connecting and sending a line of JSON
+
+Every request and every reply is one line of JSON. A request names an `op`
+and an `id` that comes back on every reply to it:
+
+    {"id": 1, "op": "run", "target": "package.module:function",
+     "args": [...], "kwargs": {...}, "timeout": 60}
+    {"id": 2, "op": "health"}
+    {"id": 3, "op": "drain"}
+
+A `run` is answered with an `accepted` event, a `progress` event for every
+`blenderpy.pool.report_progress` of the job, then a `result` or an `error`.
+`drain` stops taking jobs, waits for those running and stops the daemon, as
+does SIGTERM
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Relative imports
+from blenderpy.pool import DEFAULT_MODULE, WarmPool
+
+# Lines of JSON can hold whole arrays of results
+STREAM_LIMIT = 64 * 1024 * 1024
+
+class DaemonError(Exception):
+    """Raised when the daemon can't start or refuses a request
+    """
+
+    pass
+
+def get_socket_dir() -> str:
+    """The folder of the daemon's socket: `$XDG_RUNTIME_DIR`, which is only
+    open to its user, else a folder of the user's own in the temporary folder
+    """
+
+    return os.environ.get("XDG_RUNTIME_DIR") or \
+           os.path.join(tempfile.gettempdir(),
+                        f"blenderpy-{os.getuid() if hasattr(os, 'getuid') else 0}")
+
+def get_socket_path() -> str:
+    """The per user socket the daemon listens on by default
+    """
+
+    return os.environ.get("BPY_DAEMON_SOCKET") or \
+           os.path.join(get_socket_dir(), "blenderpy-daemon.sock")
+
+def _check_socket_dir(socket_path: str, create: bool = False):
+    """Refuse a socket in the shared temporary folder unless its folder is
+    the user's own, so no other user can put a socket there first
+    """
+
+    directory = os.path.dirname(os.path.abspath(socket_path))
+
+    if os.environ.get("XDG_RUNTIME_DIR") or directory != get_socket_dir():
+
+        return
+
+    if create:
+
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    try:
+
+        stat = os.lstat(directory)
+
+    except FileNotFoundError:
+
+        return
+
+    if not os.path.isdir(directory) or os.path.islink(directory) or \
+       stat.st_mode & 0o077 or \
+       (hasattr(os, "getuid") and stat.st_uid != os.getuid()):
+
+        raise DaemonError(f"{directory} isn't a folder private to this user")
+
+def call_target(target: str, args: List, kwargs: Dict) -> Any:
+    """Runs in a worker: import `module:function` and call it
+    """
+
+    module_name, _, function_name = target.partition(":")
+
+    function = importlib.import_module(module_name)
+
+    for attribute in function_name.split("."):
+
+        function = getattr(function, attribute)
+
+    return function(*args, **kwargs)
+
+def _remove_stale_socket(path: str):
+    """Remove the socket of a daemon that died, refuse to replace a live one
+    """
+
+    if not os.path.exists(path):
+
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+
+        probe.connect(path)
+
+    except (ConnectionRefusedError, FileNotFoundError):
+
+        os.remove(path)
+
+        return
+
+    finally:
+
+        probe.close()
+
+    raise DaemonError(f"A daemon is running on {path} already")
+
+class Daemon():
+    """Serves `pool` on the Unix socket `socket_path`
+
+    Only targets in modules starting with one of `allowed` run, when given.
+    Without it any `module:function` runs, `os:system` included, for anyone
+    who can connect; the socket itself is only open to the user running the
+    daemon, so that is no more than that user can do anyway
+    """
+
+    def __init__(self, pool: WarmPool, socket_path: Optional[str] = None,
+                 allowed: Optional[Iterable[str]] = None):
+
+        self.pool = pool
+        self.socket_path = socket_path or get_socket_path()
+        self.allowed = tuple(allowed) if allowed else None
+
+        self.draining = False
+        self.running = 0
+
+        self.started = time.time()
+
+        self._server = None
+        self._connections = {} # handler task -> its writer
+        self._requests = set()
+        self._idle = None
+        self._stopped = None
+
+    def is_allowed(self, target: str) -> bool:
+
+        module_name = target.partition(":")[0]
+
+        return self.allowed is None or any(module_name == prefix or
+                                           module_name.startswith(prefix + ".")
+                                           for prefix in self.allowed)
+
+    def health(self) -> Dict[str, Any]:
+
+        pool_health = self.pool.health()
+
+        return {"status": "draining" if self.draining else "ok",
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started,
+                "workers": pool_health["workers"],
+                "ready": pool_health["ready"],
+                "pending": pool_health["pending"],
+                "running": self.running,
+                "stats": pool_health["stats"]}
+
+    async def serve(self):
+        """Listen until drained
+        """
+
+        _check_socket_dir(self.socket_path, create=True)
+
+        _remove_stale_socket(self.socket_path)
+
+        loop = asyncio.get_event_loop()
+
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stopped = asyncio.Event()
+
+        # Created private, so no other user can connect in between
+        old_umask = os.umask(0o177)
+
+        try:
+
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           path=self.socket_path,
+                                                           limit=STREAM_LIMIT)
+
+        finally:
+
+            os.umask(old_umask)
+
+        # Signals only reach the main thread
+        signals = (signal.SIGTERM, signal.SIGINT) if \
+                  threading.current_thread() is threading.main_thread() else ()
+
+        for signum in signals:
+
+            loop.add_signal_handler(signum, self.drain)
+
+        try:
+
+            await self._stopped.wait()
+
+        finally:
+
+            for signum in signals:
+
+                loop.remove_signal_handler(signum)
+
+            self._server.close()
+
+            await self._server.wait_closed()
+
+            # Answer the drain requests, then let clients that are still
+            # connected see the end of the stream
+            if self._requests:
+
+                await asyncio.wait(list(self._requests), timeout=5)
+
+            for writer in self._connections.values():
+
+                writer.close()
+
+            if self._connections:
+
+                await asyncio.wait(list(self._connections), timeout=5)
+
+            try:
+
+                os.remove(self.socket_path)
+
+            except FileNotFoundError:
+
+                pass
+
+    def drain(self):
+        """Stop taking jobs and stop once the running ones are done
+        """
+
+        if self.draining:
+
+            return
+
+        self.draining = True
+
+        asyncio.ensure_future(self._stop_when_idle())
+
+    async def _stop_when_idle(self):
+
+        await self._idle.wait()
+
+        await asyncio.get_event_loop().run_in_executor(None, self.pool.shutdown)
+
+        self._stopped.set()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        self._connections[asyncio.current_task()] = writer
+
+        requests = set()
+
+        def reply(message: Dict[str, Any]):
+
+            if writer.is_closing():
+
+                return
+
+            try:
+
+                line = json.dumps(message)
+
+            except (TypeError, ValueError) as e:
+
+                line = json.dumps({"id": message.get("id"), "event": "error",
+                                   "type": type(e).__name__,
+                                   "message": f"Can't send the result: {e}"})
+
+            writer.write(line.encode("utf-8") + b"\n")
+
+        try:
+
+            while True:
+
+                line = await reader.readline()
+
+                if not line:
+
+                    break
+
+                try:
+
+                    request = json.loads(line)
+
+                except ValueError as e:
+
+                    reply({"id": None, "event": "error", "type": "ValueError",
+                           "message": f"Not a JSON request: {e}"})
+
+                    continue
+
+                if not isinstance(request, dict):
+
+                    reply({"id": None, "event": "error", "type": "ValueError",
+                           "message": f"Not a JSON object: {request!r}"})
+
+                    continue
+
+                task = asyncio.ensure_future(self._request(request, reply))
+
+                task.add_done_callback(self._requests.discard)
+
+                self._requests.add(task)
+                requests.add(task)
+
+                requests = {request for request in requests if not request.done()}
+
+            # Answer what was asked before the client stopped writing
+            if requests:
+
+                await asyncio.wait(requests)
+
+            await writer.drain()
+
+        except ConnectionError:
+
+            pass
+
+        finally:
+
+            writer.close()
+
+            del self._connections[asyncio.current_task()]
+
+    async def _request(self, request: Dict[str, Any], reply: Callable):
+
+        request_id = request.get("id")
+        op = request.get("op")
+
+        if op == "health":
+
+            reply(dict(self.health(), id=request_id, event="health"))
+
+        elif op == "drain":
+
+            self.drain()
+
+            await self._stopped.wait()
+
+            reply({"id": request_id, "event": "drained"})
+
+        elif op == "run":
+
+            await self._run(request, reply)
+
+        else:
+
+            reply({"id": request_id, "event": "error", "type": "DaemonError",
+                   "message": f"Unknown op {op!r}"})
+
+    async def _run(self, request: Dict[str, Any], reply: Callable):
+
+        request_id = request.get("id")
+        target = request.get("target", "")
+
+        if self.draining:
+
+            reply({"id": request_id, "event": "error", "type": "DaemonError",
+                   "message": "The daemon is draining"})
+
+            return
+
+        if ":" not in target or not self.is_allowed(target):
+
+            reply({"id": request_id, "event": "error", "type": "DaemonError",
+                   "message": f"Target {target!r} isn't allowed"})
+
+            return
+
+        loop = asyncio.get_event_loop()
+
+        def progress(value):
+
+            # Called in the pool's thread
+            loop.call_soon_threadsafe(reply, {"id": request_id, "event": "progress",
+                                              "value": value})
+
+        self.running += 1
+        self._idle.clear()
+
+        try:
+
+            try:
+
+                future = self.pool.submit_call(call_target,
+                                               (target, request.get("args", []),
+                                                request.get("kwargs", {})),
+                                               timeout=request.get("timeout"),
+                                               progress=progress)
+
+            except Exception as e: # e.g. the workers can't import `bpy`
+
+                reply({"id": request_id, "event": "error", "type": type(e).__name__,
+                       "message": str(e)})
+
+                return
+
+            reply({"id": request_id, "event": "accepted"})
+
+            try:
+
+                value = await asyncio.wrap_future(future)
+
+            except Exception as e:
+
+                reply({"id": request_id, "event": "error", "type": type(e).__name__,
+                       "message": str(e)})
+
+            else:
+
+                reply({"id": request_id, "event": "result", "value": value})
+
+        finally:
+
+            self.running -= 1
+
+            if not self.running:
+
+                self._idle.set()
+
+class DaemonClient():
+    """Blocking client for tools; one connection per client
+    """
+
+    def __init__(self, socket_path: Optional[str] = None,
+                 timeout: Optional[float] = None):
+
+        self.socket_path = socket_path or get_socket_path()
+
+        _check_socket_dir(self.socket_path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(self.socket_path)
+
+        self._file = self._socket.makefile("rwb")
+
+        self._ids = itertools.count()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+
+        self._file.close()
+        self._socket.close()
+
+    def _request(self, request: Dict[str, Any],
+                 progress: Optional[Callable[[Any], None]] = None) -> Dict[str, Any]:
+
+        request["id"] = next(self._ids)
+
+        self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._file.flush()
+
+        while True:
+
+            line = self._file.readline()
+
+            if not line:
+
+                raise DaemonError("The daemon closed the connection")
+
+            message = json.loads(line)
+
+            if message.get("id") != request["id"] or message["event"] == "accepted":
+
+                continue
+
+            if message["event"] == "progress":
+
+                if progress is not None:
+
+                    progress(message["value"])
+
+                continue
+
+            if message["event"] == "error":
+
+                raise DaemonError(f"{message['type']}: {message['message']}")
+
+            return message
+
+    def run(self, target: str, *args, progress: Optional[Callable[[Any], None]] = None,
+            timeout: Optional[float] = None, **kwargs) -> Any:
+        """Call `module:function` in a warm worker with JSON arguments
+        """
+
+        return self._request({"op": "run", "target": target, "args": args,
+                              "kwargs": kwargs, "timeout": timeout},
+                             progress)["value"]
+
+    def health(self) -> Dict[str, Any]:
+
+        return self._request({"op": "health"})
+
+    def drain(self):
+        """Stop the daemon once its jobs are done; returns once it has
+        """
+
+        self._request({"op": "drain"})
+
+def serve(socket_path: Optional[str] = None, allowed: Optional[Iterable[str]] = None,
+          **pool_options):
+    """Start a pool and serve it until drained
+    """
+
+    with WarmPool(**pool_options) as pool:
+
+        asyncio.run(Daemon(pool, socket_path, allowed).serve())
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description="Keep bpy workers warm and run "
+                                                 "jobs sent over a Unix socket")
+
+    parser.add_argument("--socket", default=None,
+                        help=f"The socket to listen on (default {get_socket_path()})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="How many workers (default: one per CPU)")
+    parser.add_argument("--module", default=DEFAULT_MODULE,
+                        help="The module workers import")
+    parser.add_argument("--max-tasks", type=int, default=None,
+                        help="Recycle a worker after this many jobs")
+    parser.add_argument("--max-rss", type=int, default=None,
+                        help="Recycle a worker once it holds this many bytes")
+    parser.add_argument("--preload-module", action="store_true",
+                        help="Import the module in the forkserver")
+    parser.add_argument("--allow", action="append", default=None,
+                        help="Only run targets in this package; repeatable, and "
+                             "required to serve")
+    parser.add_argument("--allow-any", action="store_true",
+                        help="Run any module:function, e.g. os:system, for "
+                             "whoever can connect")
+    parser.add_argument("--health", action="store_true",
+                        help="Print the health of the running daemon and exit")
+    parser.add_argument("--drain", action="store_true",
+                        help="Stop the running daemon once its jobs are done")
+
+    args = parser.parse_args(argv)
+
+    if args.health or args.drain:
+
+        try:
+
+            with DaemonClient(args.socket) as client:
+
+                if args.drain:
+
+                    client.drain()
+
+                else:
+
+                    print(json.dumps(client.health(), indent=2))
+
+        except (ConnectionError, FileNotFoundError) as e:
+
+            raise SystemExit(f"No daemon on {args.socket or get_socket_path()}: {e}")
+
+        return
+
+    if not args.allow and not args.allow_any:
+
+        parser.error("name the packages jobs may come from with --allow, or pass "
+                     "--allow-any")
+
+    serve(args.socket, args.allow, workers=args.workers, module=args.module,
+          max_tasks=args.max_tasks, max_rss=args.max_rss,
+          preload_module=args.preload_module)
+
+if __name__ == "__main__":
+
+    main()
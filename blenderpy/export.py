@@ -0,0 +1,362 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Stream the geometry of a scene into memory-mapped `.npy` files
+
+Objects are walked one at a time and every attribute of their mesh, such as
+the vertex coordinates, is read with `foreach_get` straight into a memory
+mapped window at the end of that attribute's `.npy` file, so memory use
+depends on the largest object rather than on the scene. An index maps every
+object to where its data starts and how long it is, so readers map just the
+object they want
+
+An object is only added to the index once its data is on disk; an export
+that was interrupted resumes after the last object in the index
+"""
+
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy
+
+# Relative imports
+from blenderpy import arrays
+
+INDEX_NAME = "index.jsonl"
+INDEX_VERSION = 1
+
+# Room for the `.npy` header of any shape, so it can be rewritten in place as
+# the file grows
+NPY_HEADER_SIZE = 128
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+class ExportAttribute():
+    """One array per object: `attribute` of the collection `get_collection`
+    returns for the object and its mesh
+    """
+
+    def __init__(self, name: str, get_collection: Callable, attribute: str,
+                 components: Optional[Tuple[int, ...]] = None, dtype=None):
+
+        self.name = name
+        self.get_collection = get_collection
+        self.attribute = attribute
+        self.components, self.dtype = arrays.get_layout(attribute, components, dtype)
+
+def _active_uvs(_object, mesh):
+
+    return mesh.uv_layers.active.data if mesh.uv_layers.active is not None else []
+
+def _loop_triangles(_object, mesh):
+
+    mesh.calc_loop_triangles()
+
+    return mesh.loop_triangles
+
+DEFAULT_ATTRIBUTES = [
+    ExportAttribute("co", lambda _object, mesh: mesh.vertices, "co"),
+    ExportAttribute("normal", lambda _object, mesh: mesh.vertices, "normal"),
+    ExportAttribute("triangles", _loop_triangles, "vertices"),
+    ExportAttribute("uv", _active_uvs, "uv"),
+    ExportAttribute("matrix_world", lambda _object, mesh: arrays._ObjectList([_object]),
+                    "matrix_world", (16,))
+]
+
+def iter_meshes(objects: Iterable, depsgraph=None) -> Iterator[Tuple[str, object, object]]:
+    """`(name, object, mesh)` of every mesh object, one at a time
+
+    With a `depsgraph` the evaluated mesh (with modifiers applied) is made for
+    each object and freed once the next one is asked for
+    """
+
+    for _object in objects:
+
+        if getattr(_object, "type", "MESH") != "MESH":
+
+            continue
+
+        if depsgraph is None:
+
+            yield _object.name, _object, _object.data
+
+            continue
+
+        evaluated = _object.evaluated_get(depsgraph)
+
+        try:
+
+            yield _object.name, _object, evaluated.to_mesh()
+
+        finally:
+
+            evaluated.to_mesh_clear()
+
+def write_npy_header(path: str, dtype: numpy.dtype, shape: Tuple[int, ...]):
+    """Write or rewrite the fixed size `.npy` header at the start of `path`
+    """
+
+    header = repr({"descr": numpy.lib.format.dtype_to_descr(dtype),
+                   "fortran_order": False, "shape": tuple(shape)}).encode("latin1")
+
+    padding = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+
+    if padding < 0:
+
+        raise ValueError(f"The .npy header of shape {shape} doesn't fit "
+                         f"{NPY_HEADER_SIZE} bytes")
+
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as npy:
+
+        npy.write(NPY_MAGIC + (NPY_HEADER_SIZE - len(NPY_MAGIC) - 2).to_bytes(2, "little") +
+                  header + b" " * padding + b"\n")
+
+class _AttributeFile():
+    """An `.npy` file that grows by one object at a time
+    """
+
+    def __init__(self, path: str, attribute: ExportAttribute, length: int = 0):
+
+        self.path = path
+        self.attribute = attribute
+        self.length = length
+
+        self.item_size = int(numpy.prod(attribute.components)) * attribute.dtype.itemsize
+
+        write_npy_header(path, attribute.dtype, self.shape)
+
+        # Drop whatever an interrupted export wrote past the last object
+        os.truncate(path, NPY_HEADER_SIZE + self.length * self.item_size)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+
+        return (self.length,) + self.attribute.components
+
+    def append(self, collection) -> Tuple[int, int]:
+        """Read `collection` into the end of the file
+
+        Returns:
+            the offset and length of what was written, in items
+        """
+
+        offset, length = self.length, len(collection)
+
+        if length:
+
+            os.truncate(self.path, NPY_HEADER_SIZE + (offset + length) * self.item_size)
+
+            window = numpy.memmap(self.path, dtype=self.attribute.dtype, mode="r+",
+                                  offset=NPY_HEADER_SIZE + offset * self.item_size,
+                                  shape=(length,) + self.attribute.components)
+
+            collection.foreach_get(self.attribute.attribute, window.reshape(-1))
+
+            window.flush()
+
+            del window
+
+        self.length += length
+
+        return offset, length
+
+    def commit(self):
+
+        write_npy_header(self.path, self.attribute.dtype, self.shape)
+
+class GeometryExporter():
+    """Writes one `.npy` file per attribute and the index into `directory`
+    """
+
+    def __init__(self, directory: str,
+                 attributes: Optional[List[ExportAttribute]] = None,
+                 durable: bool = False):
+
+        self.directory = directory
+        self.attributes = attributes if attributes is not None else DEFAULT_ATTRIBUTES
+        self.durable = durable
+
+        index_path = os.path.join(directory, INDEX_NAME)
+
+        if os.path.isfile(index_path):
+
+            truncate_index(directory)
+
+        self.index = read_index(directory) if os.path.isfile(index_path) else {}
+
+        os.makedirs(directory, exist_ok=True)
+
+        layout = {attribute.name: {"dtype": attribute.dtype.str,
+                                   "components": list(attribute.components)} for
+                  attribute in self.attributes}
+
+        if self.index and read_index_layout(directory) != layout:
+
+            raise ValueError(f"{directory} holds an export of other attributes")
+
+        ends = {attribute.name: max([entry[attribute.name][0] + entry[attribute.name][1]
+                                     for entry in self.index.values()] or [0])
+                for attribute in self.attributes}
+
+        self._files = {attribute.name: _AttributeFile(os.path.join(directory,
+                                                                   f"{attribute.name}.npy"),
+                                                      attribute, ends[attribute.name])
+                       for attribute in self.attributes}
+
+        if not self.index:
+
+            with open(index_path, "w") as index_file:
+
+                index_file.write(json.dumps({"version": INDEX_VERSION,
+                                             "attributes": layout}) + "\n")
+
+        self._index_file = open(index_path, "a")
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+
+        self._index_file.close()
+
+    def export_object(self, name: str, _object, mesh) -> bool:
+        """Write one object, unless an earlier run already did
+
+        Returns:
+            whether the object was written
+        """
+
+        if name in self.index:
+
+            return False
+
+        entry = {}
+
+        for attribute in self.attributes:
+
+            entry[attribute.name] = list(self._files[attribute.name].append(
+                attribute.get_collection(_object, mesh)))
+
+        for attribute_file in self._files.values():
+
+            attribute_file.commit()
+
+        # Only now is the object complete on disk
+        self._index_file.write(json.dumps({"name": name, "attributes": entry}) + "\n")
+        self._index_file.flush()
+
+        if self.durable:
+
+            os.fsync(self._index_file.fileno())
+
+        self.index[name] = entry
+
+        return True
+
+    def export(self, meshes: Iterable[Tuple[str, object, object]]) -> int:
+        """Write everything `iter_meshes` yields
+
+        Returns:
+            how many objects were written, leaving out those done before
+        """
+
+        return sum(self.export_object(name, _object, mesh) for
+                   name, _object, mesh in meshes)
+
+def truncate_index(directory: str):
+    """Drop a last line cut short by a crash, so that new entries aren't
+    appended to it
+    """
+
+    with open(os.path.join(directory, INDEX_NAME), "r+b") as index_file:
+
+        end = 0
+
+        for line in index_file:
+
+            try:
+
+                json.loads(line.decode("utf-8"))
+
+            except ValueError:
+
+                break
+
+            if not line.endswith(b"\n"):
+
+                break
+
+            end += len(line)
+
+        index_file.truncate(end)
+
+def read_index_layout(directory: str) -> Dict[str, dict]:
+
+    with open(os.path.join(directory, INDEX_NAME), "r") as index_file:
+
+        return json.loads(index_file.readline())["attributes"]
+
+def read_index(directory: str) -> Dict[str, Dict[str, List[int]]]:
+    """Object names mapped to the offset and length of each attribute
+
+    A last line cut short by a crash is ignored
+    """
+
+    index = {}
+
+    with open(os.path.join(directory, INDEX_NAME), "r") as index_file:
+
+        header = json.loads(index_file.readline())
+
+        if header.get("version") != INDEX_VERSION:
+
+            raise ValueError(f"Unknown export index version {header.get('version')}")
+
+        for line in index_file:
+
+            try:
+
+                entry = json.loads(line)
+
+            except ValueError:
+
+                break
+
+            index[entry["name"]] = entry["attributes"]
+
+    return index
+
+class GeometryReader():
+    """Maps the arrays of single objects from an export
+    """
+
+    def __init__(self, directory: str):
+
+        self.directory = directory
+
+        self.index = read_index(directory)
+
+        self._arrays = {}
+
+    @property
+    def names(self) -> List[str]:
+
+        return list(self.index)
+
+    def read(self, name: str, attribute: str) -> numpy.ndarray:
+        """A read only view of `attribute` of the object `name`
+        """
+
+        if attribute not in self._arrays:
+
+            self._arrays[attribute] = numpy.load(os.path.join(self.directory,
+                                                              f"{attribute}.npy"),
+                                                 mmap_mode="r")
+
+        offset, length = self.index[name][attribute]
+
+        return self._arrays[attribute][offset:offset + length]
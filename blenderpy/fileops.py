@@ -0,0 +1,635 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Copying and moving the large file trees that make up a Blender build
+
+The Blender `bin` directory holds thousands of small add-on, locale and
+datafile files; these are copied with a pool of threads and, where source and
+destination share a filesystem, cloned or hard linked instead of copied
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+
+    import fcntl
+
+except ImportError: # Windows
+
+    fcntl = None
+
+# Copying is bound by file system latency rather than CPU
+DEFAULT_COPY_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# ioctl(2) request number of FICLONE on Linux, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+COPY_METHOD_LINK = "linked"
+COPY_METHOD_CLONE = "cloned"
+COPY_METHOD_COPY = "copied"
+COPY_METHOD_MOVE = "moved"
+COPY_METHOD_REMOVE = "removed"
+COPY_METHOD_SYMLINK = "symlinked"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class CopyStats():
+    """How many files were transferred, how and how fast
+    """
+
+    def __init__(self):
+
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.methods = {}
+        self.unchanged = 0
+
+    def add(self, method: str, size: int):
+
+        self.files += 1
+        self.bytes += size
+        self.methods[method] = self.methods.get(method, 0) + 1
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second
+        """
+
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+
+        methods = ", ".join([f"{count} {method}" for method, count in
+                             sorted(self.methods.items())])
+
+        unchanged = f", {self.unchanged} unchanged" if self.unchanged else ""
+
+        return (f"{self.files} files, {self.bytes / 1024 ** 2:.1f} MB in "
+                f"{self.seconds:.2f}s ({self.throughput / 1024 ** 2:.1f} MB/s"
+                f"{'; ' + methods if methods else ''}{unchanged})")
+
+def _existing_ancestor(path: str) -> str:
+
+    path = os.path.abspath(path)
+
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+
+        path = os.path.dirname(path)
+
+    return path
+
+def same_filesystem(src: str, dst: str) -> bool:
+    """Whether `src` and `dst` (which may not exist yet) share a device
+    """
+
+    try:
+
+        return os.stat(src).st_dev == os.stat(_existing_ancestor(dst)).st_dev
+
+    except OSError:
+
+        return False
+
+def clone_file(src: str, dst: str) -> bool:
+    """Make `dst` a copy-on-write clone of `src`, where supported
+
+    Only Linux filesystems with reflink support (btrfs, xfs, ...) can do this;
+    `False` means nothing was created
+    """
+
+    if fcntl is None or platform.system() != "Linux":
+
+        return False
+
+    try:
+
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+    except OSError:
+
+        if os.path.exists(dst):
+
+            os.remove(dst)
+
+        return False
+
+    shutil.copystat(src, dst)
+
+    return True
+
+def copy_file(src: str, dst: str, same_fs: bool = False,
+              hardlink: bool = False) -> str:
+    """Copy a single file the cheapest way available
+
+    Hard links are only used when asked for, as the destination then shares
+    its contents with the source
+
+    Returns:
+        str -- which of the `COPY_METHOD_*` was used
+    """
+
+    if same_fs and hardlink:
+
+        try:
+
+            os.link(src, dst)
+
+            return COPY_METHOD_LINK
+
+        except OSError:
+
+            pass
+
+    if same_fs and clone_file(src, dst):
+
+        return COPY_METHOD_CLONE
+
+    shutil.copy2(src, dst)
+
+    return COPY_METHOD_COPY
+
+def _transfer_all(transfer, pairs: List[Tuple[str, str]],
+                  workers: int) -> CopyStats:
+
+    stats = CopyStats()
+
+    start = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+
+        for method, size in pool.map(lambda pair: transfer(*pair), pairs):
+
+            stats.add(method, size)
+
+    stats.seconds = time.perf_counter() - start
+
+    return stats
+
+def copy_files(pairs: Iterable[Tuple[str, str]], hardlink: bool = False,
+               workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Copy every `(src, dst)` pair in parallel, creating parent folders
+    """
+
+    pairs = list(pairs)
+
+    for _dir in set([os.path.dirname(dst) for src, dst in pairs]):
+
+        os.makedirs(_dir, exist_ok=True)
+
+    same_fs_cache = {}
+
+    def transfer(src: str, dst: str) -> Tuple[str, int]:
+
+        key = (os.path.dirname(src), os.path.dirname(dst))
+
+        if key not in same_fs_cache:
+
+            same_fs_cache[key] = same_filesystem(*key)
+
+        return (copy_file(src, dst, same_fs_cache[key], hardlink),
+                os.path.getsize(dst))
+
+    return _transfer_all(transfer, pairs, workers)
+
+def move_files(pairs: Iterable[Tuple[str, str]],
+               workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Move every `(src, dst)` pair in parallel
+
+    A rename when both sides share a filesystem, otherwise a copy and delete
+    """
+
+    def transfer(src: str, dst: str) -> Tuple[str, int]:
+
+        size = os.path.getsize(src)
+
+        try:
+
+            os.replace(src, dst)
+
+            return COPY_METHOD_MOVE, size
+
+        except OSError: # Crossing devices
+
+            shutil.copy2(src, dst)
+            os.remove(src)
+
+            return COPY_METHOD_COPY, size
+
+    return _transfer_all(transfer, list(pairs), workers)
+
+def list_tree(root: str) -> Tuple[List[str], List[str]]:
+    """Relative paths of every folder and every file below `root`
+    """
+
+    dirs = []
+    files = []
+
+    for _dir, _dirs, _files in os.walk(root):
+
+        rel_dir = os.path.relpath(_dir, root)
+
+        dirs += [os.path.normpath(os.path.join(rel_dir, _sub)) for _sub in _dirs]
+        files += [os.path.normpath(os.path.join(rel_dir, _file)) for _file in _files]
+
+    return dirs, files
+
+def copy_tree(src: str, dst: str, hardlink: bool = False,
+              workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Parallel, link-aware equivalent of `shutil.copytree`
+
+    Falls back to `shutil.copytree` with a single worker or when the parallel
+    copy fails part way
+    """
+
+    if workers <= 1:
+
+        return _copytree_fallback(src, dst)
+
+    try:
+
+        dirs, files = list_tree(src)
+
+        os.makedirs(dst)
+
+        for _dir in dirs:
+
+            os.makedirs(os.path.join(dst, _dir), exist_ok=True)
+
+        stats = copy_files([(os.path.join(src, _file), os.path.join(dst, _file))
+                            for _file in files], hardlink, workers)
+
+        for _dir in dirs + [os.curdir]:
+
+            shutil.copystat(os.path.join(src, _dir), os.path.join(dst, _dir))
+
+        return stats
+
+    except OSError:
+
+        if os.path.exists(dst):
+
+            shutil.rmtree(dst)
+
+        return _copytree_fallback(src, dst)
+
+def _copytree_fallback(src: str, dst: str) -> CopyStats:
+
+    stats = CopyStats()
+
+    start = time.perf_counter()
+
+    def copy(_src, _dst):
+
+        shutil.copy2(_src, _dst)
+
+        stats.add(COPY_METHOD_COPY, os.path.getsize(_dst))
+
+    shutil.copytree(src, dst, copy_function=copy)
+
+    stats.seconds = time.perf_counter() - start
+
+    return stats
+
+def stream_sha256(_file) -> str:
+    """sha256 of what is left to read of the binary file object `_file`
+    """
+
+    digest = hashlib.sha256()
+
+    for chunk in iter(lambda: _file.read(HASH_CHUNK_SIZE), b""):
+
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+def file_sha256(path: str) -> str:
+
+    with open(path, "rb") as _file:
+
+        return stream_sha256(_file)
+
+def read_sync_manifest(path: str) -> Optional[Dict[str, list]]:
+    """The state of the sources at the last sync, `None` if unknown
+    """
+
+    try:
+
+        with open(path, "r") as manifest:
+
+            return json.load(manifest)["files"]
+
+    except (OSError, ValueError, KeyError):
+
+        return None
+
+def write_sync_manifest(path: str, entries: Dict[str, list]):
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    with open(path + ".tmp", "w") as manifest:
+
+        json.dump({"files": entries}, manifest)
+
+    os.replace(path + ".tmp", path)
+
+def _remove_empty_parents(path: str, root: str):
+
+    path = os.path.dirname(path)
+
+    while os.path.abspath(path) != os.path.abspath(root):
+
+        try:
+
+            os.rmdir(path)
+
+        except OSError: # Not empty
+
+            return
+
+        path = os.path.dirname(path)
+
+def sync_files(sources: Dict[str, str], dst: str, manifest_path: str,
+               hardlink: bool = False, use_hash: bool = False,
+               workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Bring the files below `dst` up to date with `sources`
+
+    `sources` maps paths relative to `dst` to the files they come from. A
+    manifest of the size and modification time (and, with `use_hash`, the
+    sha256) of every source is kept at `manifest_path`; only new or changed
+    files are copied and only files that were synced before but are no
+    longer among `sources` are deleted. Anything else below `dst` is left
+    alone
+    """
+
+    start = time.perf_counter()
+
+    previous = read_sync_manifest(manifest_path) or {}
+
+    current = {}
+    changed = []
+
+    for rel_path, src in sources.items():
+
+        src_stat = os.stat(src)
+
+        entry = [src_stat.st_size, src_stat.st_mtime_ns, None]
+
+        old_entry = previous.get(rel_path)
+
+        dst_path = os.path.join(dst, rel_path)
+
+        if old_entry is not None and os.path.isfile(dst_path):
+
+            if old_entry[:2] == entry[:2]:
+
+                current[rel_path] = old_entry
+
+                continue
+
+            # Touched but not modified, as happens on every rebuild
+            if use_hash and old_entry[0] == entry[0] and old_entry[2] and\
+               file_sha256(src) == old_entry[2]:
+
+                entry[2] = old_entry[2]
+                current[rel_path] = entry
+
+                continue
+
+        if use_hash:
+
+            entry[2] = file_sha256(src)
+
+        current[rel_path] = entry
+        changed.append(rel_path)
+
+    removed = [rel_path for rel_path in previous if rel_path not in current]
+
+    # Replace rather than overwrite; the old file may be a link to a source
+    for rel_path in changed + removed:
+
+        dst_path = os.path.join(dst, rel_path)
+
+        if os.path.lexists(dst_path):
+
+            os.remove(dst_path)
+
+    stats = copy_files([(sources[rel_path], os.path.join(dst, rel_path)) for
+                        rel_path in changed], hardlink, workers)
+
+    for rel_path in removed:
+
+        stats.methods[COPY_METHOD_REMOVE] = \
+            stats.methods.get(COPY_METHOD_REMOVE, 0) + 1
+
+        _remove_empty_parents(os.path.join(dst, rel_path), dst)
+
+    stats.unchanged = len(sources) - len(changed)
+
+    write_sync_manifest(manifest_path, current)
+
+    stats.seconds = time.perf_counter() - start
+
+    return stats
+
+def sync_tree(src: str, dst: str, manifest_path: str, hardlink: bool = False,
+              use_hash: bool = False,
+              workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Incremental equivalent of replacing `dst` with a copy of `src`
+
+    Without a manifest from an earlier sync the contents of `dst` can't be
+    trusted, so it is deleted and copied in full
+    """
+
+    if read_sync_manifest(manifest_path) is None and os.path.lexists(dst):
+
+        if os.path.isdir(dst) and not os.path.islink(dst):
+
+            shutil.rmtree(dst)
+
+        else:
+
+            os.remove(dst)
+
+    dirs, files = list_tree(src)
+
+    for _dir in dirs:
+
+        os.makedirs(os.path.join(dst, _dir), exist_ok=True)
+
+    return sync_files({_file: os.path.join(src, _file) for _file in files}, dst,
+                      manifest_path, hardlink, use_hash, workers)
+
+def _read_journal(path: str) -> List[str]:
+
+    try:
+
+        with open(path, "r") as journal:
+
+            return [line.rstrip("\n") for line in journal if line.endswith("\n")]
+
+    except OSError:
+
+        return []
+
+def relocate_tree(src: str, dst: str,
+                  workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Move the folder `src` to `dst` so that `dst` is either complete or absent
+
+    On the same device this is a single rename. Otherwise `src` is copied in
+    parallel into a staging sibling of `dst` which is renamed into place once
+    complete; every copied file is recorded in a journal so an interrupted
+    relocation resumes where it stopped. An existing `dst` is replaced
+    """
+
+    start = time.perf_counter()
+
+    parent = os.path.dirname(os.path.abspath(dst))
+    name = os.path.basename(os.path.abspath(dst))
+
+    staging = os.path.join(parent, f".{name}.staging")
+    journal_path = staging + ".journal"
+    retired = os.path.join(parent, f".{name}.retired")
+
+    same_fs = same_filesystem(src, parent)
+
+    if same_fs:
+
+        stats = CopyStats()
+
+        stats.add(COPY_METHOD_MOVE, 0)
+
+        # Nothing to stage, the rename below is the whole relocation
+        staging = src
+
+    else:
+
+        dirs, files = list_tree(src)
+
+        done = set(_read_journal(journal_path)) if os.path.isdir(staging) else set()
+
+        # A file is only trusted from the journal if it still looks complete
+        done = set([_file for _file in done if _file in files and
+                    os.path.isfile(os.path.join(staging, _file)) and
+                    os.path.getsize(os.path.join(staging, _file)) ==
+                    os.path.getsize(os.path.join(src, _file))])
+
+        os.makedirs(staging, exist_ok=True)
+
+        for _dir in dirs:
+
+            os.makedirs(os.path.join(staging, _dir), exist_ok=True)
+
+        lock = threading.Lock()
+
+        with open(journal_path, "w") as journal:
+
+            journal.writelines([_file + "\n" for _file in sorted(done)])
+            journal.flush()
+
+            def transfer(_file: str) -> Tuple[str, int]:
+
+                shutil.copy2(os.path.join(src, _file), os.path.join(staging, _file))
+
+                with lock:
+
+                    journal.write(_file + "\n")
+                    journal.flush()
+
+                return COPY_METHOD_COPY, os.path.getsize(os.path.join(staging, _file))
+
+            stats = _transfer_all(transfer, [(_file,) for _file in files if
+                                             _file not in done], workers)
+
+        stats.unchanged = len(done)
+
+        for _dir in dirs + [os.curdir]:
+
+            shutil.copystat(os.path.join(src, _dir), os.path.join(staging, _dir))
+
+    if os.path.lexists(dst):
+
+        if os.path.lexists(retired):
+
+            shutil.rmtree(retired)
+
+        os.rename(dst, retired)
+
+    os.rename(staging, dst)
+
+    if os.path.lexists(retired):
+
+        shutil.rmtree(retired)
+
+    if not same_fs:
+
+        os.remove(journal_path)
+
+        # Out of the way first: a partial `src` left by an interrupted
+        # removal would be taken for the folder and relocated over `dst`
+        tombstone = os.path.join(os.path.dirname(os.path.abspath(src)),
+                                 f".{os.path.basename(os.path.abspath(src))}.removing")
+
+        if os.path.lexists(tombstone):
+
+            shutil.rmtree(tombstone)
+
+        os.rename(src, tombstone)
+
+        shutil.rmtree(tombstone)
+
+    stats.seconds = time.perf_counter() - start
+
+    return stats
+
+def remove_tree(path: str, files: Optional[List[str]] = None,
+                workers: int = DEFAULT_COPY_WORKERS) -> CopyStats:
+    """Delete the folder `path`, unlinking its files in parallel
+
+    The folder is first renamed to a hidden sibling, so it disappears from
+    view at once. `files` are the paths relative to `path` expected inside it;
+    without them the folder is listed. Whatever else is left afterwards (such
+    as `__pycache__` folders created at runtime) is removed with the folders
+    """
+
+    start = time.perf_counter()
+
+    path = os.path.abspath(path)
+
+    tombstone = os.path.join(os.path.dirname(path),
+                             f".{os.path.basename(path)}.removing-{os.getpid()}")
+
+    os.rename(path, tombstone)
+
+    if files is None:
+
+        files = list_tree(tombstone)[1]
+
+    def transfer(_file: str) -> Tuple[str, int]:
+
+        try:
+
+            os.remove(os.path.join(tombstone, _file))
+
+        except FileNotFoundError:
+
+            pass
+
+        return COPY_METHOD_REMOVE, 0
+
+    stats = _transfer_all(transfer, [(_file,) for _file in files], workers)
+
+    shutil.rmtree(tombstone)
+
+    stats.seconds = time.perf_counter() - start
+
+    return stats
@@ -0,0 +1,381 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Import `bpy` with the right `sys.path`, and what comes with it lazily
+
+`bpy` puts Blender's scripts folders on `sys.path` as it's imported, and
+`scripts/modules` holds a pure Python `bpy` package that shadows the `bpy`
+extension module when it's found first. `import_bpy` imports from a
+`sys.path` without those folders, then puts back exactly the folders of the
+scripts directory it resolved, and with `defer_addons` keeps the add-on
+folders off `sys.path` until an add-on is enabled. `bmesh`, `mathutils` and
+the like are only imported on first use of one of their attributes
+
+The scripts directory is looked up once, as `bpy_post_install` does, and
+kept in the environment, so subprocesses and pool workers started afterwards
+reuse it without looking again. `REPORT` has what the import cost and, once
+`measure_eager_imports` ran, what deferring saved
+"""
+
+import importlib
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import types
+from typing import Any, Dict, List, Optional
+
+# Relative imports
+from blenderpy import BLENDER_SCRIPTS_DIR_REGEX, _is_within,\
+                      find_blender_scripts_directory, get_python_scripts_directory,\
+                      is_blender_scripts_directory
+
+# The scripts directory and how long looking it up took, for subprocesses
+SCRIPTS_DIR_ENV = "BPY_SCRIPTS_DIR"
+SCRIPTS_DIR_SECONDS_ENV = "BPY_SCRIPTS_DIR_SECONDS"
+
+# What importing each lazy module right after `bpy` costs, for subprocesses
+EAGER_SECONDS_ENV = "BPY_EAGER_IMPORT_SECONDS"
+
+# Whether add-on folders are kept off `sys.path` unless asked otherwise
+DEFAULT_DEFER_ADDONS = False
+
+# Loaded on first attribute access; they only work once `bpy` is imported
+LAZY_MODULES = ("bmesh", "mathutils", "bpy_extras", "addon_utils")
+
+# Folders of the scripts directory that only add-ons need
+ADDON_DIR_NAMES = {"addons", "addons_contrib"}
+
+class ImportReport():
+    """What importing `bpy` through this module cost, in seconds, and what it
+    put off
+    """
+
+    def __init__(self):
+
+        self.scripts_dir = None
+        self.scripts_dir_seconds = 0.0
+        self.scripts_dir_saved = 0.0
+        self.bpy_seconds = None
+        self.lazy_seconds = {} # type: Dict[str, float]
+        self.eager_seconds = {} # type: Dict[str, float]
+        self.deferred_paths = [] # type: List[str]
+
+    @property
+    def deferred_modules(self) -> List[str]:
+        """Lazy modules that haven't been needed, so haven't cost anything
+        """
+
+        return [name for name in LAZY_MODULES if name not in self.lazy_seconds]
+
+    @property
+    def saved_seconds(self) -> float:
+        """What importing eagerly would have cost on top: the scripts
+        directory lookup reused from the parent, and the lazy modules not
+        needed so far, as `measure_eager_imports` timed them
+        """
+
+        return self.scripts_dir_saved + sum(self.eager_seconds.get(name, 0.0) for
+                                            name in self.deferred_modules)
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {"scripts_dir": self.scripts_dir,
+                "scripts_dir_seconds": self.scripts_dir_seconds,
+                "scripts_dir_saved": self.scripts_dir_saved,
+                "bpy_seconds": self.bpy_seconds,
+                "lazy_seconds": dict(self.lazy_seconds),
+                "eager_seconds": dict(self.eager_seconds),
+                "saved_seconds": self.saved_seconds,
+                "deferred_modules": self.deferred_modules,
+                "deferred_paths": list(self.deferred_paths)}
+
+REPORT = ImportReport()
+
+def is_blender_scripts_path(path: str) -> bool:
+    """Whether `path` is in one of the scripts folders `bpy` adds to
+    `sys.path` itself, e.g. `.../2.93/scripts/modules`
+    """
+
+    parts = pathlib.PurePath(path).parts
+
+    return any(BLENDER_SCRIPTS_DIR_REGEX.fullmatch(part) and
+               parts[index + 1] == "scripts" for index, part in
+               enumerate(parts[:-1]))
+
+def fix_sys_path(path: Optional[List[str]] = None) -> List[str]:
+    """`sys.path` without Blender's scripts folders
+
+    `scripts/modules` holds a pure Python `bpy` package, which shadows the
+    `bpy` extension module if it's found first; `bpy` puts these folders back
+    once it's imported
+    """
+
+    path = sys.path if path is None else path
+
+    result = []
+
+    for entry in path:
+
+        if entry not in result and not is_blender_scripts_path(entry):
+
+            result.append(entry)
+
+    return result
+
+def is_addon_path(path: str) -> bool:
+    """Whether `path` is one of the add-on folders of a scripts directory,
+    e.g. `.../2.93/scripts/addons/modules`
+    """
+
+    parts = pathlib.PurePath(path).parts
+
+    return is_blender_scripts_path(path) and \
+           any(parts[index] == "scripts" and parts[index + 1] in ADDON_DIR_NAMES
+               for index in range(len(parts) - 1))
+
+def resolve_scripts_directory(refresh: bool = False) -> Optional[str]:
+    """The Blender scripts directory, looked up once per process tree
+
+    The first process looks it up with `find_blender_scripts_directory` and
+    keeps it in the environment; processes started from it reuse it
+    """
+
+    scripts_dir = os.environ.get(SCRIPTS_DIR_ENV)
+
+    if not refresh and scripts_dir is not None and \
+       (scripts_dir == "" or is_blender_scripts_directory(scripts_dir)):
+
+        REPORT.scripts_dir = scripts_dir or None
+        REPORT.scripts_dir_saved = float(os.environ.get(SCRIPTS_DIR_SECONDS_ENV) or 0)
+
+        return REPORT.scripts_dir
+
+    started = time.perf_counter()
+
+    scripts_dir = find_blender_scripts_directory(get_python_scripts_directory())
+
+    REPORT.scripts_dir = scripts_dir
+    REPORT.scripts_dir_seconds = time.perf_counter() - started
+
+    # Inherited by every process started from now on; empty when not found
+    os.environ[SCRIPTS_DIR_ENV] = scripts_dir or ""
+    os.environ[SCRIPTS_DIR_SECONDS_ENV] = str(REPORT.scripts_dir_seconds)
+
+    return scripts_dir
+
+def get_scripts_environment() -> Dict[str, str]:
+    """The variables that hand what was looked up here to another process
+    """
+
+    return {name: os.environ[name] for name in
+            (SCRIPTS_DIR_ENV, SCRIPTS_DIR_SECONDS_ENV, EAGER_SECONDS_ENV) if
+            name in os.environ}
+
+def get_scripts_paths(scripts_dir: str) -> List[str]:
+    """The folders of `scripts_dir` that belong on `sys.path`, as `bpy` puts
+    them there: `startup` and `modules`, then those of the add-ons
+    """
+
+    scripts = os.path.join(scripts_dir, "scripts")
+
+    return [path for path in [os.path.join(scripts, "startup"),
+                              os.path.join(scripts, "modules"),
+                              os.path.join(scripts, "addons"),
+                              os.path.join(scripts, "addons", "modules"),
+                              os.path.join(scripts, "addons_contrib")] if
+            os.path.isdir(path)]
+
+def build_sys_path(path: List[str], scripts_dir: Optional[str]) -> List[str]:
+    """`path` as `bpy` left it, with the scripts folders of `scripts_dir`
+    only, each once
+
+    Scripts folders `bpy` added of any other scripts directory are dropped,
+    and folders of `scripts_dir` it didn't add are added after those it did
+    """
+
+    result = fix_sys_path(path)
+
+    added = [entry for index, entry in enumerate(path) if
+             is_blender_scripts_path(entry) and entry not in path[:index]]
+
+    if scripts_dir is None:
+
+        return result + added
+
+    added = [entry for entry in added if _is_within(entry, scripts_dir)]
+
+    return result + added + [entry for entry in get_scripts_paths(scripts_dir) if
+                             entry not in added]
+
+def measure_eager_imports(python: str = sys.executable) -> Dict[str, float]:
+    """Time importing every lazy module right after `bpy` in a fresh
+    process, as an eager `import bpy, bmesh, ...` would; what deferring them
+    saves is reported against this. Kept in the environment for subprocesses
+    """
+
+    if EAGER_SECONDS_ENV in os.environ:
+
+        REPORT.eager_seconds = json.loads(os.environ[EAGER_SECONDS_ENV])
+
+        return REPORT.eager_seconds
+
+    code = ("import importlib, json, sys, time\n"
+            "from blenderpy import importer\n"
+            "importer.import_bpy()\n"
+            "seconds = {}\n"
+            f"for name in {list(LAZY_MODULES)!r}:\n"
+            "    started = time.perf_counter()\n"
+            "    try:\n"
+            "        importlib.import_module(name)\n"
+            "    except ImportError:\n"
+            "        continue\n"
+            "    seconds[name] = time.perf_counter() - started\n"
+            "print(json.dumps(seconds))\n")
+
+    output = subprocess.check_output([python, "-c", code], env=dict(os.environ,
+                                                                  **get_scripts_environment()))
+
+    REPORT.eager_seconds = json.loads(output.decode("utf-8").splitlines()[-1])
+
+    os.environ[EAGER_SECONDS_ENV] = json.dumps(REPORT.eager_seconds)
+
+    return REPORT.eager_seconds
+
+def defer_addon_paths():
+    """Take the add-on folders `bpy` added off `sys.path`, until
+    `restore_addon_paths`
+    """
+
+    for entry in list(sys.path):
+
+        if is_addon_path(entry):
+
+            sys.path.remove(entry)
+
+            if entry not in REPORT.deferred_paths:
+
+                REPORT.deferred_paths.append(entry)
+
+def restore_addon_paths():
+
+    for entry in REPORT.deferred_paths:
+
+        if entry not in sys.path:
+
+            sys.path.append(entry)
+
+    REPORT.deferred_paths.clear()
+
+def import_bpy(defer_addons: bool = DEFAULT_DEFER_ADDONS) -> types.ModuleType:
+    """Import `bpy`, once; with `defer_addons` the add-on folders stay off
+    `sys.path` until `enable_addon`
+    """
+
+    if "bpy" in sys.modules:
+
+        return sys.modules["bpy"]
+
+    scripts_dir = resolve_scripts_directory()
+
+    sys.path[:] = fix_sys_path()
+
+    started = time.perf_counter()
+
+    bpy = importlib.import_module("bpy")
+
+    REPORT.bpy_seconds = time.perf_counter() - started
+
+    sys.path[:] = build_sys_path(sys.path, scripts_dir)
+
+    if defer_addons:
+
+        defer_addon_paths()
+
+    return bpy
+
+def import_module(name: str, defer_addons: bool = DEFAULT_DEFER_ADDONS) -> types.ModuleType:
+    """`bpy` through `import_bpy`, anything else as usual
+    """
+
+    if name == "bpy":
+
+        return import_bpy(defer_addons)
+
+    return importlib.import_module(name)
+
+def enable_addon(name: str):
+    """Put the add-on folders back on `sys.path` and enable add-on `name`
+    """
+
+    restore_addon_paths()
+
+    import_bpy()
+
+    lazy_import("addon_utils").enable(name, default_set=True)
+
+class _LazyModule(types.ModuleType):
+    """Imports `bpy` then the module itself on first attribute access
+    """
+
+    def __init__(self, name: str):
+
+        super().__init__(name)
+
+        self.__dict__["_module"] = None
+
+    def _load(self) -> types.ModuleType:
+
+        if self.__dict__["_module"] is None:
+
+            import_bpy()
+
+            started = time.perf_counter()
+
+            self.__dict__["_module"] = importlib.import_module(self.__name__)
+
+            REPORT.lazy_seconds[self.__name__] = time.perf_counter() - started
+
+        return self.__dict__["_module"]
+
+    def __getattr__(self, attribute: str) -> Any:
+
+        return getattr(self._load(), attribute)
+
+    def __dir__(self) -> List[str]:
+
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+_lazy_modules = {} # type: Dict[str, _LazyModule]
+
+def lazy_import(name: str) -> types.ModuleType:
+    """A stand-in for module `name` that imports it when first used
+    """
+
+    if name not in _lazy_modules:
+
+        _lazy_modules[name] = _LazyModule(name)
+
+    return _lazy_modules[name]
+
+def __getattr__(name: str) -> types.ModuleType:
+    """`from blenderpy.importer import bpy, bmesh`: `bpy` is imported right
+    away, the others when first used
+    """
+
+    if name == "bpy":
+
+        return import_bpy()
+
+    if name in LAZY_MODULES:
+
+        return lazy_import(name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,314 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Find what each task leaves behind in a long running `bpy` process
+
+A task that creates meshes, images or materials and doesn't remove them
+leaves them in `bpy.data` for good, and the process grows with every task.
+`LeakTracker` notes the data-blocks of every collection of `bpy.data` and
+the resident memory before and after a task, reports the data-blocks the
+task added and didn't remove, can remove those no one uses any more, and
+records it all in a `MetricsSink`. In a `WarmPool` worker it can ask for
+the worker to be replaced once too much has leaked
+"""
+
+import bisect
+import collections
+import contextlib
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Relative imports
+from blenderpy import pool
+
+# The collections of `bpy.data` tasks usually leave data-blocks in; those a
+# Blender version doesn't have are left out
+DATA_COLLECTIONS = ("objects", "meshes", "materials", "images", "textures",
+                    "node_groups", "curves", "lights", "cameras", "actions",
+                    "collections", "scenes", "worlds")
+
+# Upper bounds of the histogram buckets, in the unit of what's observed
+DEFAULT_BUCKETS = (0, 1, 10, 100, 1000, 2 ** 20, 2 ** 24, 2 ** 27, 2 ** 30)
+
+class Histogram():
+    """Counts of observed values per bucket, plus their count, sum and range
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1) # the last is past every bucket
+
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {"buckets": list(self.buckets) + ["inf"], "counts": list(self.counts),
+                "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+class MetricsSink():
+    """Counters and histograms, safe to share between threads
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+
+        self.buckets = buckets
+
+        self.counters = collections.Counter()
+        self.histograms = {} # type: Dict[str, Histogram]
+
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1):
+
+        with self._lock:
+
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+
+        with self._lock:
+
+            if name not in self.histograms:
+
+                self.histograms[name] = Histogram(self.buckets)
+
+            self.histograms[name].observe(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        with self._lock:
+
+            return {"counters": dict(self.counters),
+                    "histograms": {name: histogram.to_dict() for name, histogram in
+                                   self.histograms.items()}}
+
+class LeakReport():
+    """What one task left behind
+    """
+
+    def __init__(self, name: str):
+
+        self.name = name
+
+        self.seconds = None
+        self.rss_before = None
+        self.rss_after = None
+
+        # collection -> names of the data-blocks the task added and left
+        self.leaked = {} # type: Dict[str, List[str]]
+        self.purged = 0
+
+    @property
+    def rss_delta(self) -> Optional[int]:
+
+        if self.rss_before is None or self.rss_after is None:
+
+            return None
+
+        return self.rss_after - self.rss_before
+
+    @property
+    def leaked_count(self) -> int:
+
+        return sum(len(names) for names in self.leaked.values())
+
+    def __repr__(self) -> str:
+
+        return (f"LeakReport({self.name!r}, leaked={self.leaked_count}, "
+                f"purged={self.purged}, rss_delta={self.rss_delta})")
+
+def _get_bpy():
+
+    try:
+
+        return pool.get_module()
+
+    except pool.WorkerError:
+
+        import bpy
+
+        return bpy
+
+def _block_key(block) -> Tuple[int, Any]:
+    """Tells data-blocks apart across a job: the memory of a block removed
+    during the job can be reused by a new one, so the pointer goes with the
+    `session_uid`, unique within a session, or the name where there is none
+    """
+
+    session_uid = getattr(block, "session_uid", None)
+
+    return block.as_pointer(), session_uid if session_uid is not None else block.name
+
+def _is_orphan(block) -> bool:
+
+    return block.users == 0 and not getattr(block, "use_fake_user", False)
+
+class LeakTracker():
+    """Tracks tasks with `track`, or functions decorated with `instrument`
+
+    With `purge`, data-blocks a task added that have no users left are
+    removed afterwards. Inside a `WarmPool` worker the worker asks to be
+    replaced once it leaked more than `max_leaked` data-blocks in all or
+    grew past `max_rss` bytes
+    """
+
+    def __init__(self, bpy=None, sink: Optional[MetricsSink] = None,
+                 data_collections: Iterable[str] = DATA_COLLECTIONS, purge: bool = False,
+                 max_leaked: Optional[int] = None, max_rss: Optional[int] = None):
+
+        self.bpy = bpy
+        self.sink = sink if sink is not None else MetricsSink()
+        self.data_collections = tuple(data_collections)
+        self.purge = purge
+        self.max_leaked = max_leaked
+        self.max_rss = max_rss
+
+        self.leaked_total = 0
+        self.last_report = None
+
+    def _get_collections(self) -> Dict[str, Any]:
+
+        if self.bpy is None:
+
+            self.bpy = _get_bpy()
+
+        return {name: getattr(self.bpy.data, name) for name in self.data_collections if
+                hasattr(self.bpy.data, name)}
+
+    def snapshot(self) -> Dict[str, set]:
+        """The keys of the data-blocks in every collection, see `_block_key`
+        """
+
+        return {name: {_block_key(block) for block in blocks} for
+                name, blocks in self._get_collections().items()}
+
+    def _new_blocks(self, before: Dict[str, set]) -> Dict[str, List]:
+
+        return {name: [block for block in blocks if
+                       _block_key(block) not in before.get(name, ())]
+                for name, blocks in self._get_collections().items()}
+
+    def _purge(self, new_blocks: Dict[str, List]) -> int:
+        """Remove the orphans among `new_blocks`, over and over, as removing
+        one can leave what it used without users
+        """
+
+        purged = 0
+
+        while True:
+
+            orphans = [block for blocks in new_blocks.values() for block in blocks
+                       if _is_orphan(block)]
+
+            if not orphans:
+
+                return purged
+
+            self.bpy.data.batch_remove(orphans)
+
+            purged += len(orphans)
+
+            removed = {id(block) for block in orphans}
+
+            new_blocks = {name: [block for block in blocks if id(block) not in removed]
+                          for name, blocks in new_blocks.items()}
+
+    @property
+    def should_recycle(self) -> bool:
+
+        report = self.last_report
+
+        return bool(self.max_leaked is not None and
+                    self.leaked_total > self.max_leaked) or \
+               bool(self.max_rss is not None and report is not None and
+                    report.rss_after is not None and report.rss_after > self.max_rss)
+
+    @contextlib.contextmanager
+    def track(self, name: str = "task"):
+        """Report on what the block leaves behind, even when it raises
+
+        Yields:
+            the `LeakReport`, filled in once the block is done
+        """
+
+        report = LeakReport(name)
+
+        before = self.snapshot()
+
+        report.rss_before = pool.get_rss()
+
+        started = time.perf_counter()
+
+        try:
+
+            yield report
+
+        finally:
+
+            report.seconds = time.perf_counter() - started
+
+            new_blocks = self._new_blocks(before)
+
+            if self.purge:
+
+                report.purged = self._purge(new_blocks)
+
+                new_blocks = self._new_blocks(before)
+
+            report.leaked = {name: [block.name for block in blocks] for
+                             name, blocks in new_blocks.items() if blocks}
+
+            report.rss_after = pool.get_rss()
+
+            self._record(report)
+
+    def _record(self, report: LeakReport):
+
+        self.last_report = report
+        self.leaked_total += report.leaked_count
+
+        self.sink.increment("tasks")
+        self.sink.increment("purged", report.purged)
+        self.sink.observe("task_seconds", report.seconds)
+        self.sink.observe("leaked_blocks", report.leaked_count)
+
+        for name, names in report.leaked.items():
+
+            self.sink.increment(f"leaked.{name}", len(names))
+
+        if report.rss_delta is not None:
+
+            self.sink.observe("rss_growth", max(report.rss_delta, 0))
+
+        if self.should_recycle:
+
+            self.sink.increment("recycle_requests")
+
+            pool.request_recycle()
+
+    def instrument(self, fn: Callable) -> Callable:
+        """Decorator: track every call of `fn`
+        """
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+
+            with self.track(fn.__qualname__):
+
+                return fn(*args, **kwargs)
+
+        return wrapper
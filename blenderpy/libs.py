@@ -0,0 +1,307 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Deduplicate and strip the shared libraries that go into the wheel
+
+A Blender build leaves libraries in `bin` both under their real name and
+under versioned names that are copies of or links to them, and with their
+debug info. Libraries with the same contents are shipped once and the other
+names recorded in a manifest; wheels can't hold links, so `bpy_post_install`
+links them back. Stripping writes new files from the originals, leaving the
+build untouched (the wheel's build dir hard links to it), and can keep the
+debug info in a separate archive of symbols
+"""
+
+import collections
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from typing import Dict, List, Optional
+
+# Relative imports
+from blenderpy.fileops import file_sha256
+
+LIBRARY_REGEX = re.compile(r".+\.(so(\.\d+)*|dll|dylib)")
+
+# Next to the libraries in site-packages
+LIBS_MANIFEST_NAME = "bpy.libs.json"
+
+ELF_MAGIC = b"\x7fELF"
+
+DEBUG_SUFFIX = ".debug"
+
+def get_libs_install_dir() -> str:
+    """Where the libraries are installed: next to the `blenderpy` package
+    """
+
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def is_library(name: str) -> bool:
+    """Whether `name` is a library to ship, versioned names included; the
+    Python and `bpy` modules themselves aren't
+    """
+
+    return bool(LIBRARY_REGEX.fullmatch(name)) and \
+           not (name.startswith("python") or name.startswith("bpy"))
+
+def list_libraries(bin_dir: str) -> Dict[str, str]:
+
+    return {name: os.path.join(bin_dir, name) for name in sorted(os.listdir(bin_dir))
+            if is_library(name) and os.path.isfile(os.path.join(bin_dir, name))}
+
+class LibraryStats():
+    """What deduplicating and stripping saved
+    """
+
+    def __init__(self):
+
+        self.libraries = 0
+        self.duplicates = 0
+        self.dedupe_saved = 0
+        self.stripped = 0
+        self.strip_saved = 0
+        self.symbols_bytes = 0
+
+    @property
+    def saved(self) -> int:
+
+        return self.dedupe_saved + self.strip_saved
+
+    def to_dict(self) -> Dict[str, int]:
+
+        return {"libraries": self.libraries, "duplicates": self.duplicates,
+                "dedupe_saved": self.dedupe_saved, "stripped": self.stripped,
+                "strip_saved": self.strip_saved, "symbols_bytes": self.symbols_bytes,
+                "saved": self.saved}
+
+    def __str__(self) -> str:
+
+        return (f"{self.libraries} libraries, {self.duplicates} duplicates "
+                f"({self.dedupe_saved / 2 ** 20:.1f} MB), {self.stripped} stripped "
+                f"({self.strip_saved / 2 ** 20:.1f} MB), "
+                f"{self.saved / 2 ** 20:.1f} MB saved")
+
+def _canonical_name(names: List[str], libs: Dict[str, str]) -> str:
+    """The name to ship a group of identical libraries under: what the
+    links point to, else the most specific version
+    """
+
+    targets = {os.path.basename(os.path.realpath(libs[name])) for name in names
+               if os.path.islink(libs[name])}
+
+    candidates = [name for name in names if name in targets] or \
+                 [name for name in names if not os.path.islink(libs[name])] or names
+
+    return sorted(candidates, key=lambda name: (-len(name), name))[0]
+
+def find_duplicates(libs: Dict[str, str],
+                    stats: Optional[LibraryStats] = None) -> Dict[str, str]:
+    """Names mapped to the name of the library with the same contents that
+    is shipped instead; only libraries of the same size are hashed
+    """
+
+    stats = stats if stats is not None else LibraryStats()
+
+    by_size = collections.defaultdict(list)
+
+    for name, path in libs.items():
+
+        by_size[os.path.getsize(path)].append(name)
+
+    aliases = {}
+
+    for size, names in by_size.items():
+
+        if len(names) < 2:
+
+            continue
+
+        by_hash = collections.defaultdict(list)
+
+        for name in names:
+
+            by_hash[file_sha256(libs[name])].append(name)
+
+        for group in by_hash.values():
+
+            canonical = _canonical_name(group, libs)
+
+            for name in group:
+
+                if name != canonical:
+
+                    aliases[name] = canonical
+
+                    stats.duplicates += 1
+                    stats.dedupe_saved += size
+
+    stats.libraries = len(libs) - len(aliases)
+
+    return aliases
+
+def is_elf(path: str) -> bool:
+
+    with open(path, "rb") as library:
+
+        return library.read(4) == ELF_MAGIC
+
+def strip_libraries(libs: Dict[str, str], build_dir: str,
+                    symbols_archive: Optional[str] = None,
+                    stats: Optional[LibraryStats] = None,
+                    objcopy: Optional[str] = None) -> LibraryStats:
+    """Replace the copies of `libs` in `build_dir` with stripped ones
+
+    Every stripped library is a new file made from the original, so the
+    original and anything linked to it stay as they are. With
+    `symbols_archive` the debug info of every library goes into that zip,
+    and the library is tagged with a debug link to it. Only ELF libraries
+    are stripped
+    """
+
+    stats = stats if stats is not None else LibraryStats()
+
+    objcopy = objcopy or shutil.which("objcopy")
+
+    if objcopy is None:
+
+        raise Exception("Stripping libraries needs objcopy, which is not on PATH")
+
+    with tempfile.TemporaryDirectory(prefix="bpy-symbols-") as symbols_dir:
+
+        debug_files = []
+
+        for name, src in sorted(libs.items()):
+
+            if not is_elf(src):
+
+                continue
+
+            dst = os.path.join(build_dir, name)
+
+            temp_path = dst + ".strip.tmp"
+
+            command = [objcopy, "--strip-debug"]
+
+            if symbols_archive is not None:
+
+                debug_path = os.path.join(symbols_dir, name + DEBUG_SUFFIX)
+
+                subprocess.run([objcopy, "--only-keep-debug", src, debug_path],
+                               check=True)
+
+                command.append(f"--add-gnu-debuglink={debug_path}")
+
+                debug_files.append(debug_path)
+
+            subprocess.run(command + [src, temp_path], check=True)
+
+            # Replaces the link to the original rather than writing through it
+            os.replace(temp_path, dst)
+
+            stats.stripped += 1
+            stats.strip_saved += os.path.getsize(src) - os.path.getsize(dst)
+
+        if symbols_archive is not None and debug_files:
+
+            os.makedirs(os.path.dirname(os.path.abspath(symbols_archive)), exist_ok=True)
+
+            with zipfile.ZipFile(symbols_archive + ".tmp", "w",
+                                 zipfile.ZIP_DEFLATED) as archive:
+
+                for debug_path in debug_files:
+
+                    archive.write(debug_path, os.path.basename(debug_path))
+
+            os.replace(symbols_archive + ".tmp", symbols_archive)
+
+            stats.symbols_bytes = os.path.getsize(symbols_archive)
+
+    return stats
+
+def write_libs_manifest(directory: str, aliases: Dict[str, str]) -> str:
+
+    path = os.path.join(directory, LIBS_MANIFEST_NAME)
+
+    with open(path + ".tmp", "w") as manifest_file:
+
+        json.dump({"aliases": aliases}, manifest_file, indent=1, sort_keys=True)
+
+    os.replace(path + ".tmp", path)
+
+    return path
+
+def read_libs_manifest(directory: Optional[str] = None) -> Dict[str, str]:
+
+    try:
+
+        with open(os.path.join(directory or get_libs_install_dir(),
+                               LIBS_MANIFEST_NAME), "r") as manifest_file:
+
+            return json.load(manifest_file)["aliases"]
+
+    except (OSError, ValueError, KeyError):
+
+        return {}
+
+def link_libraries(directory: Optional[str] = None) -> List[str]:
+    """Put the deduplicated names back, as links where the system has them
+
+    Returns:
+        the paths made
+    """
+
+    directory = directory or get_libs_install_dir()
+
+    made = []
+
+    for alias, canonical in sorted(read_libs_manifest(directory).items()):
+
+        alias_path = os.path.join(directory, alias)
+
+        if os.path.lexists(alias_path):
+
+            continue
+
+        try:
+
+            os.symlink(canonical, alias_path)
+
+        except (OSError, NotImplementedError):
+
+            try:
+
+                os.link(os.path.join(directory, canonical), alias_path)
+
+            except OSError:
+
+                shutil.copy2(os.path.join(directory, canonical), alias_path)
+
+        made.append(alias_path)
+
+    return made
+
+def unlink_libraries(directory: Optional[str] = None) -> List[str]:
+    """Remove what `link_libraries` made
+
+    Returns:
+        the paths removed
+    """
+
+    directory = directory or get_libs_install_dir()
+
+    removed = []
+
+    for alias in sorted(read_libs_manifest(directory)):
+
+        alias_path = os.path.join(directory, alias)
+
+        if os.path.lexists(alias_path):
+
+            os.remove(alias_path)
+
+            removed.append(alias_path)
+
+    return removed
@@ -0,0 +1,508 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Cache the results of deterministic `bpy` jobs by the hash of their inputs
+
+Rendering a thumbnail of, exporting or validating the same `.blend` with
+the same script and parameters gives the same output every time. Jobs are
+keyed on the contents of their input files, the source of their script,
+their parameters and the `bpy` build, none of which needs `bpy` imported,
+so a hit returns the stored result and output files without starting
+Blender at all
+
+Entries are assembled in a temporary folder and renamed into place, and
+removed by renaming them away first, so workers on one machine can share a
+cache. The least recently used entries are dropped once the cache grows
+past its size limit; the entries are only scanned for that when what this
+process stored since the last scan could have taken it past the limit, or
+the last scan is a while ago
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Relative imports
+from blenderpy.fileops import file_sha256
+
+RESULT_CACHE_DIR_ENV = "BLENDERPY_RESULT_CACHE"
+RESULT_CACHE_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                        "blenderpy", "results")
+
+# Gigabytes
+RESULT_CACHE_DEFAULT_SIZE_LIMIT = 5
+
+RESULT_CACHE_MANIFEST_NAME = "manifest.json"
+RESULT_CACHE_VALUE_NAME = "value.pickle"
+RESULT_CACHE_FILES_NAME = "files"
+
+# Seconds after which the size of the cache is scanned for again, since
+# other processes store in it too
+RESULT_CACHE_SCAN_INTERVAL = 60
+
+def get_default_result_cache_dir() -> str:
+
+    return os.environ.get(RESULT_CACHE_DIR_ENV, RESULT_CACHE_DEFAULT_DIR)
+
+def get_bpy_build_id(module: str = "bpy") -> Optional[str]:
+    """Tells `bpy` builds apart without importing `bpy`: the size and
+    modification time of the extension module, which are the same wherever
+    the same build is installed from the same wheel
+    """
+
+    try:
+
+        spec = importlib.util.find_spec(module)
+
+    except (ImportError, ValueError):
+
+        return None
+
+    if spec is None or spec.origin is None or not os.path.isfile(spec.origin):
+
+        return None
+
+    stat = os.stat(spec.origin)
+
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_script_hash(script: Union[Callable, str]) -> str:
+    """The hash of the source of a function, or of a script file
+    """
+
+    if callable(script):
+
+        try:
+
+            source = inspect.getsource(script).encode("utf-8")
+
+        except (OSError, TypeError):
+
+            source = script.__code__.co_code
+
+        name = f"{script.__module__}.{script.__qualname__}".encode("utf-8")
+
+        return hashlib.sha256(name + b"\0" + source).hexdigest()
+
+    return file_sha256(script)
+
+def _copy_atomic(src: str, dst: str):
+
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+
+    temp_path = f"{dst}.{os.getpid()}.tmp"
+
+    shutil.copyfile(src, temp_path)
+
+    os.replace(temp_path, dst)
+
+class ResultCache():
+    """A size-limited, least-recently-used store of job results
+
+    Every entry is a folder named by its key holding the pickled value, the
+    output files and a manifest, which records when the entry was last used;
+    file modification times are too coarse on some filesystems to order
+    entries by. One cache can be used from several threads
+    """
+
+    def __init__(self, root: Optional[str] = None,
+                 size_limit: float = RESULT_CACHE_DEFAULT_SIZE_LIMIT,
+                 bpy_build_id: Optional[str] = None):
+
+        self.root = root if root is not None else get_default_result_cache_dir()
+
+        self.size_limit = int(size_limit * 1024 ** 3)
+
+        self.bpy_build_id = bpy_build_id if bpy_build_id is not None else \
+                            get_bpy_build_id()
+
+        self.stats = collections.Counter()
+
+        # (path, size, mtime) -> sha256, so unchanged inputs aren't hashed again
+        self._file_hashes = {} # type: Dict[Tuple[str, int, int], str]
+
+        self._last_used = 0.0
+
+        # The size of the cache as last scanned plus what was stored since,
+        # and when it was scanned
+        self._size_estimate = None # type: Optional[int]
+        self._scanned = 0.0
+
+        # Guards the above and `stats`
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+
+        lookups = self.stats["hits"] + self.stats["misses"]
+
+        return self.stats["hits"] / lookups if lookups else None
+
+    def _hash_input(self, path: str) -> List:
+
+        stat = os.stat(path)
+
+        file_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+
+            file_hash = self._file_hashes.get(file_key)
+
+        if file_hash is None:
+
+            file_hash = file_sha256(path)
+
+            with self._lock:
+
+                self._file_hashes[file_key] = file_hash
+
+        return [stat.st_size, file_hash]
+
+    def key(self, script: Union[Callable, str], params: Any = None,
+            inputs: Iterable[str] = ()) -> str:
+        """Key a job by everything that changes its output
+
+        `params` has to be JSON serializable; input files are keyed by
+        contents, not by path
+        """
+
+        key_data = {"script": get_script_hash(script),
+                    "params": params,
+                    "inputs": [self._hash_input(path) for path in inputs],
+                    "bpy": self.bpy_build_id}
+
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True)
+                                         .encode("utf-8")).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+
+        return os.path.join(self.root, key)
+
+    def _now(self) -> float:
+        """The time to record a use at; increasing within this process even
+        where the clock is coarse
+        """
+
+        with self._lock:
+
+            self._last_used = max(time.time(), self._last_used + 1e-6)
+
+            return self._last_used
+
+    def _write_manifest(self, entry_path: str, manifest: dict):
+
+        temp_path = os.path.join(entry_path,
+                                 f".{RESULT_CACHE_MANIFEST_NAME}.{os.getpid()}.tmp")
+
+        with open(temp_path, "w") as manifest_file:
+
+            json.dump(manifest, manifest_file)
+
+        os.replace(temp_path, os.path.join(entry_path, RESULT_CACHE_MANIFEST_NAME))
+
+    def read_manifest(self, key: str) -> Optional[dict]:
+
+        try:
+
+            with open(os.path.join(self.entry_path(key),
+                                   RESULT_CACHE_MANIFEST_NAME), "r") as manifest:
+
+                return json.load(manifest)
+
+        except (OSError, ValueError):
+
+            return None
+
+    def get(self, key: str, outputs: Iterable[str] = ()) -> Tuple[bool, Any]:
+        """The stored value for `key`, and its output files copied back to
+        `outputs`
+
+        Returns:
+            whether there was an entry, and its value
+        """
+
+        outputs = list(outputs)
+
+        manifest = self.read_manifest(key)
+
+        try:
+
+            if manifest is None or len(manifest["files"]) != len(outputs):
+
+                raise OSError(f"No entry for {key}")
+
+            with open(os.path.join(self.entry_path(key), RESULT_CACHE_VALUE_NAME),
+                      "rb") as value_file:
+
+                value = pickle.load(value_file)
+
+            for index, output in enumerate(outputs):
+
+                _copy_atomic(os.path.join(self.entry_path(key), RESULT_CACHE_FILES_NAME,
+                                          str(index)), output)
+
+            # Mark as most recently used
+            self._write_manifest(self.entry_path(key), dict(manifest, used=self._now()))
+
+        except (OSError, EOFError, pickle.UnpicklingError): # evicted meanwhile
+
+            with self._lock:
+
+                self.stats["misses"] += 1
+
+            return False, None
+
+        with self._lock:
+
+            self.stats["hits"] += 1
+            self.stats["seconds_saved"] += manifest.get("seconds", 0)
+
+        return True, value
+
+    def put(self, key: str, value: Any, outputs: Iterable[str] = (),
+            seconds: float = 0.0):
+        """Store `value` and a copy of the `outputs` files under `key`
+        """
+
+        os.makedirs(self.root, exist_ok=True)
+
+        temp_path = tempfile.mkdtemp(prefix=f".{key}.", dir=self.root)
+
+        try:
+
+            os.mkdir(os.path.join(temp_path, RESULT_CACHE_FILES_NAME))
+
+            with open(os.path.join(temp_path, RESULT_CACHE_VALUE_NAME), "wb") as value_file:
+
+                pickle.dump(value, value_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+            files = []
+
+            for index, output in enumerate(outputs):
+
+                shutil.copyfile(output, os.path.join(temp_path, RESULT_CACHE_FILES_NAME,
+                                                     str(index)))
+
+                files.append(os.path.basename(output))
+
+            size = sum(entry.stat().st_size for entry in os.scandir(temp_path)
+                       if entry.is_file()) + \
+                   sum(entry.stat().st_size for entry in
+                       os.scandir(os.path.join(temp_path, RESULT_CACHE_FILES_NAME)))
+
+            now = self._now()
+
+            self._write_manifest(temp_path, {"key": key, "created": now, "used": now,
+                                             "size": size, "seconds": seconds,
+                                             "files": files})
+
+            try:
+
+                os.rename(temp_path, self.entry_path(key))
+
+            except OSError: # stored by another worker meanwhile, same result
+
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+                return
+
+        except BaseException:
+
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+            raise
+
+        with self._lock:
+
+            self.stats["stores"] += 1
+
+            if self._size_estimate is not None:
+
+                self._size_estimate += size
+
+            scan = self._size_estimate is None or \
+                   self._size_estimate > self.size_limit or \
+                   time.monotonic() - self._scanned > RESULT_CACHE_SCAN_INTERVAL
+
+        if scan:
+
+            self.evict()
+
+    def remove(self, key: str):
+        """Drop an entry; renamed away first, so readers never see it half
+        removed
+        """
+
+        trash_path = tempfile.mkdtemp(prefix=f".{key}.", suffix=".trash", dir=self.root)
+
+        try:
+
+            os.replace(self.entry_path(key), os.path.join(trash_path, key))
+
+        except OSError:
+
+            pass
+
+        shutil.rmtree(trash_path, ignore_errors=True)
+
+    def _scan(self) -> List[Tuple[str, int]]:
+        """Keys and sizes of complete entries, least recently used first,
+        reading every manifest once
+        """
+
+        if not os.path.isdir(self.root):
+
+            return []
+
+        used = {}
+
+        for key in os.listdir(self.root):
+
+            if key.startswith("."):
+
+                continue
+
+            manifest = self.read_manifest(key)
+
+            if manifest is not None:
+
+                used[key] = (manifest.get("used", manifest.get("created", 0)), key,
+                             manifest.get("size", 0))
+
+        return [(key, used[key][2]) for key in sorted(used, key=used.get)]
+
+    def entries(self) -> List[str]:
+        """Keys of complete entries, least recently used first
+        """
+
+        return [key for key, _ in self._scan()]
+
+    def size(self) -> int:
+
+        return sum([size for _, size in self._scan()])
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its limit
+        """
+
+        entries = self._scan()
+
+        total = sum([size for _, size in entries])
+
+        evictions = 0
+
+        for key, size in entries:
+
+            if total <= self.size_limit:
+
+                break
+
+            self.remove(key)
+
+            evictions += 1
+
+            total -= size
+
+        with self._lock:
+
+            self.stats["evictions"] += evictions
+
+            self._size_estimate = total
+            self._scanned = time.monotonic()
+
+    def run(self, fn: Callable, *args, inputs: Iterable[str] = (),
+            outputs: Iterable[str] = (), **kwargs) -> Any:
+        """`fn(*args, **kwargs)`, unless the same call on the same inputs was
+        cached; `outputs` are the files it writes
+        """
+
+        inputs, outputs = list(inputs), list(outputs)
+
+        key = self.key(fn, [list(args), kwargs], inputs)
+
+        hit, value = self.get(key, outputs)
+
+        if hit:
+
+            return value
+
+        started = time.perf_counter()
+
+        value = fn(*args, **kwargs)
+
+        self.put(key, value, outputs, time.perf_counter() - started)
+
+        return value
+
+    def submit(self, pool, fn: Callable, *args, inputs: Iterable[str] = (),
+               outputs: Iterable[str] = (), **kwargs) -> concurrent.futures.Future:
+        """Like `run`, but misses run on a `WarmPool`; hits never reach it
+        """
+
+        inputs, outputs = list(inputs), list(outputs)
+
+        key = self.key(fn, [list(args), kwargs], inputs)
+
+        hit, value = self.get(key, outputs)
+
+        if hit:
+
+            future = concurrent.futures.Future()
+
+            future.set_result(value)
+
+            return future
+
+        started = time.perf_counter()
+
+        future = pool.submit(fn, *args, **kwargs)
+
+        # Resolved only once the result is stored, so that the same job
+        # submitted right after is a hit
+        result = concurrent.futures.Future()
+
+        def store(done: concurrent.futures.Future):
+
+            if done.cancelled():
+
+                result.cancel()
+
+                return
+
+            if done.exception() is not None:
+
+                if not result.cancelled():
+
+                    result.set_exception(done.exception())
+
+                return
+
+            try:
+
+                self.put(key, done.result(), outputs, time.perf_counter() - started)
+
+            finally:
+
+                if not result.cancelled():
+
+                    result.set_result(done.result())
+
+        def cancel(done: concurrent.futures.Future):
+
+            if done.cancelled():
+
+                future.cancel()
+
+        result.add_done_callback(cancel)
+        future.add_done_callback(store)
+
+        return result
@@ -0,0 +1,313 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""A persistent local mirror of the Blender sources
+
+The Blender `git` sources and the precompiled `svn` libraries are fetched once
+into the mirror and brought up to date incrementally afterwards; every build
+then checks out from the mirror with a shallow clone and hard linked libraries.
+With `offline` the mirror is used as is, which also allows builders without
+network access to work from a mirror copied over or served from `file://`
+"""
+
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from typing import Callable, Dict, List, Optional
+
+try:
+
+    import fcntl
+
+except ImportError: # Windows
+
+    fcntl = None
+
+# Relative imports
+from blenderpy.fileops import COPY_METHOD_SYMLINK, copy_files
+
+SOURCE_MIRROR_DIR_ENV = "BLENDERPY_SOURCE_MIRROR"
+SOURCE_MIRROR_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                         "blenderpy", "mirror")
+
+def get_default_source_mirror_dir() -> str:
+
+    return os.environ.get(SOURCE_MIRROR_DIR_ENV, SOURCE_MIRROR_DEFAULT_DIR)
+
+def resolve_submodule_url(base_url: str, url: str) -> str:
+    """Resolve a submodule url relative to the url of its superproject
+
+    Blender lists its submodules as `../blender-addons.git` and the like
+    """
+
+    if not (url.startswith("./") or url.startswith("../")):
+
+        return url
+
+    parts = base_url.rstrip("/").split("/")
+
+    for part in url.split("/"):
+
+        if part == "..":
+
+            parts.pop()
+
+        elif part not in [".", ""]:
+
+            parts.append(part)
+
+    return "/".join(parts)
+
+def path_to_url(path: str) -> str:
+
+    return "file://" + os.path.abspath(path).replace(os.sep, "/")
+
+class SourceMirrorError(Exception):
+    """Raised when the mirror lacks something it can't fetch while offline
+    """
+
+    pass
+
+class SourceMirror():
+    """Bare `git` mirrors and `svn` working copies kept under `root`
+
+    Commands are run through `run`, which takes the command as a list and
+    raises on failure; the build passes its own `spawn` here
+    """
+
+    def __init__(self, root: Optional[str] = None, offline: bool = False,
+                 run: Optional[Callable[[List[str]], None]] = None):
+
+        self.root = root if root is not None else get_default_source_mirror_dir()
+
+        self.offline = offline
+
+        self.run = run if run is not None else subprocess.check_call
+
+    def _path(self, kind: str, url: str, suffix: str = "") -> str:
+
+        name = re.sub(r"[^A-Za-z0-9._-]", "_",
+                      os.path.basename(url.rstrip("/")) or "repo")
+
+        if suffix and name.endswith(suffix):
+
+            name = name[:-len(suffix)]
+
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+
+        return os.path.join(self.root, kind, f"{name}-{url_hash}{suffix}")
+
+    def git_mirror_path(self, url: str) -> str:
+
+        return self._path("git", url, ".git")
+
+    def svn_mirror_path(self, url: str) -> str:
+
+        return self._path("svn", url)
+
+    @contextlib.contextmanager
+    def _locked(self, path: str):
+        """Keep concurrent builds from updating the same mirror at once
+        """
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path + ".lock", "w") as lock_file:
+
+            if fcntl is not None:
+
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+            try:
+
+                yield
+
+            finally:
+
+                if fcntl is not None:
+
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def update_git(self, url: str) -> str:
+        """Make sure the bare mirror of `url` exists and, online, is current
+        """
+
+        mirror_path = self.git_mirror_path(url)
+
+        with self._locked(mirror_path):
+
+            if not os.path.isdir(mirror_path):
+
+                if self.offline:
+
+                    raise SourceMirrorError(f"No mirror of {url} in {self.root} "
+                                            f"and offline")
+
+                self.run(["git", "clone", "--mirror", url, mirror_path])
+
+            elif not self.offline:
+
+                self.run(["git", "-C", mirror_path, "remote", "update", "--prune"])
+
+        return mirror_path
+
+    def checkout_git(self, url: str, ref: Optional[str], destination: str,
+                     shallow: bool = True):
+        """Check `ref` of `url` and its submodules out into `destination`
+        """
+
+        mirror_path = self.update_git(url)
+
+        if os.path.isdir(destination) and os.listdir(destination):
+
+            shutil.rmtree(destination)
+
+        command = ["git", "clone"]
+
+        if shallow:
+
+            command += ["--depth", "1"]
+
+        if ref is not None:
+
+            command += ["--branch", ref]
+
+        # Shallow clones need a url; a plain path would ignore `--depth`
+        self.run(command + [path_to_url(mirror_path), destination])
+
+        for name, submodule in self.get_submodules(destination).items():
+
+            submodule_url = resolve_submodule_url(url, submodule["url"])
+
+            submodule_mirror_path = self.update_git(submodule_url)
+
+            self.run(["git", "-C", destination, "config",
+                      f"submodule.{name}.url", path_to_url(submodule_mirror_path)])
+
+            # Borrow objects from the mirror instead of copying them
+            self.run(["git", "-C", destination, "-c", "protocol.file.allow=always",
+                      "submodule", "update", "--init", "--reference",
+                      submodule_mirror_path, "--", submodule["path"]])
+
+            if ref is not None: # Blender tags its submodules alike
+
+                try:
+
+                    self.run(["git", "-C", os.path.join(destination, submodule["path"]),
+                              "checkout", "--quiet", ref])
+
+                except Exception:
+
+                    pass
+
+    @staticmethod
+    def get_submodules(checkout_path: str) -> Dict[str, Dict[str, str]]:
+        """Submodule names mapped to their `path` and `url` in `.gitmodules`
+        """
+
+        if not os.path.isfile(os.path.join(checkout_path, ".gitmodules")):
+
+            return {}
+
+        output = subprocess.check_output(["git", "config", "--file",
+                                          os.path.join(checkout_path, ".gitmodules"),
+                                          "--get-regexp", r"^submodule\..*\.(path|url)$"],
+                                         universal_newlines=True)
+
+        submodules = {}
+
+        for line in output.splitlines():
+
+            key, value = line.split(" ", 1)
+
+            name, option = key[len("submodule."):].rsplit(".", 1)
+
+            submodules.setdefault(name, {})[option] = value
+
+        return submodules
+
+    def update_svn(self, url: str) -> str:
+        """Make sure the working copy of `url` exists and, online, is current
+        """
+
+        mirror_path = self.svn_mirror_path(url)
+
+        with self._locked(mirror_path):
+
+            if not os.path.isdir(mirror_path):
+
+                if self.offline:
+
+                    raise SourceMirrorError(f"No mirror of {url} in {self.root} "
+                                            f"and offline")
+
+                self.run(["svn", "checkout", url, mirror_path])
+
+            elif not self.offline:
+
+                self.run(["svn", "update", mirror_path])
+
+        return mirror_path
+
+    def checkout_svn(self, url: str, destination: str):
+        """Place the files of `url` in `destination` as links into the mirror
+
+        The libraries are only ever read by the build, so they are linked
+        rather than copied wherever the mirror shares a filesystem. Symbolic
+        links, to files or folders and dangling or not, are made again as
+        they are in the mirror; only regular files are hard linked
+        """
+
+        mirror_path = self.update_svn(url)
+
+        pairs = []
+        symlinks = []
+
+        for _dir, _dirs, _files in os.walk(mirror_path):
+
+            rel_dir = os.path.relpath(_dir, mirror_path)
+
+            for _name in _dirs + _files:
+
+                src = os.path.join(_dir, _name)
+                dst = os.path.normpath(os.path.join(destination, rel_dir, _name))
+
+                if _name == ".svn" or (_name in _dirs and not os.path.islink(src)):
+
+                    continue
+
+                # Never write through a link into the mirror
+                if os.path.isdir(dst) and not os.path.islink(dst):
+
+                    shutil.rmtree(dst)
+
+                elif os.path.lexists(dst):
+
+                    os.remove(dst)
+
+                if os.path.islink(src):
+
+                    symlinks.append((src, dst))
+
+                else:
+
+                    pairs.append((src, dst))
+
+            # `os.walk` lists links to folders with the folders, but doesn't
+            # enter them
+            _dirs[:] = [_sub for _sub in _dirs if _sub != ".svn" and
+                        not os.path.islink(os.path.join(_dir, _sub))]
+
+        stats = copy_files(pairs, hardlink=True)
+
+        for src, dst in symlinks:
+
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+            os.symlink(os.readlink(src), dst, target_is_directory=os.path.isdir(src))
+
+            stats.add(COPY_METHOD_SYMLINK, 0)
+
+        return stats
@@ -0,0 +1,560 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Package one prebuilt Blender into wheels for several interpreters
+
+Replaces looping over the interpreters, building the wheels with `pip wheel`
+and running `auditwheel repair` one wheel at a time. The wheels are assembled
+concurrently from the same staged `bin` tree, each with its own build folders,
+and repaired in a pool of processes. What `auditwheel` grafts into a wheel
+only depends on its shared libraries, so the result of a repair is cached and
+applied to every other wheel with the same libraries instead of repairing it
+again
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from typing import List, Optional
+
+# Relative imports
+from blenderpy.fileops import stream_sha256
+
+REPAIR_CACHE_DIR_ENV = "BLENDERPY_REPAIR_CACHE"
+REPAIR_CACHE_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                        "blenderpy", "repair")
+
+REPAIR_CACHE_MANIFEST_NAME = "manifest.json"
+REPAIR_CACHE_FILES_NAME = "files"
+
+DEFAULT_INTERPRETERS = "/opt/python/cp37*/bin/python"
+
+DEFAULT_PLAT = "manylinux2014_x86_64"
+
+SHARED_LIBRARY_REGEX = re.compile(r"\.(so(\.\d+)*|pyd|dll|dylib)$")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def get_default_repair_cache_dir() -> str:
+
+    return os.environ.get(REPAIR_CACHE_DIR_ENV, REPAIR_CACHE_DEFAULT_DIR)
+
+class PackageWheelsError(Exception):
+    """Raised when a wheel could not be assembled or repaired
+    """
+
+    pass
+
+def _import_wheel_file():
+    """`wheel`'s `WheelFile`; `wheel` is needed to package wheels, not to use
+    `bpy`, so it isn't one of the package's requirements
+    """
+
+    try:
+
+        from wheel.wheelfile import WheelFile
+
+    except ImportError as e:
+
+        raise PackageWheelsError("Packaging wheels needs the wheel package, "
+                                 "install it with: pip install wheel") from e
+
+    return WheelFile
+
+def get_target_name(python: str) -> str:
+    """A folder name for the interpreter, e.g. `cp37-cp37m-1a2b3c4d`
+    """
+
+    # manylinux images keep interpreters in /opt/python/<tag>/bin/python
+    name = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(python))))
+
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", name) or "python"
+
+    return f"{name}-{hashlib.sha1(os.path.abspath(python).encode('utf-8')).hexdigest()[:8]}"
+
+def assemble_wheel(python: str, source_dir: str, prebuilt: str, work_dir: str,
+                   build_options: Optional[List[str]] = None) -> str:
+    """Build the wheel of `source_dir` for `python` from the `prebuilt` tree
+
+    Every build gets its own `egg-info`, `build` and `bdist` folders below
+    `work_dir`, so that builds for different interpreters can run at once
+    from the same source folder; the libraries and scripts are linked from
+    `prebuilt` rather than copied
+    """
+
+    target_dir = os.path.join(os.path.abspath(work_dir), get_target_name(python))
+    dist_dir = os.path.join(target_dir, "dist")
+
+    if os.path.isdir(dist_dir):
+
+        shutil.rmtree(dist_dir)
+
+    os.makedirs(os.path.join(target_dir, "egg"), exist_ok=True)
+
+    subprocess.check_call([python, "setup.py",
+                           "egg_info", "--egg-base", os.path.join(target_dir, "egg"),
+                           "build", "--build-base", os.path.join(target_dir, "build"),
+                           "bdist_wheel", "--bdist-dir", os.path.join(target_dir, "bdist"),
+                           "--dist-dir", dist_dir,
+                           f"--bpy-prebuilt={os.path.abspath(prebuilt)}"] +
+                          list(build_options or []), cwd=source_dir)
+
+    wheels = glob.glob(os.path.join(dist_dir, "*.whl"))
+
+    if len(wheels) != 1:
+
+        raise PackageWheelsError(f"Expected one wheel from {python} in "
+                                 f"{dist_dir}, found {len(wheels)}")
+
+    return wheels[0]
+
+def get_auditwheel_version(auditwheel: str = "auditwheel") -> str:
+
+    return subprocess.check_output([auditwheel, "--version"],
+                                   universal_newlines=True).strip()
+
+def is_platform_wheel(wheel_path: str, auditwheel: str = "auditwheel") -> bool:
+    """Whether `auditwheel` has anything to repair in the wheel
+    """
+
+    return subprocess.call([auditwheel, "show", wheel_path],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL) == 0
+
+def get_shared_libraries_key(wheel_path: str, plat: str, auditwheel_version: str) -> str:
+    """Key a repair by the shared libraries in the wheel and how it's repaired
+    """
+
+    digest = hashlib.sha256(json.dumps([plat, auditwheel_version]).encode("utf-8"))
+
+    with zipfile.ZipFile(wheel_path) as wheel_file:
+
+        for name in sorted(wheel_file.namelist()):
+
+            if not SHARED_LIBRARY_REGEX.search(name):
+
+                continue
+
+            with wheel_file.open(name) as library:
+
+                file_digest = stream_sha256(library)
+
+            digest.update(f"{name}\0{file_digest}\0".encode("utf-8"))
+
+    return digest.hexdigest()
+
+def split_wheel_name(wheel_path: str) -> List[str]:
+    """name, version, [build,] python, abi and platform of a wheel file name
+    """
+
+    return os.path.basename(wheel_path)[:-len(".whl")].split("-")
+
+def _is_dist_info(name: str) -> bool:
+
+    return name.split("/")[0].endswith(".dist-info")
+
+class RepairCache():
+    """The files `auditwheel repair` changed or added, keyed by the shared
+    libraries of the wheel it repaired
+    """
+
+    def __init__(self, root: Optional[str] = None):
+
+        self.root = root if root is not None else get_default_repair_cache_dir()
+
+    def entry_path(self, key: str) -> str:
+
+        return os.path.join(self.root, key)
+
+    def load(self, key: str) -> Optional[dict]:
+
+        try:
+
+            with open(os.path.join(self.entry_path(key),
+                                   REPAIR_CACHE_MANIFEST_NAME), "r") as manifest_file:
+
+                return json.load(manifest_file)
+
+        except (OSError, ValueError):
+
+            return None
+
+    def store(self, key: str, original_path: str, repaired_path: str):
+        """Record how `repaired_path` differs from `original_path`
+
+        `.dist-info` is left out; only the platform tag changes in there and
+        `RECORD` is written anew for every wheel
+        """
+
+        with zipfile.ZipFile(original_path) as original, \
+             zipfile.ZipFile(repaired_path) as repaired:
+
+            original_infos = {info.filename: info for info in original.infolist()}
+
+            repaired_infos = [info for info in repaired.infolist() if
+                              not _is_dist_info(info.filename)]
+
+            temp_path = tempfile.mkdtemp(prefix=f".{key}.", dir=_makedirs(self.root))
+
+            files = {}
+
+            for info in repaired_infos:
+
+                before = original_infos.get(info.filename)
+
+                if before is not None and (before.CRC, before.file_size) == \
+                                          (info.CRC, info.file_size):
+
+                    continue
+
+                files[info.filename] = info.external_attr
+
+                with repaired.open(info) as source, \
+                     open(os.path.join(_makedirs(os.path.join(temp_path, REPAIR_CACHE_FILES_NAME,
+                                                              os.path.dirname(info.filename))),
+                                       os.path.basename(info.filename)), "wb") as destination:
+
+                    shutil.copyfileobj(source, destination, HASH_CHUNK_SIZE)
+
+            repaired_names = {info.filename for info in repaired_infos}
+
+            removed = [name for name in original_infos if not _is_dist_info(name)
+                       and name not in repaired_names]
+
+        with open(os.path.join(temp_path, REPAIR_CACHE_MANIFEST_NAME), "w") as manifest_file:
+
+            json.dump({"created": time.time(),
+                       "platform": split_wheel_name(repaired_path)[-1],
+                       "files": files, "removed": removed}, manifest_file, indent=2)
+
+        # Another process may have stored the same repair meanwhile
+        if os.path.isdir(self.entry_path(key)):
+
+            shutil.rmtree(temp_path)
+
+        else:
+
+            os.rename(temp_path, self.entry_path(key))
+
+    def apply(self, key: str, wheel_path: str, wheel_dir: str) -> str:
+        """Write the repaired version of `wheel_path` into `wheel_dir`
+
+        Does what the cached repair did: replaces and adds the same files,
+        drops the same files and retags the wheel for the repaired platform
+        """
+
+        manifest = self.load(key)
+
+        if manifest is None:
+
+            raise PackageWheelsError(f"No repair cached for {key} in {self.root}")
+
+        WheelFile = _import_wheel_file()
+
+        files_path = os.path.join(self.entry_path(key), REPAIR_CACHE_FILES_NAME)
+
+        parts = split_wheel_name(wheel_path)
+
+        repaired_path = os.path.join(_makedirs(wheel_dir),
+                                     "-".join(parts[:-1] + [manifest["platform"]]) + ".whl")
+
+        with zipfile.ZipFile(wheel_path) as original, \
+             WheelFile(repaired_path, "w") as repaired:
+
+            infos = [info for info in original.infolist() if
+                     info.filename != repaired.record_path and
+                     info.filename not in manifest["removed"]]
+
+            names = {info.filename for info in infos}
+
+            # Added files go before `.dist-info`, which stays last
+            for info in [info for info in infos if not _is_dist_info(info.filename)]:
+
+                if info.filename in manifest["files"]:
+
+                    with open(os.path.join(files_path, info.filename), "rb") as cached:
+
+                        repaired.writestr(_copy_zip_info(info, manifest["files"][info.filename]),
+                                          cached.read())
+
+                else:
+
+                    repaired.writestr(_copy_zip_info(info), original.read(info))
+
+            for name, external_attr in sorted(manifest["files"].items()):
+
+                if name in names:
+
+                    continue
+
+                info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+                info.external_attr = external_attr
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+                with open(os.path.join(files_path, name), "rb") as cached:
+
+                    repaired.writestr(info, cached.read())
+
+            for info in [info for info in infos if _is_dist_info(info.filename)]:
+
+                data = original.read(info)
+
+                if info.filename.endswith("/WHEEL"):
+
+                    data = retag_wheel_metadata(data, manifest["platform"])
+
+                repaired.writestr(_copy_zip_info(info), data)
+
+        return repaired_path
+
+def retag_wheel_metadata(data: bytes, platform: str) -> bytes:
+    """Replace the platform of every `Tag` in a `WHEEL` file, as
+    `auditwheel` does; a compound platform gives one `Tag` per platform
+    """
+
+    lines = []
+
+    for line in data.decode("utf-8").splitlines():
+
+        if line.startswith("Tag: "):
+
+            python_tag, abi_tag, _platform = line[len("Tag: "):].split("-")
+
+            lines += [f"Tag: {python_tag}-{abi_tag}-{_plat}" for _plat in
+                      platform.split(".")]
+
+        else:
+
+            lines.append(line)
+
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def _copy_zip_info(info: zipfile.ZipInfo,
+                   external_attr: Optional[int] = None) -> zipfile.ZipInfo:
+    """A fresh entry like `info`, which belongs to the wheel it was read from
+    """
+
+    result = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    result.external_attr = info.external_attr if external_attr is None else external_attr
+    result.compress_type = info.compress_type
+
+    return result
+
+def _makedirs(path: str) -> str:
+
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+def repair_wheel(wheel_path: str, wheel_dir: str, plat: str = DEFAULT_PLAT,
+                 auditwheel: str = "auditwheel") -> str:
+    """Run `auditwheel repair` and return the path of the repaired wheel
+    """
+
+    temp_dir = tempfile.mkdtemp(prefix=".repair-", dir=_makedirs(wheel_dir))
+
+    try:
+
+        subprocess.check_call([auditwheel, "repair", wheel_path, "--plat", plat,
+                               "-w", temp_dir])
+
+        wheels = glob.glob(os.path.join(temp_dir, "*.whl"))
+
+        if len(wheels) != 1:
+
+            raise PackageWheelsError(f"auditwheel repair of {wheel_path} made "
+                                     f"{len(wheels)} wheels")
+
+        repaired_path = os.path.join(wheel_dir, os.path.basename(wheels[0]))
+
+        os.replace(wheels[0], repaired_path)
+
+    finally:
+
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return repaired_path
+
+def _get_repair_key(wheel_path: str, plat: str, auditwheel: str,
+                    auditwheel_version: str) -> Optional[str]:
+
+    if not is_platform_wheel(wheel_path, auditwheel):
+
+        return None
+
+    return get_shared_libraries_key(wheel_path, plat, auditwheel_version)
+
+def _repair(wheel_path: str, key: Optional[str], wheel_dir: str, plat: str,
+            cache_root: Optional[str], auditwheel: str) -> str:
+    """Runs in the process pool
+    """
+
+    if key is None: # Nothing to graft, the wheel is used as it is
+
+        return shutil.copy(wheel_path, _makedirs(wheel_dir))
+
+    cache = RepairCache(cache_root) if cache_root is not None else None
+
+    if cache is not None and cache.load(key) is not None:
+
+        return cache.apply(key, wheel_path, wheel_dir)
+
+    repaired_path = repair_wheel(wheel_path, wheel_dir, plat, auditwheel)
+
+    if cache is not None:
+
+        cache.store(key, wheel_path, repaired_path)
+
+    return repaired_path
+
+def repair_wheels(wheels: List[str], wheel_dir: str, plat: str = DEFAULT_PLAT,
+                  cache_root: Optional[str] = None, auditwheel: str = "auditwheel",
+                  workers: Optional[int] = None) -> List[str]:
+    """Repair `wheels` into `wheel_dir` in a pool of processes
+
+    Only the first wheel of each set of shared libraries is repaired by
+    `auditwheel`; the others wait for it and reuse its cached result. Without
+    `cache_root` every wheel is repaired
+    """
+
+    auditwheel_version = get_auditwheel_version(auditwheel)
+
+    cache = RepairCache(cache_root) if cache_root is not None else None
+
+    results = {}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+
+        keys = list(pool.map(_get_repair_key, wheels, [plat] * len(wheels),
+                             [auditwheel] * len(wheels),
+                             [auditwheel_version] * len(wheels)))
+
+        first = []
+        rest = []
+
+        leaders = set()
+
+        for wheel_path, key in zip(wheels, keys):
+
+            if cache is not None and key is not None and key in leaders:
+
+                rest.append((wheel_path, key))
+
+            else:
+
+                first.append((wheel_path, key))
+
+                if cache is not None and key is not None and cache.load(key) is None:
+
+                    leaders.add(key)
+
+        for batch in [first, rest]:
+
+            futures = {pool.submit(_repair, wheel_path, key, wheel_dir, plat,
+                                   cache_root, auditwheel): wheel_path for
+                       wheel_path, key in batch}
+
+            for future in concurrent.futures.as_completed(futures):
+
+                results[futures[future]] = future.result()
+
+    return [results[wheel_path] for wheel_path in wheels]
+
+def package_wheels(source_dir: str, prebuilt: str, interpreters: List[str],
+                   wheel_dir: str, work_dir: str, plat: str = DEFAULT_PLAT,
+                   repair: bool = True, cache_root: Optional[str] = None,
+                   build_options: Optional[List[str]] = None,
+                   auditwheel: str = "auditwheel",
+                   jobs: Optional[int] = None) -> List[str]:
+    """Assemble a wheel per interpreter concurrently, then repair them all
+    """
+
+    if not interpreters:
+
+        raise PackageWheelsError("No interpreters to package wheels for")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or
+                                               len(interpreters)) as pool:
+
+        wheels = list(pool.map(lambda python: assemble_wheel(python, source_dir,
+                                                             prebuilt, work_dir,
+                                                             build_options),
+                               interpreters))
+
+    if not repair:
+
+        return [shutil.copy(wheel_path, _makedirs(wheel_dir)) for
+                wheel_path in wheels]
+
+    return repair_wheels(wheels, wheel_dir, plat, cache_root, auditwheel, jobs)
+
+def main(argv: Optional[List[str]] = None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+
+    parser.add_argument("source_dir", nargs="?", default=os.getcwd(),
+                        help="the blenderpy source folder (default: current)")
+    parser.add_argument("--bpy-prebuilt", required=True,
+                        help="the staged Blender bin tree shared by all wheels")
+    parser.add_argument("--python", action="append", dest="interpreters",
+                        help=f"an interpreter to build a wheel for, may be "
+                             f"repeated (default: {DEFAULT_INTERPRETERS})")
+    parser.add_argument("-w", "--wheel-dir", default="wheelhouse",
+                        help="where the finished wheels go")
+    parser.add_argument("--work-dir", default=os.path.join("build", "package-wheels"),
+                        help="where the wheels are assembled")
+    parser.add_argument("--plat", default=DEFAULT_PLAT,
+                        help="the platform tag auditwheel repairs for")
+    parser.add_argument("--no-repair", action="store_true",
+                        help="don't run auditwheel")
+    parser.add_argument("--repair-cache", default=get_default_repair_cache_dir(),
+                        help="where repair results are cached")
+    parser.add_argument("--no-repair-cache", action="store_true",
+                        help="repair every wheel with auditwheel")
+    parser.add_argument("--build-option", action="append", dest="build_options",
+                        default=[], help="passed on to bdist_wheel, may be repeated")
+    parser.add_argument("--auditwheel", default="auditwheel",
+                        help="the auditwheel executable")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="wheels assembled and repaired at once")
+
+    args = parser.parse_args(argv)
+
+    try:
+
+        _import_wheel_file()
+
+    except PackageWheelsError as e:
+
+        raise SystemExit(str(e))
+
+    interpreters = args.interpreters or sorted(glob.glob(DEFAULT_INTERPRETERS))
+
+    start = time.perf_counter()
+
+    wheels = package_wheels(args.source_dir, args.bpy_prebuilt, interpreters,
+                            args.wheel_dir, args.work_dir, args.plat,
+                            repair=not args.no_repair,
+                            cache_root=None if args.no_repair_cache else
+                                       args.repair_cache,
+                            build_options=args.build_options,
+                            auditwheel=args.auditwheel, jobs=args.jobs)
+
+    for wheel_path in wheels:
+
+        print("Packaged " + wheel_path)
+
+    print(f"Packaged {len(wheels)} wheels in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+
+    main(sys.argv[1:])
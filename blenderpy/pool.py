@@ -0,0 +1,821 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""A pool of worker processes that import `bpy` once and keep it warm
+
+Running `import bpy` inside every task of a `ProcessPoolExecutor` pays for
+starting Blender in every worker, and `bpy`'s scripts folders on `sys.path`
+can make the import pick up the wrong `bpy` in the first place. Here every
+worker imports the module once (`bpy` through `blenderpy.importer`, which
+fixes `sys.path`) and runs an initializer, then serves tasks until it is
+recycled after a number of tasks or once its memory grows past a limit.
+Workers are started from a forkserver where there is one, which can preload
+modules that are safe to fork
+
+Tasks get the imported module through `get_module`, which lets a stand-in
+module take the place of `bpy` where Blender isn't installed
+"""
+
+import collections
+import concurrent.futures
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.reduction
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+
+    import resource
+
+except ImportError: # Windows
+
+    resource = None
+
+# Relative imports
+from blenderpy import importer
+from blenderpy.importer import DEFAULT_DEFER_ADDONS, fix_sys_path,\
+                               is_blender_scripts_path
+
+DEFAULT_MODULE = "bpy"
+
+# Workers in a row that may die before they are ready, e.g. segfaulting on
+# import without a word, before the pool gives up on starting them
+MAX_STARTUP_CRASHES = 3
+
+# `ru_maxrss` is in kilobytes everywhere but macOS, where it is in bytes
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# The module imported by this worker, see `get_module`
+_worker_module = None
+
+# The worker's end of its pipe to the parent, see `report_progress`
+_worker_conn = None
+
+# Whether the running task asked for its worker to be replaced
+_recycle_requested = False
+
+def get_module():
+    """The module the worker running this task imported, usually `bpy`
+    """
+
+    if _worker_module is None:
+
+        raise WorkerError("Not running in a WarmPool worker")
+
+    return _worker_module
+
+def report_progress(value: Any):
+    """Send `value` to the parent while a task runs, e.g. how far along it
+    is; does nothing outside of a worker
+    """
+
+    if _worker_conn is not None:
+
+        _worker_conn.send(("progress", value))
+
+def request_recycle():
+    """Have this worker replaced once the running task is done, e.g. when
+    the task finds it leaked memory; does nothing outside of a worker
+    """
+
+    global _recycle_requested
+
+    _recycle_requested = _worker_conn is not None
+
+def get_rss() -> Optional[int]:
+    """The current resident memory of this process in bytes, or its peak
+    where the current one can't be told
+    """
+
+    try:
+
+        with open("/proc/self/statm", "r") as statm:
+
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, ValueError, IndexError, AttributeError):
+
+        pass
+
+    if resource is not None:
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_SCALE
+
+    return None
+
+def get_start_method() -> str:
+    """forkserver where there is one; a plain fork would copy the threads and
+    state of the parent, which Blender doesn't survive
+    """
+
+    return "forkserver" if "forkserver" in \
+           multiprocessing.get_all_start_methods() else "spawn"
+
+class WorkerError(Exception):
+    """Raised for a task whose worker died or whose result couldn't be sent
+    """
+
+    pass
+
+class PoolBrokenError(WorkerError):
+    """Raised for every task once workers fail to import or initialise
+    """
+
+    pass
+
+def _picklable_exception(exception: BaseException) -> BaseException:
+
+    try:
+
+        multiprocessing.reduction.ForkingPickler.dumps(exception)
+
+        return exception
+
+    except Exception:
+
+        return WorkerError("".join(traceback.format_exception(type(exception),
+                                                              exception,
+                                                              exception.__traceback__)))
+
+def _worker_main(conn: multiprocessing.connection.Connection, sys_path: List[str],
+                 module_name: str, initializer: Optional[Callable],
+                 initargs: Tuple, max_tasks: Optional[int], max_rss: Optional[int],
+                 defer_addons: bool = DEFAULT_DEFER_ADDONS,
+                 environment: Optional[Dict[str, str]] = None):
+    """Runs in the worker process
+    """
+
+    global _worker_module, _worker_conn
+
+    _worker_conn = conn
+
+    sys.path[:] = sys_path
+
+    # The forkserver may have started before the parent looked things up
+    os.environ.update(environment or {})
+
+    started = time.perf_counter()
+
+    try:
+
+        _worker_module = importer.import_module(module_name, defer_addons)
+
+        if initializer is not None:
+
+            initializer(*initargs)
+
+    except BaseException as e:
+
+        conn.send(("init-error", _picklable_exception(e)))
+
+        return
+
+    conn.send(("ready", time.perf_counter() - started))
+
+    tasks = 0
+
+    while True:
+
+        try:
+
+            message = conn.recv()
+
+        except (EOFError, OSError):
+
+            return
+
+        if message is None:
+
+            return
+
+        fn, args, kwargs = message
+
+        try:
+
+            outcome = ("result", fn(*args, **kwargs))
+
+        except BaseException as e:
+
+            outcome = ("exception", _picklable_exception(e))
+
+        tasks += 1
+
+        rss = get_rss()
+
+        recycle = bool(max_tasks and tasks >= max_tasks) or \
+                  bool(max_rss and rss is not None and rss > max_rss) or \
+                  _recycle_requested
+
+        try:
+
+            conn.send(("done",) + outcome + (rss, recycle))
+
+        except Exception as e: # the result can't be pickled
+
+            conn.send(("done", "exception", _picklable_exception(e), rss, recycle))
+
+        if recycle:
+
+            return
+
+class _Task():
+    """A submitted call and the future its outcome goes to
+    """
+
+    def __init__(self, fn: Callable, args: Tuple, kwargs: Dict,
+                 timeout: Optional[float] = None,
+                 progress: Optional[Callable[[Any], None]] = None):
+
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.progress = progress
+
+        self.future = concurrent.futures.Future()
+
+        self.deadline = None
+
+class _Worker():
+    """The parent's end of a worker process
+    """
+
+    def __init__(self, process, conn: multiprocessing.connection.Connection):
+
+        self.process = process
+        self.conn = conn
+
+        self.task = None
+        self.tasks = 0
+        self.ready = False
+        self.alive = True
+        self.rss = None
+
+    @property
+    def idle(self) -> bool:
+
+        return self.ready and self.alive and self.task is None
+
+    @property
+    def pid(self) -> Optional[int]:
+
+        return self.process.pid
+
+class WarmPool():
+    """Worker processes with `module` imported, serving submitted calls
+
+    Each worker runs `initializer(*initargs)` once after the import. A worker
+    is replaced by a fresh one after `max_tasks` tasks or once a task leaves
+    it with more than `max_rss` bytes resident.
+
+    A worker's module state is kept from one task to the next: for `bpy`,
+    everything in `bpy.data`, the scenes, the preferences and enabled
+    add-ons, as well as the module globals of the task's own code. Only a
+    replaced worker starts over from a fresh import.
+
+    `preload_module` also imports `module` in the forkserver, so workers are
+    forked with it imported. Don't use it for `bpy`: it starts threads on
+    import, and a forked child has none of them.
+
+    `defer_addons` keeps `bpy`'s add-on folders off `sys.path` in the workers,
+    see `blenderpy.importer.defer_addon_paths`. For `bpy` the scripts
+    directory is looked up once here and handed to every worker
+    """
+
+    def __init__(self, workers: Optional[int] = None, module: str = DEFAULT_MODULE,
+                 initializer: Optional[Callable] = None, initargs: Tuple = (),
+                 max_tasks: Optional[int] = None, max_rss: Optional[int] = None,
+                 preload_module: bool = False, start_method: Optional[str] = None,
+                 defer_addons: bool = DEFAULT_DEFER_ADDONS):
+
+        self.workers = workers or os.cpu_count() or 1
+        self.module = module
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.defer_addons = defer_addons
+
+        if module == "bpy":
+
+            importer.resolve_scripts_directory()
+
+        self._context = multiprocessing.get_context(start_method or get_start_method())
+
+        if self._context.get_start_method() == "forkserver":
+
+            self._context.set_forkserver_preload(["blenderpy.pool"] +
+                                                 ([module] if preload_module else []))
+
+        self.stats = collections.Counter()
+        self.startup_times = []
+
+        # A condition, so that subclasses can wait for the queue to change
+        self._lock = threading.Condition()
+        self._pending = self._new_pending()
+        self._workers = [] # type: List[_Worker]
+        self._shutdown = False
+        self._broken = None
+        self._startup_crashes = 0
+
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+
+        for _ in range(self.workers):
+
+            self._start_worker()
+
+        self._thread = threading.Thread(target=self._manage, daemon=True,
+                                        name="WarmPool")
+        self._thread.start()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.shutdown(wait=True)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Run `fn(*args, **kwargs)` in a worker
+        """
+
+        return self._submit(_Task(fn, args, kwargs))
+
+    def submit_call(self, fn: Callable, args: Tuple = (), kwargs: Optional[Dict] = None,
+                    timeout: Optional[float] = None,
+                    progress: Optional[Callable[[Any], None]] = None) -> concurrent.futures.Future:
+        """Like `submit`; the worker is stopped once the call runs longer than
+        `timeout`, and `progress` gets what the call passes to
+        `report_progress`, in the pool's thread
+        """
+
+        return self._submit(_Task(fn, args, kwargs or {}, timeout, progress))
+
+    def map(self, fn: Callable, *iterables: Iterable) -> Iterator[Any]:
+        """Like `Executor.map`, results in order
+        """
+
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+
+        def results():
+
+            for future in futures:
+
+                yield future.result()
+
+        return results()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for every worker to have imported the module and initialised
+        """
+
+        with self._lock:
+
+            return self._lock.wait_for(lambda: self._broken is not None or
+                                               all(worker.ready for worker in
+                                                   self._workers),
+                                       timeout=timeout)
+
+    def health(self) -> Dict[str, Any]:
+        """Worker and queue counts, and the pool's counters, taken together
+        """
+
+        with self._lock:
+
+            return {"workers": len(self._workers),
+                    "ready": sum(1 for worker in self._workers if worker.ready),
+                    "busy": sum(1 for worker in self._workers if
+                                worker.task is not None),
+                    "pending": len(self._pending),
+                    "broken": self._broken is not None,
+                    "stats": dict(self.stats)}
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once everything submitted has run
+        """
+
+        with self._lock:
+
+            self._shutdown = True
+
+        self._wakeup()
+
+        if wait:
+
+            self._thread.join()
+
+    def _submit(self, task: _Task) -> concurrent.futures.Future:
+
+        with self._lock:
+
+            self._wait_for_room(task)
+
+            if self._broken is not None:
+
+                raise PoolBrokenError(f"Workers failed to start: {self._broken}")
+
+            if self._shutdown:
+
+                raise RuntimeError("Cannot submit to a WarmPool after shutdown")
+
+            self._push(task)
+
+        self._wakeup()
+
+        return task.future
+
+    def _wakeup(self):
+
+        try:
+
+            self._wakeup_writer.send(None)
+
+        except OSError: # Closed by the manager after shutdown
+
+            pass
+
+    def _start_worker(self) -> _Worker:
+
+        parent_conn, child_conn = self._context.Pipe()
+
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, fix_sys_path(),
+                                              self.module, self.initializer,
+                                              self.initargs, self.max_tasks,
+                                              self.max_rss, self.defer_addons,
+                                              importer.get_scripts_environment()),
+                                        daemon=True)
+        process.start()
+
+        child_conn.close()
+
+        worker = _Worker(process, parent_conn)
+
+        self._workers.append(worker)
+
+        self.stats["workers_started"] += 1
+
+        return worker
+
+    def _retire_worker(self, worker: _Worker, replace: bool = True):
+
+        self._workers.remove(worker)
+
+        self._on_retire(worker)
+
+        worker.conn.close()
+
+        worker.process.join(timeout=5)
+
+        if worker.process.is_alive():
+
+            worker.process.terminate()
+            worker.process.join()
+
+        if replace and not self._shutdown and self._broken is None:
+
+            self._start_worker()
+
+    def _new_pending(self):
+        """The container of queued tasks, first in first out here
+        """
+
+        return collections.deque()
+
+    def _wait_for_room(self, task: _Task):
+        """Block `submit` while the queue is full; called with `_lock` held.
+        Unbounded here
+        """
+
+        pass
+
+    def _push(self, task: _Task):
+        """Queue a submitted task; called with `_lock` held
+        """
+
+        self._pending.append(task)
+
+    def _requeue(self, task: _Task):
+        """Put back a task that couldn't be sent; called with `_lock` held
+        """
+
+        self._pending.appendleft(task)
+
+    def _select(self, idle: List[_Worker]) -> Optional[Tuple[_Task, _Worker]]:
+        """The next task to run and the idle worker to run it on; subclasses
+        override this to route tasks. Called with `_lock` held
+        """
+
+        if not self._pending or not idle:
+
+            return None
+
+        return self._pending.popleft(), idle[0]
+
+    def _dispatch(self):
+
+        while True:
+
+            with self._lock:
+
+                selection = self._select([worker for worker in self._workers if
+                                          worker.idle])
+
+            if selection is None:
+
+                return
+
+            task, worker = selection
+
+            # Requeued tasks are running already
+            if not task.future.running() and \
+               not task.future.set_running_or_notify_cancel():
+
+                continue
+
+            try:
+
+                worker.conn.send((task.fn, task.args, task.kwargs))
+
+            except (OSError, EOFError): # died since, picked up by `_manage`
+
+                with self._lock:
+
+                    self._requeue(task)
+
+                worker.alive = False
+
+                continue
+
+            except Exception as e: # the call can't be pickled
+
+                task.future.set_exception(e)
+
+                continue
+
+            worker.task = task
+
+            if task.timeout is not None:
+
+                task.deadline = time.monotonic() + task.timeout
+
+            self._on_dispatch(task, worker)
+
+    def _on_dispatch(self, task: _Task, worker: _Worker):
+        """Called once `task` has been sent to `worker`
+        """
+
+        pass
+
+    def _on_done(self, task: _Task, worker: _Worker):
+        """Called once `worker` has finished `task`, whatever the outcome
+        """
+
+        pass
+
+    def _on_retire(self, worker: _Worker):
+        """Called once `worker` has stopped, for whatever reason
+        """
+
+        pass
+
+    def _receive(self, worker: _Worker):
+
+        try:
+
+            message = worker.conn.recv()
+
+        except (EOFError, OSError):
+
+            task = worker.task
+
+            self.stats["workers_crashed"] += 1
+
+            if not worker.ready:
+
+                self._startup_crashes += 1
+
+                if self._startup_crashes >= MAX_STARTUP_CRASHES:
+
+                    worker.process.join(timeout=5)
+
+                    self._break(WorkerError(f"{self._startup_crashes} workers in a row "
+                                            f"exited before they were ready, the "
+                                            f"last with code "
+                                            f"{worker.process.exitcode}"))
+
+                    return
+
+            try:
+
+                self._retire_worker(worker)
+
+            finally: # even when no worker can be started in its place
+
+                if task is not None:
+
+                    self._on_done(task, worker)
+
+                    task.future.set_exception(WorkerError(f"Worker {worker.pid} "
+                                                          f"exited with code "
+                                                          f"{worker.process.exitcode} "
+                                                          f"running {task.fn!r}"))
+
+            return
+
+        if message[0] == "ready":
+
+            self._startup_crashes = 0
+
+            with self._lock:
+
+                worker.ready = True
+
+                self._lock.notify_all()
+
+            self.startup_times.append(message[1])
+
+        elif message[0] == "progress":
+
+            if worker.task is not None and worker.task.progress is not None:
+
+                worker.task.progress(message[1])
+
+        elif message[0] == "init-error":
+
+            self._break(message[1])
+
+        elif message[0] == "done":
+
+            _, kind, value, worker.rss, recycle = message
+
+            task, worker.task = worker.task, None
+
+            worker.tasks += 1
+
+            self.stats["tasks"] += 1
+
+            self._on_done(task, worker)
+
+            if kind == "result":
+
+                task.future.set_result(value)
+
+            else:
+
+                task.future.set_exception(value)
+
+            if recycle:
+
+                self.stats["workers_recycled"] += 1
+
+                self._retire_worker(worker)
+
+    def _break(self, exception: BaseException):
+        """Workers can't start; fail everything rather than restart them
+        forever
+        """
+
+        with self._lock:
+
+            self._broken = exception
+
+            tasks = list(self._pending) + [worker.task for worker in self._workers
+                                           if worker.task is not None]
+
+            self._pending.clear()
+
+            for worker in self._workers:
+
+                worker.task = None
+
+            self._lock.notify_all()
+
+        # Fail the futures first, so nothing waits on them should stopping
+        # the workers fail too
+        for task in tasks:
+
+            if not task.future.done():
+
+                task.future.set_exception(PoolBrokenError(f"Workers failed to "
+                                                          f"start: {exception}"))
+
+        for worker in list(self._workers):
+
+            self._retire_worker(worker, replace=False)
+
+    def _expire(self):
+        """Stop the workers of tasks that ran past their timeout
+        """
+
+        now = time.monotonic()
+
+        for worker in list(self._workers):
+
+            task = worker.task
+
+            if task is not None and task.deadline is not None and now >= task.deadline:
+
+                self.stats["tasks_timed_out"] += 1
+
+                worker.process.terminate()
+
+                try:
+
+                    self._retire_worker(worker)
+
+                finally:
+
+                    self._on_done(task, worker)
+
+                    task.future.set_exception(concurrent.futures.TimeoutError(
+                        f"{task.fn!r} ran longer than {task.timeout} s"))
+
+    def _next_deadline(self) -> Optional[float]:
+
+        deadlines = [worker.task.deadline for worker in self._workers if
+                     worker.task is not None and worker.task.deadline is not None]
+
+        return max(0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def _manage_once(self) -> bool:
+        """Hand out what can be, then wait for workers once
+
+        Returns:
+            whether there is anything left to wait for
+        """
+
+        self._dispatch()
+
+        with self._lock:
+
+            if (self._shutdown or self._broken is not None) and \
+               not self._pending and \
+               all(worker.task is None for worker in self._workers):
+
+                return False
+
+        connections = {worker.conn: worker for worker in self._workers}
+
+        ready = multiprocessing.connection.wait(list(connections) +
+                                                [self._wakeup_reader],
+                                                timeout=self._next_deadline())
+
+        for conn in ready:
+
+            if conn is self._wakeup_reader:
+
+                while self._wakeup_reader.poll():
+
+                    self._wakeup_reader.recv()
+
+            elif connections[conn] in self._workers: # not retired meanwhile
+
+                self._receive(connections[conn])
+
+        self._expire()
+
+        return True
+
+    def _manage(self):
+        """Runs in a thread of the parent: hands out tasks and collects results
+        """
+
+        while True:
+
+            try:
+
+                if not self._manage_once():
+
+                    break
+
+            except Exception as e: # nothing would ever finish the futures
+
+                self.stats["manager_errors"] += 1
+
+                if self._broken is not None:
+
+                    break
+
+                self._break(WorkerError(f"The pool failed: "
+                                        f"{traceback.format_exc()}"))
+
+        for worker in list(self._workers):
+
+            try:
+
+                worker.conn.send(None)
+
+            except OSError:
+
+                pass
+
+            self._retire_worker(worker, replace=False)
+
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
@@ -1,46 +1,95 @@
-#! /usr/bin/python
-# -*- coding: utf-8
-"""Post install script
-"""
-
-import os
-import pathlib
-import shutil
-
-# Relative imports
-from blenderpy import find_blender_scripts_directory,\
-                      get_blender_scripts_install_dir,\
-                      get_python_scripts_directory
-
-def install_scripts_directory():
-
-    blender_scripts_search_root_dir = get_python_scripts_directory()
-    blender_scripts_install_dir = get_blender_scripts_install_dir()
-
-    blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
-
-    if blender_scripts_current_dir is not None:
-
-        print("Found Blender scripts directory at " + blender_scripts_current_dir)
-
-        if str(pathlib.Path(blender_scripts_current_dir).parent.absolute()).casefold() == blender_scripts_install_dir.casefold():
-
-            print(blender_scripts_current_dir+" already direct child of "+blender_scripts_install_dir)
-
-        else:
-
-            print("Moving "+blender_scripts_current_dir+" to "+blender_scripts_install_dir)
-
-            shutil.move(blender_scripts_current_dir, 
-                        os.path.join(blender_scripts_install_dir, 
-                                     os.path.basename(blender_scripts_current_dir)))
-
-    else:
-
-        raise Exception("Could not find Blender scripts directory in "
-                        +blender_scripts_search_root_dir)
-
-def post_install():
-
-    install_scripts_directory()
-    print("Configuration complete, enjoy using Blender as a Python module!")
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Post install script
+"""
+
+import os
+import pathlib
+
+# Relative imports
+from blenderpy import find_blender_scripts_directory,\
+                      get_blender_scripts_install_dir,\
+                      get_python_scripts_directory,\
+                      write_blender_scripts_index,\
+                      write_blender_scripts_manifest
+from blenderpy.fileops import list_tree, relocate_tree
+from blenderpy.libs import link_libraries
+from blenderpy.resources import find_bundles, install_bundle
+
+def install_scripts_directory():
+
+    blender_scripts_search_root_dir = get_python_scripts_directory()
+    blender_scripts_install_dir = get_blender_scripts_install_dir()
+
+    blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
+
+    if blender_scripts_current_dir is not None:
+
+        print("Found Blender scripts directory at " + blender_scripts_current_dir)
+
+        if str(pathlib.Path(blender_scripts_current_dir).parent.absolute()).casefold() == blender_scripts_install_dir.casefold():
+
+            print(blender_scripts_current_dir+" already direct child of "+blender_scripts_install_dir)
+
+            write_blender_scripts_manifest(list_tree(blender_scripts_current_dir)[1])
+            write_blender_scripts_index(blender_scripts_current_dir)
+
+        else:
+
+            print("Moving "+blender_scripts_current_dir+" to "+blender_scripts_install_dir)
+
+            blender_scripts_new_dir = os.path.join(blender_scripts_install_dir, 
+                                                   os.path.basename(blender_scripts_current_dir))
+
+            stats = relocate_tree(blender_scripts_current_dir, blender_scripts_new_dir)
+
+            print("Moved "+str(stats))
+
+            write_blender_scripts_manifest(list_tree(blender_scripts_new_dir)[1])
+            write_blender_scripts_index(blender_scripts_new_dir)
+
+    elif find_bundles(blender_scripts_search_root_dir):
+
+        # Built with --bpy-pack-resources: one archive instead of the folder
+        installed_files = []
+
+        for bundle_path in find_bundles(blender_scripts_search_root_dir):
+
+            print("Installing "+bundle_path+" into "+blender_scripts_install_dir)
+
+            blender_scripts_new_dir = install_bundle(bundle_path,
+                                                     blender_scripts_install_dir)
+
+            print("Installed "+blender_scripts_new_dir)
+
+            # Only the link is placed; the extracted files go with the last
+            # link to them, see `blenderpy.resources.uninstall_bundle`
+            if not os.path.islink(blender_scripts_new_dir):
+
+                installed_files.extend(list_tree(blender_scripts_new_dir)[1])
+
+            # Written after every bundle, so that a failing one leaves those
+            # before it recorded; the last, newest version is the one indexed
+            write_blender_scripts_manifest(installed_files)
+            write_blender_scripts_index(blender_scripts_new_dir)
+
+    else:
+
+        raise Exception("Could not find Blender scripts directory in "
+                        +blender_scripts_search_root_dir)
+
+def install_library_links():
+    """Link back the libraries the wheel ships once, see --bpy-dedupe-libs
+    """
+
+    made = link_libraries()
+
+    if made:
+
+        print("Linked "+str(len(made))+" deduplicated libraries")
+
+def post_install():
+
+    install_library_links()
+    install_scripts_directory()
+    print("Configuration complete, enjoy using Blender as a Python module!")
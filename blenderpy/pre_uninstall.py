@@ -1,51 +1,88 @@
-#! /usr/bin/python
-# -*- coding: utf-8
-"""Pre uninstall script
-"""
-import shutil
-
-from blenderpy import find_blender_scripts_directory,\
-                      get_blender_scripts_install_dir,\
-                      get_python_scripts_directory
-
-def remove_blender_scripts_dir():
-    """Find and remove the blender scripts directory
-    """
-
-    blender_scripts_search_root_dir = get_blender_scripts_install_dir()
-
-    blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
-
-    if blender_scripts_current_dir is not None:
-
-        print("Found blender scripts dir at "+blender_scripts_current_dir)
-        print("Removing "+blender_scripts_current_dir)
-
-        shutil.rmtree(blender_scripts_current_dir)
-
-    else:
-
-        print("Did not find Blender scripts at post_install script location")
-        print("Did you forget to perform bpy_post_install after installing?")
-        print("Searching original pip install location")
-
-        blender_scripts_search_root_dir = get_python_scripts_directory()
-
-        blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
-
-        if blender_scripts_current_dir is not None:
-
-            print("Found blender scripts dir at "+blender_scripts_current_dir)
-            print("Removing "+blender_scripts_current_dir)
-
-            shutil.rmtree(blender_scripts_current_dir)
-
-        else:
-
-            raise Exception("Could not find Blender scripts directory in "
-                            +blender_scripts_search_root_dir)
-
-def pre_uninstall():
-    print("Searching for and removing non-tracked files & folders")
-    remove_blender_scripts_dir()
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Pre uninstall script
+"""
+import os
+
+from blenderpy import find_blender_scripts_directory,\
+                      get_blender_scripts_install_dir,\
+                      get_python_scripts_directory,\
+                      read_blender_scripts_index,\
+                      read_blender_scripts_manifest,\
+                      remove_blender_scripts_index
+from blenderpy.fileops import remove_tree
+from blenderpy.libs import unlink_libraries
+from blenderpy.resources import uninstall_bundle
+
+def remove_blender_scripts_dir():
+    """Find and remove the blender scripts directory
+
+    Uses the location and file manifest recorded by `bpy_post_install`, only
+    searching for the directory when those are missing
+    """
+
+    blender_scripts_current_dir = read_blender_scripts_index()
+    blender_scripts_files = read_blender_scripts_manifest()
+
+    if blender_scripts_current_dir is not None and \
+       os.path.islink(blender_scripts_current_dir):
+
+        # A bundle linked by `bpy_post_install`; the extracted files go
+        # with the last link to them
+        print("Removing the link "+blender_scripts_current_dir)
+
+        uninstall_bundle(blender_scripts_current_dir)
+
+        return
+
+    if blender_scripts_current_dir is not None and \
+       blender_scripts_files is not None:
+
+        print("Removing "+blender_scripts_current_dir+" as recorded by "
+              "bpy_post_install")
+
+        stats = remove_tree(blender_scripts_current_dir, blender_scripts_files)
+
+        print("Removed "+str(stats))
+
+        return
+
+    blender_scripts_search_root_dir = get_blender_scripts_install_dir()
+
+    blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
+
+    if blender_scripts_current_dir is not None:
+
+        print("Found blender scripts dir at "+blender_scripts_current_dir)
+        print("Removing "+blender_scripts_current_dir)
+
+        remove_tree(blender_scripts_current_dir)
+
+    else:
+
+        print("Did not find Blender scripts at post_install script location")
+        print("Did you forget to perform bpy_post_install after installing?")
+        print("Searching original pip install location")
+
+        blender_scripts_search_root_dir = get_python_scripts_directory()
+
+        blender_scripts_current_dir = find_blender_scripts_directory(blender_scripts_search_root_dir)
+
+        if blender_scripts_current_dir is not None:
+
+            print("Found blender scripts dir at "+blender_scripts_current_dir)
+            print("Removing "+blender_scripts_current_dir)
+
+            remove_tree(blender_scripts_current_dir)
+
+        else:
+
+            raise Exception("Could not find Blender scripts directory in "
+                            +blender_scripts_search_root_dir)
+
+def pre_uninstall():
+    print("Searching for and removing non-tracked files & folders")
+    remove_blender_scripts_dir()
+    remove_blender_scripts_index()
+    unlink_libraries()
     print("Pre uninstall is complete")
\ No newline at end of file
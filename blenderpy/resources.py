@@ -0,0 +1,537 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Ship Blender's `datafiles` and `scripts` as one indexed archive
+
+The version folder (e.g. `2.93`) holds tens of thousands of small files,
+which are slow to install, move and remove and cost an inode each. A bundle
+packs them into one file: a header, the files one after the other, and an
+index of where each one is, so that looking a file up reads no directory.
+Files are stored as they are when compressing doesn't pay, so they can be
+mapped read-only straight from the bundle
+
+Files are extracted on first use into a cache folder named after the
+bundle's contents. An install extracts next to the version folder it links,
+under the same prefix, unless `$BPY_RESOURCE_CACHE` names a cache to share
+between installs; the extracted folder records the links to it and goes
+once the last of them is uninstalled. Extracted next to the install, the
+files take as many inodes and `stat` calls as the unpacked folder would; it
+is only with a shared `$BPY_RESOURCE_CACHE` that installs of the same bundle
+share one copy. Files are written under a temporary name and renamed into
+place, so processes extracting at the same time never see half a file, and
+installs and uninstalls of the same bundle take a lock file next to its
+extracted folder
+"""
+
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from typing import Any, Dict, List, Optional
+
+try:
+
+    import fcntl
+
+except ImportError: # Windows
+
+    fcntl = None
+
+# Relative imports
+from blenderpy import BLENDER_SCRIPTS_DIR_PATTERN
+from blenderpy.fileops import remove_tree
+
+BUNDLE_SUFFIX = ".bpypack"
+BUNDLE_REGEX = re.compile(BLENDER_SCRIPTS_DIR_PATTERN + re.escape(BUNDLE_SUFFIX))
+
+BUNDLE_MAGIC = b"BPYPACK1"
+
+# Magic, then the offset and length of the index
+BUNDLE_HEADER = struct.Struct("<8sQQ")
+
+# Compressing has to save this much of a file for it to be compressed
+MIN_COMPRESSION_SAVING = 0.1
+
+# Written into an extracted folder once everything in it is there
+COMPLETE_MARKER = ".complete"
+
+# The folder of an extracted bundle recording the links to it, one file each
+LINKS_DIR_NAME = ".links"
+
+# Where an install extracts its bundles, inside the folder it links them in
+INSTALL_CACHE_DIR_NAME = ".bpy-resources"
+
+class BundleError(Exception):
+    """Raised for a file that isn't a bundle or a path that isn't in it
+    """
+
+    pass
+
+def get_cache_root(install_dir: Optional[str] = None) -> str:
+    """Where bundles are extracted: `$BPY_RESOURCE_CACHE`, else a folder in
+    `install_dir` when installing, else the user's cache folder
+    """
+
+    if os.environ.get("BPY_RESOURCE_CACHE"):
+
+        return os.environ["BPY_RESOURCE_CACHE"]
+
+    if install_dir is not None:
+
+        return os.path.join(install_dir, INSTALL_CACHE_DIR_NAME)
+
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+
+        return os.path.join(os.environ["LOCALAPPDATA"], "blenderpy", "resources")
+
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                        os.path.join(str(pathlib.Path.home()), ".cache"),
+                        "blenderpy", "resources")
+
+def write_bundle(source_dir: str, path: str, compresslevel: int = 6) -> Dict[str, int]:
+    """Pack everything under `source_dir` into the bundle `path`
+
+    Returns:
+        how many files were packed, how many compressed, and the bytes before
+        and after
+    """
+
+    stats = {"files": 0, "compressed": 0, "bytes": 0, "packed_bytes": 0}
+
+    files = {}
+    directories = []
+    digest = hashlib.sha256()
+
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as bundle:
+
+        bundle.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, 0, 0))
+
+        for root, dirs, names in os.walk(source_dir):
+
+            dirs.sort()
+
+            relative_root = os.path.relpath(root, source_dir).replace(os.sep, "/")
+
+            if relative_root != ".":
+
+                directories.append(relative_root)
+
+            for name in sorted(names):
+
+                relative_path = name if relative_root == "." else \
+                                f"{relative_root}/{name}"
+
+                with open(os.path.join(root, name), "rb") as source:
+
+                    data = source.read()
+
+                digest.update(relative_path.encode("utf-8") + b"\0" + data)
+
+                packed = zlib.compress(data, compresslevel)
+
+                compressed = len(packed) <= len(data) * (1 - MIN_COMPRESSION_SAVING)
+
+                if not compressed:
+
+                    packed = data
+
+                files[relative_path] = [bundle.tell(), len(data), len(packed), compressed,
+                                        os.stat(os.path.join(root, name)).st_mode & 0o777]
+
+                bundle.write(packed)
+
+                stats["files"] += 1
+                stats["compressed"] += compressed
+                stats["bytes"] += len(data)
+                stats["packed_bytes"] += len(packed)
+
+        index = json.dumps({"name": os.path.basename(os.path.normpath(source_dir)),
+                            "hash": digest.hexdigest(),
+                            "files": files,
+                            "directories": directories}).encode("utf-8")
+
+        index_offset = bundle.tell()
+
+        bundle.write(index)
+
+        bundle.seek(0)
+        bundle.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, index_offset, len(index)))
+
+    os.replace(temp_path, path)
+
+    return stats
+
+def find_bundles(search_root: str) -> List[str]:
+    """The bundles right inside `search_root`, e.g. where `pip` installed
+    them; nothing deeper is looked at
+    """
+
+    try:
+
+        names = os.listdir(search_root)
+
+    except OSError:
+
+        return []
+
+    return [os.path.join(search_root, name) for name in sorted(names) if
+            BUNDLE_REGEX.fullmatch(name)]
+
+def _write_atomic(path: str, data, mode: int):
+
+    handle, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.",
+                                         suffix=".tmp", dir=os.path.dirname(path))
+
+    try:
+
+        with os.fdopen(handle, "wb") as temp_file:
+
+            temp_file.write(data)
+
+        os.chmod(temp_path, mode)
+
+        os.replace(temp_path, path)
+
+    except BaseException:
+
+        try:
+
+            os.remove(temp_path)
+
+        except OSError:
+
+            pass
+
+        raise
+
+class ResourceBundle():
+    """A bundle opened for reading; its index is read once, its files only
+    when asked for
+    """
+
+    def __init__(self, path: str, cache_root: Optional[str] = None):
+
+        self.path = path
+
+        with open(path, "rb") as bundle:
+
+            magic, index_offset, index_length = BUNDLE_HEADER.unpack(
+                bundle.read(BUNDLE_HEADER.size))
+
+            if magic != BUNDLE_MAGIC:
+
+                raise BundleError(f"{path} is not a resource bundle")
+
+            bundle.seek(index_offset)
+
+            index = json.loads(bundle.read(index_length).decode("utf-8"))
+
+            self._map = mmap.mmap(bundle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.name = index["name"]
+        self.hash = index["hash"]
+        self.files = index["files"] # type: Dict[str, List[Any]]
+
+        self._children = {"": set()} # type: Dict[str, set]
+
+        for directory in index["directories"]:
+
+            self._children.setdefault(directory, set())
+
+        for entry in list(self.files) + index["directories"]:
+
+            parent, _, name = entry.rpartition("/")
+
+            self._children.setdefault(parent, set()).add(name)
+
+        self.cache_dir = os.path.join(cache_root or get_cache_root(),
+                                      f"{self.name}-{self.hash[:16]}")
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+
+        self._map.close()
+
+    def isfile(self, name: str) -> bool:
+
+        return name in self.files
+
+    def isdir(self, name: str) -> bool:
+
+        return name.strip("/") in self._children
+
+    def listdir(self, name: str = "") -> List[str]:
+
+        try:
+
+            return sorted(self._children[name.strip("/")])
+
+        except KeyError:
+
+            raise BundleError(f"{name} is not a folder in {self.path}") from None
+
+    def _entry(self, name: str) -> List[Any]:
+
+        try:
+
+            return self.files[name]
+
+        except KeyError:
+
+            raise BundleError(f"{name} is not in {self.path}") from None
+
+    def view(self, name: str) -> memoryview:
+        """A read only view of a file stored as is, straight from the mapping
+        """
+
+        offset, size, _, compressed, _ = self._entry(name)
+
+        if compressed:
+
+            raise BundleError(f"{name} is compressed, use read")
+
+        return memoryview(self._map)[offset:offset + size]
+
+    def read(self, name: str) -> bytes:
+
+        offset, _, packed_size, compressed, _ = self._entry(name)
+
+        data = self._map[offset:offset + packed_size]
+
+        return zlib.decompress(data) if compressed else data
+
+    def extract(self, name: str, root: Optional[str] = None) -> str:
+        """The path of file `name` on disk, extracting it on first use
+        """
+
+        root = root or self.cache_dir
+
+        path = os.path.join(root, *name.split("/"))
+
+        _, size, _, _, mode = self._entry(name)
+
+        try:
+
+            if os.path.getsize(path) == size:
+
+                return path
+
+        except OSError:
+
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        _write_atomic(path, self.read(name), mode)
+
+        return path
+
+    def is_extracted(self, root: Optional[str] = None) -> bool:
+
+        return os.path.isfile(os.path.join(root or self.cache_dir, COMPLETE_MARKER))
+
+    def extract_all(self, root: Optional[str] = None) -> str:
+        """Extract everything, once; returns the folder
+        """
+
+        root = root or self.cache_dir
+
+        if self.is_extracted(root):
+
+            return root
+
+        for directory in self._children:
+
+            os.makedirs(os.path.join(root, *directory.split("/")), exist_ok=True)
+
+        for name in self.files:
+
+            self.extract(name, root)
+
+        _write_atomic(os.path.join(root, COMPLETE_MARKER), self.hash.encode("ascii"),
+                      0o644)
+
+        return root
+
+def _link_record(cache_dir: str, link_path: str) -> str:
+
+    return os.path.join(cache_dir, LINKS_DIR_NAME,
+                        hashlib.sha256(os.path.abspath(link_path).encode("utf-8"))
+                               .hexdigest()[:16])
+
+def _is_linked(cache_dir: str) -> bool:
+    """Whether any link recorded in `cache_dir` still points at it
+    """
+
+    try:
+
+        records = os.listdir(os.path.join(cache_dir, LINKS_DIR_NAME))
+
+    except OSError:
+
+        return False
+
+    for record in records:
+
+        try:
+
+            with open(os.path.join(cache_dir, LINKS_DIR_NAME, record), "r") as record_file:
+
+                link_path = record_file.read()
+
+            if os.path.realpath(link_path) == os.path.realpath(cache_dir):
+
+                return True
+
+        except OSError:
+
+            pass
+
+    return False
+
+def _lock_path(cache_dir: str) -> str:
+
+    return os.path.join(os.path.dirname(cache_dir),
+                        f".{os.path.basename(cache_dir)}.lock")
+
+@contextlib.contextmanager
+def _locked(cache_dir: str):
+    """Keep installs and uninstalls of the same bundle from deciding whether
+    it is still linked while another links or removes it
+    """
+
+    os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+
+    with open(_lock_path(cache_dir), "w") as lock_file:
+
+        if fcntl is not None:
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+        try:
+
+            yield
+
+        finally:
+
+            if fcntl is not None:
+
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _release(cache_dir: str, link_path: str):
+    """Forget the link at `link_path`, and remove the extracted bundle once
+    nothing links to it
+    """
+
+    with _locked(cache_dir):
+
+        try:
+
+            os.remove(_link_record(cache_dir, link_path))
+
+        except OSError:
+
+            pass
+
+        if not os.path.isdir(cache_dir) or _is_linked(cache_dir):
+
+            return
+
+        remove_tree(cache_dir)
+
+        try:
+
+            os.remove(_lock_path(cache_dir))
+
+        except OSError:
+
+            pass
+
+    if os.path.basename(os.path.dirname(cache_dir)) != INSTALL_CACHE_DIR_NAME:
+
+        return
+
+    try:
+
+        # The install's own cache folder, once its last bundle is gone
+        os.rmdir(os.path.dirname(cache_dir))
+
+    except OSError:
+
+        pass
+
+def install_bundle(bundle_path: str, install_dir: str,
+                   cache_root: Optional[str] = None) -> str:
+    """Make the version folder of a bundle available in `install_dir`
+
+    The bundle is extracted into `cache_root` (a folder in `install_dir` by
+    default, see `get_cache_root`), unless an install of the same bundle did
+    already, and linked into `install_dir`; where links can't be made it is
+    extracted into `install_dir` instead
+
+    Returns:
+        the version folder in `install_dir`
+    """
+
+    with ResourceBundle(bundle_path, cache_root or get_cache_root(install_dir)) as bundle:
+
+        link_path = os.path.join(install_dir, bundle.name)
+
+        if os.path.islink(link_path):
+
+            uninstall_bundle(link_path)
+
+        cache_dir = bundle.cache_dir
+
+        with _locked(cache_dir):
+
+            bundle.extract_all()
+
+            os.makedirs(os.path.join(cache_dir, LINKS_DIR_NAME), exist_ok=True)
+
+            _write_atomic(_link_record(cache_dir, link_path),
+                          os.path.abspath(link_path).encode("utf-8"), 0o644)
+
+            try:
+
+                os.symlink(cache_dir, link_path, target_is_directory=True)
+
+                linked = True
+
+            except (OSError, NotImplementedError):
+
+                linked = False
+
+        if not linked:
+
+            bundle.extract_all(link_path)
+
+            _release(cache_dir, link_path)
+
+    return link_path
+
+def uninstall_bundle(link_path: str):
+    """Remove the link `install_bundle` made, and the extracted bundle it
+    points at once no other install links to it
+    """
+
+    cache_dir = os.path.realpath(link_path)
+
+    os.remove(link_path)
+
+    _release(cache_dir, link_path)
@@ -0,0 +1,670 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""A job scheduler for batches of work on `.blend` files
+
+Loading a `.blend` file is often the most expensive part of a job that
+changes, exports or renders it. Every worker of the scheduler keeps the last
+few files it loaded, and jobs are sent to a worker that already has their
+file loaded where there is one. After each job the data-blocks the job
+created or changed are put back from a snapshot of the file as it was loaded,
+so the next job on it starts from the same state
+
+Jobs have priorities, an optional timeout each, and `submit_job` blocks once
+`max_pending` jobs are queued. The routing and eviction decisions are made by
+`AffinityRouter`, which knows nothing of Blender, and the loading is done by
+a loader that can be swapped for a fake one
+"""
+
+import collections
+import functools
+import heapq
+import itertools
+import os
+import queue
+import tempfile
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Relative imports
+from blenderpy.pool import DEFAULT_MODULE, WarmPool, _Task, _Worker, get_module
+
+# Files each worker keeps loaded
+DEFAULT_BLEND_CACHE_SIZE = 4
+
+# Seconds a job waits for a busy worker that has its file loaded, rather than
+# loading it again on an idle one
+DEFAULT_AFFINITY_WAIT = 1.0
+
+# Undo is no option: `bpy.ops.ed.undo` needs a window, which `bpy` running
+# in the background has none of
+RESET_SNAPSHOT = "snapshot"
+RESET_NONE = "none"
+
+RESETS = [RESET_SNAPSHOT, RESET_NONE]
+
+# The `bpy.data` collections a `.blend` file is loaded into; window managers,
+# screens and workspaces belong to the session rather than to a file
+BLEND_DATA_COLLECTIONS = ["actions", "armatures", "brushes", "cache_files",
+                          "cameras", "collections", "curves", "fonts",
+                          "grease_pencils", "hair_curves", "images", "lattices",
+                          "lightprobes", "lights", "linestyles", "masks",
+                          "materials", "meshes", "metaballs", "movieclips",
+                          "node_groups", "objects", "paint_curves", "palettes",
+                          "particles", "pointclouds", "scenes", "sounds",
+                          "speakers", "texts", "textures", "volumes", "worlds"]
+
+class LoadedBlend():
+    """A `.blend` file loaded into a worker: the data-blocks that came from it
+    """
+
+    def __init__(self, path: str, ids: set):
+
+        self.path = path
+        self.ids = ids
+
+        self.snapshot_path = None
+
+    @property
+    def scenes(self) -> List:
+
+        return sorted([_id for _id in self.ids if type(_id).__name__ == "Scene"],
+                      key=lambda scene: scene.name)
+
+class BpyBlendLoader():
+    """Loads `.blend` files into the running `bpy` by appending their
+    data-blocks, so several can be loaded at once
+
+    With `reset` set to `snapshot` the data-blocks of a file are written to a
+    local file once loaded. After every job the data-blocks it created are
+    removed, and those it changed or removed are appended again from the
+    snapshot; the rest of the file stays as it is. A data-block counts as
+    changed when the dependency graph of one of the file's scenes reports an
+    update of it, so changes to data-blocks used by no scene go unnoticed.
+    `none` leaves the file as the job left it
+    """
+
+    def __init__(self, bpy, reset: str = RESET_SNAPSHOT,
+                 snapshot_dir: Optional[str] = None):
+
+        if reset not in RESETS:
+
+            raise Exception(f"Unknown reset {reset}, choose one of "
+                            f"{', '.join(RESETS)}")
+
+        self.bpy = bpy
+        self.reset_mode = reset
+        self.snapshot_dir = snapshot_dir
+
+        self._before_job = {} # type: Dict[Any, Tuple[str, str]]
+        self._changed = set()
+
+        self._snapshots = itertools.count()
+
+    def ids(self) -> set:
+
+        return {_id for name in BLEND_DATA_COLLECTIONS for _id in
+                getattr(self.bpy.data, name, [])}
+
+    def names(self) -> Dict[Any, Tuple[str, str]]:
+        """Every data-block with its collection and name
+        """
+
+        return {_id: (name, _id.name) for name in BLEND_DATA_COLLECTIONS for _id in
+                getattr(self.bpy.data, name, [])}
+
+    def _append(self, path: str,
+                only: Optional[Dict[str, List[str]]] = None) -> set:
+        """Append the data-blocks of `path`, or `only` those named per
+        collection; returns those appended
+        """
+
+        before = self.ids()
+
+        with self.bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+
+            for name in BLEND_DATA_COLLECTIONS:
+
+                if hasattr(data_from, name) and (only is None or name in only):
+
+                    setattr(data_to, name, getattr(data_from, name) if only is None
+                                           else only[name])
+
+        appended = self.ids() - before
+
+        if only is None:
+
+            return appended
+
+        # Appending a data-block appends what it uses along with it, e.g. an
+        # object's mesh; those are still loaded, so the copies, named
+        # `<name>.001` and so on, are swapped for them
+        requested = {_id for name in only for _id in getattr(data_to, name) if
+                     _id is not None}
+
+        copies = {}
+
+        for name in BLEND_DATA_COLLECTIONS:
+
+            for _id in getattr(self.bpy.data, name, []):
+
+                if _id not in appended or _id in requested:
+
+                    continue
+
+                original_name, _, suffix = _id.name.rpartition(".")
+
+                original = getattr(self.bpy.data, name).get(original_name) if \
+                           suffix.isdigit() else None
+
+                if original is not None and original not in appended:
+
+                    copies[_id] = original
+
+        for copy, original in copies.items():
+
+            copy.user_remap(original)
+
+        if copies:
+
+            self.bpy.data.batch_remove(ids=list(copies))
+
+        return requested
+
+    def load(self, path: str) -> LoadedBlend:
+
+        blend = LoadedBlend(path, self._append(path))
+
+        if self.reset_mode == RESET_SNAPSHOT:
+
+            if self.snapshot_dir is None:
+
+                self.snapshot_dir = tempfile.mkdtemp(prefix="bpy-snapshots-")
+
+            blend.snapshot_path = os.path.join(self.snapshot_dir,
+                                               f"{next(self._snapshots)}-"
+                                               f"{os.path.basename(path)}")
+
+            self.bpy.data.libraries.write(blend.snapshot_path, blend.ids,
+                                          fake_user=True)
+
+        return blend
+
+    def _record_updates(self, scene, depsgraph):
+
+        self._changed.update(update.id.original for update in depsgraph.updates)
+
+    def prepare(self, blend: LoadedBlend):
+        """Called before every job on `blend`
+        """
+
+        if self.reset_mode == RESET_SNAPSHOT:
+
+            self._before_job = self.names()
+            self._changed = set()
+
+            self.bpy.app.handlers.depsgraph_update_post.append(self._record_updates)
+
+    def reset(self, blend: LoadedBlend):
+        """Called after every successful job on `blend`
+        """
+
+        if self.reset_mode != RESET_SNAPSHOT:
+
+            return
+
+        try:
+
+            # Nothing is evaluated in the background unless asked for, and
+            # the updates are only reported once it is
+            for scene in blend.scenes:
+
+                if scene in self._before_job:
+
+                    for view_layer in scene.view_layers:
+
+                        view_layer.update()
+
+        finally:
+
+            self.bpy.app.handlers.depsgraph_update_post.remove(self._record_updates)
+
+        now = self.ids()
+
+        created = now - set(self._before_job)
+        changed = blend.ids & self._changed & now
+        restored = (blend.ids - now) | changed
+
+        self.bpy.data.batch_remove(ids=list(created | changed))
+
+        only = {} # type: Dict[str, List[str]]
+
+        for _id in restored:
+
+            name, id_name = self._before_job[_id]
+
+            only.setdefault(name, []).append(id_name)
+
+        blend.ids = (blend.ids - restored) | (self._append(blend.snapshot_path, only)
+                                              if only else set())
+
+        self._before_job = {}
+        self._changed = set()
+
+    def unload(self, blend: LoadedBlend):
+
+        self.bpy.data.batch_remove(ids=list(blend.ids & self.ids()))
+
+        if blend.snapshot_path is not None and os.path.isfile(blend.snapshot_path):
+
+            os.remove(blend.snapshot_path)
+
+class BlendCache():
+    """The files a worker keeps loaded, least recently used first
+    """
+
+    def __init__(self, loader, size: int = DEFAULT_BLEND_CACHE_SIZE):
+
+        self.loader = loader
+        self.size = size
+
+        self._entries = collections.OrderedDict() # path -> (blend, mtime)
+
+    @property
+    def paths(self) -> List[str]:
+
+        return list(self._entries)
+
+    def get(self, path: str) -> Tuple[LoadedBlend, bool]:
+        """The loaded file and whether it was loaded already
+
+        A file changed on disk since it was loaded is loaded again
+        """
+
+        mtime = os.path.getmtime(path)
+
+        entry = self._entries.get(path)
+
+        if entry is not None and entry[1] == mtime:
+
+            self._entries.move_to_end(path)
+
+            return entry[0], True
+
+        self.discard(path)
+
+        while len(self._entries) >= self.size:
+
+            self.discard(next(iter(self._entries)))
+
+        blend = self.loader.load(path)
+
+        self._entries[path] = (blend, mtime)
+
+        return blend, False
+
+    def discard(self, path: str):
+
+        entry = self._entries.pop(path, None)
+
+        if entry is not None:
+
+            self.loader.unload(entry[0])
+
+# The files loaded by this worker, see `_run_job`
+_blend_cache = None
+
+def _run_job(path: str, fn: Callable, args: Tuple, kwargs: Dict,
+             cache_size: int, loader_factory: Callable):
+    """Runs in the worker: `fn(blend, *args, **kwargs)` on the loaded file
+    """
+
+    global _blend_cache
+
+    if _blend_cache is None:
+
+        _blend_cache = BlendCache(loader_factory(get_module()), cache_size)
+
+    blend, _ = _blend_cache.get(path)
+
+    try:
+
+        _blend_cache.loader.prepare(blend)
+
+        result = fn(blend, *args, **kwargs)
+
+        _blend_cache.loader.reset(blend)
+
+    except BaseException:
+
+        # The file may be left half changed; the scheduler forgets it too
+        _blend_cache.discard(path)
+
+        raise
+
+    return result
+
+class AffinityRouter():
+    """Which worker has which files loaded, and where to send a job
+
+    Mirrors the `BlendCache` of every worker: both see the same jobs in the
+    same order and evict alike. Workers are any hashable keys
+    """
+
+    def __init__(self, cache_size: int = DEFAULT_BLEND_CACHE_SIZE):
+
+        self.cache_size = cache_size
+
+        self.caches = {} # worker -> OrderedDict of path -> (last use, mtime)
+
+        self.stats = collections.Counter()
+
+        self._clock = itertools.count()
+
+    def holders(self, path: str) -> List[Hashable]:
+
+        return [worker for worker, cache in self.caches.items() if path in cache]
+
+    def route(self, path: str, idle: List[Hashable],
+              wait_for_holder: bool = False) -> Optional[Hashable]:
+        """The idle worker to run a job on `path`, or `None` to keep the job
+        waiting for a busy worker that has the file loaded
+        """
+
+        if not idle:
+
+            return None
+
+        for worker in idle:
+
+            if path in self.caches.get(worker, {}):
+
+                return worker
+
+        if wait_for_holder and self.holders(path):
+
+            return None
+
+        def cost(worker):
+
+            cache = self.caches.get(worker, {})
+
+            # A free slot costs nothing; otherwise evict the file used longest ago
+            return (1, next(iter(cache.values()))[0]) if len(cache) >= \
+                   self.cache_size else (0, len(cache))
+
+        return min(idle, key=cost)
+
+    def record(self, worker: Hashable, path: str,
+               mtime: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Account for a job on `path`, last modified at `mtime`, sent to
+        `worker`
+
+        Returns:
+            whether the file was loaded there already and the file evicted
+            to make room for it, if any. A file changed since it was loaded
+            is loaded again, as `BlendCache` does, so that is no hit
+        """
+
+        cache = self.caches.setdefault(worker, collections.OrderedDict())
+
+        hit = path in cache and cache[path][1] == mtime
+
+        evicted = None
+
+        if path in cache:
+
+            cache.move_to_end(path)
+
+        elif len(cache) >= self.cache_size:
+
+            evicted, _ = cache.popitem(last=False)
+
+            self.stats["evictions"] += 1
+
+        cache[path] = (next(self._clock), mtime)
+
+        self.stats["hits" if hit else "misses"] += 1
+
+        return hit, evicted
+
+    def discard(self, worker: Hashable, path: str):
+
+        self.caches.get(worker, {}).pop(path, None)
+
+    def forget(self, worker: Hashable):
+
+        self.caches.pop(worker, None)
+
+class _Job(_Task):
+    """A task on a `.blend` file, ordered by priority then submission
+    """
+
+    def __init__(self, path: str, fn: Callable, args: Tuple, kwargs: Dict,
+                 priority: int, timeout: Optional[float], sequence: int,
+                 cache_size: int, loader_factory: Callable):
+
+        super().__init__(_run_job, (path, fn, args, kwargs, cache_size,
+                                    loader_factory), {}, timeout)
+
+        self.path = path
+        self.priority = priority
+        self.sequence = sequence
+        self.submitted = time.monotonic()
+
+        self.block = True
+        self.put_timeout = None
+
+    def __lt__(self, other: "_Job") -> bool:
+
+        return (-self.priority, self.sequence) < (-other.priority, other.sequence)
+
+class BlendScheduler(WarmPool):
+    """A `WarmPool` that runs jobs on `.blend` files where they're loaded
+
+    Every worker keeps up to `cache_size` files loaded. `reset` is how files
+    are put back after a job, see `BpyBlendLoader`; `loader_factory` takes
+    the imported module and returns the loader, for instance a fake one in
+    tests. Other arguments are those of `WarmPool`
+    """
+
+    def __init__(self, workers: Optional[int] = None, module: str = DEFAULT_MODULE,
+                 cache_size: int = DEFAULT_BLEND_CACHE_SIZE,
+                 reset: str = RESET_SNAPSHOT, max_pending: Optional[int] = None,
+                 affinity_wait: float = DEFAULT_AFFINITY_WAIT,
+                 loader_factory: Optional[Callable] = None, **pool_kwargs):
+
+        if reset not in RESETS:
+
+            raise Exception(f"Unknown reset {reset}, choose one of "
+                            f"{', '.join(RESETS)}")
+
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+        self.affinity_wait = affinity_wait
+        self.loader_factory = loader_factory or functools.partial(BpyBlendLoader,
+                                                                  reset=reset)
+
+        self.router = AffinityRouter(cache_size)
+
+        self._sequence = itertools.count()
+
+        # Set before the pool starts handing out jobs
+        super().__init__(workers, module, **pool_kwargs)
+
+    def submit_job(self, path: str, fn: Callable, args: Tuple = (),
+                   kwargs: Optional[Dict] = None, priority: int = 0,
+                   timeout: Optional[float] = None, block: bool = True,
+                   put_timeout: Optional[float] = None):
+        """Run `fn(blend, *args, **kwargs)` on the `.blend` file at `path`
+
+        Higher `priority` runs first. A job running past `timeout` seconds
+        has its worker stopped and fails with `TimeoutError`. With the queue
+        full this waits for room, up to `put_timeout` seconds, then raises
+        `queue.Full`; without `block` it raises right away
+        """
+
+        job = _Job(os.path.abspath(path), fn, args, kwargs or {}, priority,
+                   timeout, next(self._sequence), self.cache_size,
+                   self.loader_factory)
+
+        job.block = block
+        job.put_timeout = put_timeout
+
+        return self._submit(job)
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """Jobs need a file to run on, see `submit_job`
+        """
+
+        raise TypeError("BlendScheduler runs jobs on .blend files, use submit_job")
+
+    def submit_call(self, fn: Callable, *args, **kwargs):
+        """Jobs need a file to run on, see `submit_job`
+        """
+
+        raise TypeError("BlendScheduler runs jobs on .blend files, use submit_job")
+
+    def map(self, fn: Callable, paths: Iterable[str],
+            *iterables: Iterable) -> Iterator[Any]:
+        """`fn(blend, *args)` on every file of `paths`, with `args` from
+        `iterables` as in `Executor.map`; results in order
+        """
+
+        futures = [self.submit_job(path, fn, tuple(args)) for path, *args in
+                   zip(paths, *iterables)]
+
+        def results():
+
+            for future in futures:
+
+                yield future.result()
+
+        return results()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue, cache and worker counters
+        """
+
+        with self._lock:
+
+            return {"queued": len(self._pending),
+                    "running": sum(1 for worker in self._workers if
+                                   worker.task is not None),
+                    "cache_hits": self.router.stats["hits"],
+                    "cache_misses": self.router.stats["misses"],
+                    "cache_evictions": self.router.stats["evictions"],
+                    "tasks": self.stats["tasks"],
+                    "tasks_timed_out": self.stats["tasks_timed_out"],
+                    "workers_recycled": self.stats["workers_recycled"],
+                    "workers_crashed": self.stats["workers_crashed"],
+                    "loaded": {worker.pid: list(self.router.caches.get(worker, {}))
+                               for worker in self._workers}}
+
+    def _new_pending(self):
+
+        return []
+
+    def _wait_for_room(self, task: _Job):
+
+        if self.max_pending is None:
+
+            return
+
+        def has_room():
+
+            return len(self._pending) < self.max_pending or self._shutdown or \
+                   self._broken is not None
+
+        if not has_room() and not task.block:
+
+            raise queue.Full(f"{len(self._pending)} jobs queued already")
+
+        if not self._lock.wait_for(has_room, timeout=task.put_timeout):
+
+            raise queue.Full(f"{len(self._pending)} jobs queued still after "
+                             f"{task.put_timeout} s")
+
+    def _push(self, task: _Job):
+
+        heapq.heappush(self._pending, task)
+
+    def _requeue(self, task: _Job):
+
+        heapq.heappush(self._pending, task)
+
+    def _select(self, idle: List[_Worker]) -> Optional[Tuple[_Job, _Worker]]:
+
+        if not idle:
+
+            return None
+
+        now = time.monotonic()
+
+        for job in sorted(self._pending):
+
+            worker = self.router.route(job.path, idle,
+                                       wait_for_holder=now - job.submitted <
+                                                       self.affinity_wait)
+
+            if worker is not None:
+
+                self._pending.remove(job)
+
+                heapq.heapify(self._pending)
+
+                self._lock.notify_all()
+
+                return job, worker
+
+        return None
+
+    def _next_deadline(self) -> Optional[float]:
+
+        deadline = super()._next_deadline()
+
+        now = time.monotonic()
+
+        # Wake up when jobs waiting for a busy worker have waited long enough
+        with self._lock:
+
+            waits = [job.submitted + self.affinity_wait - now for job in
+                     self._pending if job.submitted + self.affinity_wait > now]
+
+        if waits:
+
+            deadline = min(waits) if deadline is None else min(deadline, min(waits))
+
+        return deadline
+
+    def _on_dispatch(self, task: _Job, worker: _Worker):
+
+        try:
+
+            mtime = os.path.getmtime(task.path)
+
+        except OSError: # The job fails on it in the worker
+
+            mtime = None
+
+        with self._lock:
+
+            self.router.record(worker, task.path, mtime)
+
+    def _receive(self, worker: _Worker):
+
+        task = worker.task
+
+        super()._receive(worker)
+
+        # A failed job leaves its file unloaded in the worker
+
+        if task is not None and task.future.done() and \
+           task.future.exception() is not None:
+
+            with self._lock:
+
+                self.router.discard(worker, task.path)
+
+    def _on_retire(self, worker: _Worker):
+
+        self.router.forget(worker)
@@ -0,0 +1,271 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""Move mesh and attribute arrays between processes without pickling them
+
+A worker fills a block of shared memory straight from `foreach_get` and
+returns a small handle; the parent maps the same memory as a numpy array, so
+the data is never copied or pickled. The other way around, the parent fills
+an array and the worker maps it for `foreach_set`
+
+Python 3.7 has no `multiprocessing.shared_memory`, so blocks are files in
+`/dev/shm` (or the temporary folder where there is none) mapped with `mmap`.
+All blocks live in the folder of an `ArrayArena` owned by the parent: blocks
+left behind by a crashed worker are removed with the arena, and arenas left
+behind by a crashed parent are removed by the next arena made on the machine
+"""
+
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import weakref
+from typing import Optional, Tuple
+
+import numpy
+
+SHARED_MEMORY_DIR = "/dev/shm"
+
+ARENA_PREFIX = "bpy-arrays-"
+ARENA_REGEX = re.compile(re.escape(ARENA_PREFIX) + r"(\d+)-")
+
+# For `OpenProcess` and `GetExitCodeProcess` on Windows
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+def get_shared_memory_dir() -> str:
+    """Where blocks are made: memory backed where the system has such a folder
+    """
+
+    return SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) and \
+           os.access(SHARED_MEMORY_DIR, os.W_OK) else tempfile.gettempdir()
+
+def _windows_pid_exists(pid: int) -> bool:
+    """`os.kill` terminates the process on Windows rather than probing it, so
+    ask for the process' exit code instead
+    """
+
+    import ctypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+    process = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+
+    if not process:
+
+        # It exists, it just isn't ours to look at
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+
+    try:
+
+        exit_code = ctypes.c_ulong()
+
+        if not kernel32.GetExitCodeProcess(process, ctypes.byref(exit_code)):
+
+            return True
+
+        return exit_code.value == STILL_ACTIVE
+
+    finally:
+
+        kernel32.CloseHandle(process)
+
+def _pid_exists(pid: int) -> bool:
+
+    if sys.platform == "win32":
+
+        return _windows_pid_exists(pid)
+
+    try:
+
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+
+        return False
+
+    except (PermissionError, OSError):
+
+        pass
+
+    return True
+
+def remove_stale_arenas(directory: Optional[str] = None) -> int:
+    """Remove the arenas of processes that no longer exist
+    """
+
+    directory = directory or get_shared_memory_dir()
+
+    removed = 0
+
+    for entry in os.scandir(directory):
+
+        match = ARENA_REGEX.match(entry.name)
+
+        if match and entry.is_dir() and not _pid_exists(int(match.group(1))):
+
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+            removed += 1
+
+    return removed
+
+class SharedArrayHandle():
+    """What a process needs to map a block: cheap to pickle
+    """
+
+    def __init__(self, path: str, shape: Tuple[int, ...], dtype: str):
+
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    @property
+    def nbytes(self) -> int:
+
+        return int(numpy.prod(self.shape)) * numpy.dtype(self.dtype).itemsize
+
+    def __repr__(self) -> str:
+
+        return f"SharedArrayHandle({self.path!r}, {self.shape}, {self.dtype!r})"
+
+def _map(path: str, nbytes: int) -> mmap.mmap:
+
+    with open(path, "r+b") as block:
+
+        # A zero length mapping isn't allowed
+        return mmap.mmap(block.fileno(), max(nbytes, 1))
+
+def _view(memory: mmap.mmap, handle: SharedArrayHandle) -> numpy.ndarray:
+
+    # The array keeps the mapping alive; it's unmapped once no view is left
+    return numpy.frombuffer(memory, dtype=handle.dtype,
+                            count=int(numpy.prod(handle.shape))).reshape(handle.shape)
+
+class ArrayArena():
+    """A folder of shared blocks, removed with everything in it on `close`
+
+    Pickled into workers it only carries the folder; only the process that
+    made the arena removes it
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+
+        parent = directory or get_shared_memory_dir()
+
+        remove_stale_arenas(parent)
+
+        self.path = tempfile.mkdtemp(prefix=f"{ARENA_PREFIX}{os.getpid()}-",
+                                     dir=parent)
+
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path,
+                                           ignore_errors=True)
+
+    def __getstate__(self):
+
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+
+        self.path = state["path"]
+
+        self._finalizer = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+        """Remove the arena; views mapped already stay valid
+        """
+
+        if self._finalizer is not None:
+
+            self._finalizer()
+
+    def create(self, shape: Tuple[int, ...],
+               dtype=numpy.float32) -> Tuple[SharedArrayHandle, numpy.ndarray]:
+        """A new block and a writable array view of it
+        """
+
+        handle_fd, path = tempfile.mkstemp(prefix="block-", dir=self.path)
+
+        handle = SharedArrayHandle(path, shape, numpy.dtype(dtype).str)
+
+        try:
+
+            os.ftruncate(handle_fd, max(handle.nbytes, 1))
+
+        finally:
+
+            os.close(handle_fd)
+
+        return handle, _view(_map(path, handle.nbytes), handle)
+
+    def attach(self, handle: SharedArrayHandle, release: bool = False) -> numpy.ndarray:
+        """Map a block made by another process
+
+        With `release` the block's file is removed right away; the memory
+        lives on for as long as the returned array does
+        """
+
+        view = _view(_map(handle.path, handle.nbytes), handle)
+
+        if release:
+
+            self.release(handle)
+
+        return view
+
+    def release(self, handle: SharedArrayHandle):
+        """Remove a block's file; mapped views stay valid
+        """
+
+        try:
+
+            os.remove(handle.path)
+
+        except FileNotFoundError:
+
+            pass
+
+        except PermissionError: # Windows won't remove mapped files
+
+            pass
+
+    def foreach_get(self, collection, attribute: str, components: int = 1,
+                    dtype=numpy.float32) -> SharedArrayHandle:
+        """`collection.foreach_get(attribute, ...)` into a new block
+
+        `dtype` has to match the property: `float32` for floats, `int32` for
+        integers and `bool` for booleans
+        """
+
+        handle, view = self.create((len(collection), components) if
+                                   components > 1 else (len(collection),), dtype)
+
+        collection.foreach_get(attribute, view.reshape(-1))
+
+        return handle
+
+    def foreach_set(self, collection, attribute: str, handle: SharedArrayHandle):
+        """`collection.foreach_set(attribute, ...)` from a block
+        """
+
+        collection.foreach_set(attribute, self.attach(handle).reshape(-1))
+
+    def from_array(self, array: numpy.ndarray) -> SharedArrayHandle:
+        """Copy `array` into a new block, e.g. for a worker's `foreach_set`
+        """
+
+        handle, view = self.create(array.shape, array.dtype)
+
+        view[...] = array
+
+        return handle
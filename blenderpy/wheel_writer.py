@@ -0,0 +1,259 @@
+#! /usr/bin/python
+# -*- coding: utf-8
+"""A wheel writer that compresses in parallel
+
+`wheel.wheelfile.WheelFile` reads every file into memory and deflates them one
+after the other, which takes minutes for the tens of thousands of files in a
+`bpy` wheel. Here files are read and compressed by a pool of threads (`zlib`
+releases the GIL) and written in the same order `WheelFile` would use, already
+compressed data such as images is stored as is, large files are streamed in
+chunks and the RECORD hashes are computed while reading
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import os
+import stat
+import zipfile
+import zlib
+from typing import List, Optional, Tuple
+
+from wheel.util import urlsafe_b64encode
+from wheel.wheelfile import WheelFile, get_zipinfo_datetime
+
+DEFAULT_COMPRESS_WORKERS = os.cpu_count() or 1
+
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Formats that are compressed already; deflating them again wastes time
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".exr", ".woff",
+                     ".woff2", ".zip", ".gz", ".bz2", ".xz", ".zst", ".7z",
+                     ".whl", ".jar", ".mp3", ".ogg", ".mp4"}
+
+# Anything that deflates by less than this is stored instead
+MIN_COMPRESSION_SAVING = 0.05
+
+# Files this large are streamed through the archive rather than compressed
+# in memory by a worker
+STREAM_SIZE = 32 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+def _record_hash(digest: "hashlib._Hash") -> Tuple[str, str]:
+
+    return digest.name, urlsafe_b64encode(digest.digest()).decode("ascii")
+
+def _zip_info(path: str, arcname: str) -> Tuple[zipfile.ZipInfo, os.stat_result]:
+    """The entry `WheelFile.write` would make for `path`
+    """
+
+    st = os.stat(path)
+
+    zinfo = zipfile.ZipInfo(arcname, date_time=get_zipinfo_datetime(st.st_mtime))
+    zinfo.external_attr = (stat.S_IMODE(st.st_mode) | stat.S_IFMT(st.st_mode)) << 16
+    zinfo.file_size = st.st_size
+
+    return zinfo, st
+
+def compress_file(path: str, arcname: str, level: int = DEFAULT_COMPRESS_LEVEL):
+    """Read and compress one file; runs in a worker thread
+
+    Returns:
+        the zip entry (with sizes and CRC filled in), the data to write and
+        the RECORD hash of the file
+    """
+
+    zinfo, st = _zip_info(path, arcname)
+
+    digest = hashlib.sha256()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    crc = 0
+    raw = []
+    compressed = []
+
+    deflate = os.path.splitext(arcname)[1].lower() not in STORED_EXTENSIONS
+
+    with open(path, "rb") as _file:
+
+        for chunk in iter(lambda: _file.read(CHUNK_SIZE), b""):
+
+            digest.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            raw.append(chunk)
+
+            if deflate:
+
+                compressed.append(compressor.compress(chunk))
+
+    raw = b"".join(raw)
+
+    if deflate:
+
+        compressed.append(compressor.flush())
+        compressed = b"".join(compressed)
+
+    if deflate and len(compressed) <= len(raw) * (1 - MIN_COMPRESSION_SAVING):
+
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        data = compressed
+
+    else:
+
+        zinfo.compress_type = zipfile.ZIP_STORED
+        data = raw
+
+    zinfo.CRC = crc & 0xffffffff
+    zinfo.file_size = len(raw)
+    zinfo.compress_size = len(data)
+
+    return zinfo, data, _record_hash(digest)
+
+class ParallelWheelFile(WheelFile):
+    """`WheelFile` whose `write_files` compresses with a pool of threads
+    """
+
+    def __init__(self, file, mode: str = "r",
+                 compression: int = zipfile.ZIP_DEFLATED,
+                 workers: int = DEFAULT_COMPRESS_WORKERS,
+                 compresslevel: int = DEFAULT_COMPRESS_LEVEL):
+
+        super().__init__(file, mode, compression)
+
+        self.workers = workers
+        self.compresslevel = compresslevel
+
+    def list_files(self, base_dir: str) -> List[Tuple[str, str]]:
+        """`(path, arcname)` in the order `WheelFile.write_files` writes them,
+        which puts the `.dist-info` folder last
+        """
+
+        files = []
+        deferred = []
+
+        for root, dirnames, filenames in os.walk(base_dir):
+
+            dirnames.sort()
+
+            for name in sorted(filenames):
+
+                path = os.path.normpath(os.path.join(root, name))
+
+                if os.path.isfile(path):
+
+                    arcname = os.path.relpath(path, base_dir).replace(os.path.sep, "/")
+
+                    if arcname == self.record_path:
+
+                        pass
+
+                    elif root.endswith(".dist-info"):
+
+                        deferred.append((path, arcname))
+
+                    else:
+
+                        files.append((path, arcname))
+
+        return files + sorted(deferred)
+
+    def write_files(self, base_dir: str):
+
+        # Bounds how much compressed data waits in memory to be written
+        max_pending = self.workers * 4
+
+        pending = collections.deque()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+
+            for path, arcname in self.list_files(base_dir):
+
+                if os.path.getsize(path) >= STREAM_SIZE:
+
+                    # Keep the archive order; write what's queued first
+                    while pending:
+
+                        self.write_compressed(*pending.popleft().result())
+
+                    self.write_streamed(path, arcname)
+
+                    continue
+
+                pending.append(pool.submit(compress_file, path, arcname,
+                                           self.compresslevel))
+
+                while len(pending) > max_pending:
+
+                    self.write_compressed(*pending.popleft().result())
+
+            while pending:
+
+                self.write_compressed(*pending.popleft().result())
+
+    def write_compressed(self, zinfo: zipfile.ZipInfo, data: bytes,
+                         record_hash: Tuple[str, str]):
+        """Append an entry whose data is already compressed
+
+        `ZipFile` can only compress while writing, so the local header and
+        data are written directly, as `ZipFile.writestr` does internally.
+        This relies on the private parts of `ZipFile` as of Python 3.7
+        (`_writecheck`, `_didModify`, `start_dir`, `ZipInfo.FileHeader`) and
+        has to be checked against `zipfile` when moving to another version
+        """
+
+        self._writecheck(zinfo)
+        self._didModify = True
+
+        zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or \
+                zinfo.compress_size > zipfile.ZIP64_LIMIT
+
+        self.fp.seek(self.start_dir)
+
+        zinfo.header_offset = self.fp.tell()
+
+        self.fp.write(zinfo.FileHeader(zip64))
+        self.fp.write(data)
+
+        self.filelist.append(zinfo)
+        self.NameToInfo[zinfo.filename] = zinfo
+
+        self.start_dir = self.fp.tell()
+
+        self._file_hashes[zinfo.filename] = record_hash
+        self._file_sizes[zinfo.filename] = zinfo.file_size
+
+    def write_streamed(self, path: str, arcname: str):
+        """Write a large file chunk by chunk instead of holding it in memory
+        """
+
+        zinfo, st = _zip_info(path, arcname)
+
+        zinfo.compress_type = zipfile.ZIP_STORED if\
+                              os.path.splitext(arcname)[1].lower() in\
+                              STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        # Private as of Python 3.7, where `ZipFile.open` has no compresslevel
+        zinfo._compresslevel = self.compresslevel
+
+        digest = hashlib.sha256()
+
+        with open(path, "rb") as _file, self.open(zinfo, "w") as entry:
+
+            for chunk in iter(lambda: _file.read(CHUNK_SIZE), b""):
+
+                digest.update(chunk)
+                entry.write(chunk)
+
+        self._file_hashes[arcname] = _record_hash(digest)
+        self._file_sizes[arcname] = st.st_size
+
+def make_wheel_file_factory(workers: int = DEFAULT_COMPRESS_WORKERS,
+                            compresslevel: int = DEFAULT_COMPRESS_LEVEL):
+    """A drop-in for the `WheelFile` class `bdist_wheel` writes with
+    """
+
+    def factory(file, mode: str = "r", compression: int = zipfile.ZIP_DEFLATED):
+
+        return ParallelWheelFile(file, mode, compression, workers, compresslevel)
+
+    return factory
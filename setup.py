@@ -1,404 +1,773 @@
-#! /usr/bin/python
-# -*- coding: utf-8 -*-
-"""
-Build blender into a python module
-"""
-
-from distutils.command.install_data import install_data
-import os
-import pathlib
-import pkg_resources
-import platform
-import re
-from setuptools import find_packages, setup, Extension
-from setuptools.command.build_ext import build_ext
-from setuptools.command.install import install
-from setuptools.command.install_lib import install_lib
-from setuptools.command.install_scripts import install_scripts
-import shutil
-import struct
-import sys
-from typing import List, Set
-from wheel.bdist_wheel import bdist_wheel
-
-# Monkey-patch 3.4 and below
-
-if sys.version_info < (3,5):
-
-    def home_path() -> pathlib.Path:
-
-        return pathlib.Path(os.path.expanduser("~"))
-
-    pathlib.Path.home = home_path
-
-PYTHON_EXE_DIR = os.path.dirname(sys.executable)
-
-SYSTEM_OS_NAME = platform.system()
-
-# Change the Blender desired API version variable to build different versions
-# of the Blender API. For instance, 'v2.79b' is the same version of the API
-# as you would get when opening the Blender application at v2.79b
-VERSION = "3.20"
-VERSION_TUPLE = pkg_resources.parse_version(VERSION)
-
-class CMakeExtension(Extension):
-    """
-    An extension to run the cmake build
-    """
-
-    def __init__(self, name, sources=[]):
-
-        super().__init__(name = name, sources = sources)
-
-class InstallCMakeLibsData(install_data):
-    """
-    Just a wrapper to get the install data into the egg-info
-    """
-
-    def run(self):
-        """
-        Outfiles are the libraries that were built using cmake
-        """
-
-        # There seems to be no other way to do this; I tried listing the
-        # libraries during the execution of the InstallCMakeLibs.run() but
-        # setuptools never tracked them, seems like setuptools wants to
-        # track the libraries through package data more than anything...
-        # help would be appriciated
-
-        self.outfiles = self.distribution.data_files
-
-class InstallCMakeLibs(install_lib):
-    """
-    Get the libraries from the parent distribution, use those as the outfiles
-
-    Skip building anything; everything is already built, forward libraries to
-    the installation step
-    """
-
-    def run(self):
-        """
-        Copy libraries from the bin directory and place them as appropriate
-        """
-
-        self.announce("Moving library files", level=3)
-
-        # We have already built the libraries in the previous build_ext step
-
-        self.skip_build = True
-
-        bin_dir = self.distribution.bin_dir
-
-        libs = [os.path.join(bin_dir, _lib) for _lib in 
-                os.listdir(bin_dir) if 
-                os.path.isfile(os.path.join(bin_dir, _lib)) and 
-                os.path.splitext(_lib)[1] in [".dll", ".so"]
-                and not (_lib.startswith("python") or _lib.startswith("bpy"))]
-
-        for lib in libs:
-
-            shutil.move(lib, os.path.join(self.build_dir,
-                                          os.path.basename(lib)))
-
-        # Mark the libs for installation, adding them to 
-        # distribution.data_files seems to ensure that setuptools' record 
-        # writer appends them to installed-files.txt in the package's egg-info
-        #
-        # Also tried adding the libraries to the distribution.libraries list, 
-        # but that never seemed to add them to the installed-files.txt in the 
-        # egg-info, and the online recommendation seems to be adding libraries 
-        # into eager_resources in the call to setup(), which I think puts them 
-        # in data_files anyways. 
-        # 
-        # What is the best way?
-
-        self.distribution.data_files = [os.path.join(self.install_dir, 
-                                                     os.path.basename(lib))
-                                        for lib in libs]
-
-        # Must be forced to run after adding the libs to data_files
-
-        self.distribution.run_command("install_data")
-
-        super().run()
-
-class InstallBlenderScripts(install_scripts):
-    """
-    Install the scripts available from the "version folder" in the build dir
-    """
-
-    def run(self):
-        """
-        Copy the required directory to the build directory and super().run()
-        """
-
-        self.announce("Moving scripts files", level=3)
-
-        self.skip_build = True
-
-        bin_dir = self.distribution.bin_dir
-
-        scripts_dirs = [os.path.join(bin_dir, _dir) for _dir in
-                        os.listdir(bin_dir) if
-                        os.path.isdir(os.path.join(bin_dir, _dir))]
-
-        for scripts_dir in scripts_dirs:
-
-            dst_dir = os.path.join(self.build_dir,
-                                   os.path.basename(scripts_dir))
-
-            # Mostly in case of weird things happening during build
-            if os.path.exists(dst_dir):
-                
-                if os.path.isdir(dst_dir): 
-
-                    shutil.rmtree(dst_dir)
-
-                elif os.path.isfile(dst_dir):
-
-                    os.remove(dst_dir)
-
-            # Copy the blender scripts directory
-
-            shutil.copytree(scripts_dir,
-                            os.path.join(self.build_dir,
-                                     os.path.basename(scripts_dir)))
-
-        # Mark the scripts for installation, adding them to 
-        # distribution.scripts seems to ensure that the setuptools' record 
-        # writer appends them to installed-files.txt in the package's egg-info
-
-        self.distribution.scripts = scripts_dirs
-
-        super().run()
-
-class CMakeBuild(bdist_wheel):
-    """Create custom build 
-    """
-
-    user_options = bdist_wheel.user_options + [
-        ("bpy-prebuilt=", None, "Location of prebuilt bpy binaries"),
-        ("bpy-cmake-configure-args=", None, "Custom CMake options")
-    ]
-
-    def initialize_options(self):
-        """Allows for `cmake_extension_prebuild_dir`
-        """
-
-        super().initialize_options()
-        self.bpy_prebuilt = None
-        self.bpy_cmake_configure_args = None
-
-class BuildCMakeExt(build_ext):
-    """
-    Builds using cmake instead of the python setuptools implicit build
-    """
-    user_options = build_ext.user_options + [
-        ("bpy-prebuilt=", None, "Location of prebuilt bpy binaries"),
-        ("bpy-cmake-configure-args=", None, "Custom CMake options")
-    ]
-
-    def initialize_options(self):
-        """Allows for `cmake_extension_prebuild_dir`
-        """
-
-        super().initialize_options()
-        self.bpy_prebuilt = None
-        self.bpy_cmake_configure_args = None
-
-    def finalize_options(self):
-        """Grab options from previous call to `build`
-
-        This is required to get the options passed into --build-options
-        during bdist_wheel creation
-        """
-
-        super().finalize_options()
-
-        self.set_undefined_options('bdist_wheel',
-                                   ('bpy_prebuilt', 'bpy_prebuilt'),
-                                   ('bpy_cmake_configure_args',
-                                    'bpy_cmake_configure_args')
-                                   )
-
-    def run(self):
-        """
-        Perform build_cmake before doing the 'normal' stuff
-        """
-
-        os.makedirs(str(pathlib.Path(self.build_temp).absolute()), 
-                    exist_ok=True)
-
-        for extension in self.extensions:
-
-            extension_path = pathlib.Path(self.get_ext_fullpath(extension.name))
-
-            if isinstance(extension,CMakeExtension):
-
-                self.announce(f"Preparing the build environment for CMake "
-                              f"extension: \"{extension.name}\"", level=3)
-
-                os.makedirs(str(extension_path.parent.absolute()),
-                            exist_ok=True)
-
-            if extension.name == "bpy":
-
-                if self.bpy_prebuilt: # user assumes responsibility
-                                     # for built files
-
-                    self.announce(f"Using supplied prebuilt path "
-                                  f"{self.bpy_prebuilt}", level=3)
-
-                    self.copy_bpy(self.bpy_prebuilt, extension_path)
-
-                else: # we assume responsibility for built files
-
-                    git_checkout_path = pathlib.Path(os.path.join(self.build_temp, "blender"))
-                    build_path = pathlib.Path(os.path.join(self.build_temp, "build"))
-
-                    os.makedirs(str(git_checkout_path), exist_ok=True)
-                    os.makedirs(str(build_path), exist_ok=True)
-
-                    self.build_bpy(git_checkout_path, self.build_temp, build_path)
-
-        super().run()
-
-    def build_bpy(self, git_checkout_path: pathlib.Path, 
-                  svn_checkout_path: pathlib.Path, build_path: pathlib.Path):
-        """
-        The steps required to build the extension
-        """
-        # Import bpybuild here because otherwise the script will 
-        # fail before bpybuilt is retrieved
-
-        import bpybuild.sources
-        import bpybuild.make
-
-        self.announce("Searching for compatible Blender online "
-                      "(this will take a while)", level=3)
-
-        compatible_bpy = bpybuild.sources.get_compatible_sources()
-
-        if not VERSION_TUPLE in compatible_bpy:
-
-            raise Exception(f"{VERSION} bpy is not compatible with "
-                            f"{SYSTEM_OS_NAME} Python {sys.version} "
-                            f"{bpybuild.BITNESS}bit")
-
-        self.announce(f"Found compatible Blender version {VERSION}", level=3)
-
-        git_repo = compatible_bpy[VERSION_TUPLE][0][0]
-        svn_repo = compatible_bpy[VERSION_TUPLE][1][0]
-        # When using compatible_sources you always get a git and svn repo object
-
-        self.announce("Cloning Blender source from git "
-                      "(this will take a while)", level=3)
-
-        git_repo.checkout(git_checkout_path) # Clones into 'blender'
-
-        self.announce("Cloning precompiled libs from svn "
-                      "(this will take a while)", level=3)
-
-        svn_repo.checkout(svn_checkout_path) # Checkout into 'lib' (automatic)
-
-        self.announce("Configuring cmake project and building binaries "
-                      "(this will take a while)", level=3)
-
-        for command in bpybuild.make.get_make_commands(source_location= git_checkout_path,
-                                                       build_location= build_path,
-                                                       cmake_configure_args = self.cmake_configure_args):
-
-            self.spawn(command)
-
-        # Build finished, now copy the files into the copy directory
-        # The copy directory is the parent directory of the extension (.pyd)
-
-    def copy_bpy(self, source_path: pathlib.Path, dest_path: pathlib.Path):
-        """
-        Move the bpy files
-        """
-
-        self.announce("Searching for Blender python module", level=3)
-
-        bpy_canidates = [os.path.join(source_path, _bpy) for _bpy in
-                         os.listdir(source_path) if
-                         os.path.isfile(os.path.join(source_path, _bpy)) and
-                         os.path.splitext(_bpy)[0].startswith('bpy') and
-                         os.path.splitext(_bpy)[1] in [".pyd", ".so"]]
-
-        if not bpy_canidates:
-
-            raise Exception(f"Could not find Blender python module in {source_path}")
-
-        bpy_path = bpy_canidates[0]
-            
-        self.distribution.bin_dir = source_path
-
-        self.announce("Moving Blender python module", level=3)
-
-        shutil.copy(str(bpy_path), str(dest_path))
-
-        # After build_ext is run, the following commands will run:
-        # 
-        # install_lib
-        # install_scripts
-        # 
-        # These commands are subclassed above to avoid pitfalls that
-        # setuptools tries to impose when installing these, as it usually
-        # wants to build those libs and scripts as well or move them to a
-        # different place. See comments above for additional information
-
-setup(name='bpy',
-      version="2.93a0",
-      packages=find_packages(),
-      ext_modules=[CMakeExtension(name="bpy")],
-      entry_points={
-          "console_scripts": [
-              "bpy_post_install = "
-              "blenderpy.post_install:post_install",
-              "bpy_pre_uninstall = "
-              "blenderpy.pre_uninstall:pre_uninstall"
-          ]
-      },
-      description='Blender as a python module',
-      long_description=open(os.path.join(os.path.dirname(os.path.abspath(__file__)),"README.md"), 'r').read(),
-      long_description_content_type="text/markdown",
-      keywords="Blender, 3D, Animation, Renderer, Rendering",
-      classifiers=["Development Status :: 3 - Alpha",
-                   "Environment :: Win32 (MS Windows)",
-                   "Intended Audience :: Developers",
-                   "License :: OSI Approved :: "
-                   "GNU General Public License v3 (GPLv3)",
-                   "Natural Language :: English",
-                   "Operating System :: MacOS",
-                   "Operating System :: POSIX :: Linux",
-                   "Operating System :: Microsoft :: Windows",
-                   "Programming Language :: C",
-                   "Programming Language :: C++",
-                   "Programming Language :: Python :: Implementation :: "
-                   "CPython",
-                   "Topic :: Artistic Software",
-                   "Topic :: Education",
-                   "Topic :: Multimedia",
-                   "Topic :: Multimedia :: Graphics",
-                   "Topic :: Multimedia :: Graphics :: 3D Modeling",
-                   "Topic :: Multimedia :: Graphics :: 3D Rendering",
-                   "Topic :: Games/Entertainment"],
-      author='Tyler Gubala',
-      author_email='gubalatyler@gmail.com',
-      license='GPL-3.0',
-      python_requires=">=3.7, <3.8",
-      install_requires=["numpy==1.19.3"],
-      url="https://github.com/TylerGubala/blenderpy",
-      cmdclass={
-          'bdist_wheel': CMakeBuild,
-          'build_ext': BuildCMakeExt,
-          'install_data': InstallCMakeLibsData,
-          'install_lib': InstallCMakeLibs,
-          'install_scripts': InstallBlenderScripts
-          },
-      setup_requires=[
-          "bpy-build",
-          "wheel"
-      ]
-     )
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Build blender into a python module
+"""
+
+from distutils.command.install_data import install_data
+import os
+import pathlib
+import pkg_resources
+import platform
+import re
+import shlex
+from setuptools import find_packages, setup, Extension
+from setuptools.command.build_ext import build_ext
+from setuptools.command.install import install
+from setuptools.command.install_lib import install_lib
+from setuptools.command.install_scripts import install_scripts
+import shutil
+import struct
+import sys
+from typing import List, Set
+import wheel.bdist_wheel
+from wheel.bdist_wheel import bdist_wheel
+
+# Relative imports
+from blenderpy.build_cache import BUILD_CACHE_DEFAULT_SIZE_LIMIT, BuildCache,\
+                                  get_build_cache_key
+from blenderpy.compatibility import COMPATIBILITY_CACHE_DEFAULT_TTL,\
+                                    CompatibilityCache,\
+                                    get_compatible_sources
+from blenderpy.build_profile import BUILD_PROFILE_AUTO, BUILD_PROFILES,\
+                                    get_build_profile
+from blenderpy.build_report import get_build_report, get_build_report_path
+from blenderpy.fileops import sync_files, sync_tree
+from blenderpy.libs import LibraryStats, find_duplicates, list_libraries,\
+                           strip_libraries, write_libs_manifest
+from blenderpy.mirror import SourceMirror
+from blenderpy.resources import BUNDLE_SUFFIX, write_bundle
+from blenderpy.wheel_writer import DEFAULT_COMPRESS_LEVEL,\
+                                  DEFAULT_COMPRESS_WORKERS,\
+                                  make_wheel_file_factory
+
+# Monkey-patch 3.4 and below
+
+if sys.version_info < (3,5):
+
+    def home_path() -> pathlib.Path:
+
+        return pathlib.Path(os.path.expanduser("~"))
+
+    pathlib.Path.home = home_path
+
+PYTHON_EXE_DIR = os.path.dirname(sys.executable)
+
+SYSTEM_OS_NAME = platform.system()
+
+# Change the Blender desired API version variable to build different versions
+# of the Blender API. For instance, 'v2.79b' is the same version of the API
+# as you would get when opening the Blender application at v2.79b
+VERSION = "3.20"
+VERSION_TUPLE = pkg_resources.parse_version(VERSION)
+
+# Options of both `bdist_wheel` and `build_ext`; `build_ext` takes any that
+# weren't given to it directly from `bdist_wheel` (i.e. from --build-option)
+BPY_USER_OPTIONS = [
+    ("bpy-prebuilt=", None, "Location of prebuilt bpy binaries"),
+    ("bpy-cmake-configure-args=", None, "Custom CMake options"),
+    ("bpy-jobs=", None, "Parallel compile jobs (default: chosen by the build "
+                        "profile)"),
+    ("bpy-build-profile=", None, f"How to use this host for the build: "
+                                 f"{', '.join(BUILD_PROFILES)} (default: "
+                                 f"{BUILD_PROFILE_AUTO})"),
+    ("bpy-build-cache=", None, "Location of the cache of built binaries"),
+    ("bpy-build-cache-size=", None, "Size limit of the build cache in GB"),
+    ("bpy-no-build-cache", None, "Always build Blender from source"),
+    ("bpy-sync-hash", None, "Compare contents, not just size and mtime, "
+                            "when updating scripts and libraries"),
+    ("bpy-dedupe-libs", None, "Ship libraries with the same contents once, "
+                              "linked back by bpy_post_install"),
+    ("bpy-strip-libs", None, "Strip debug info from the libraries (needs "
+                             "objcopy)"),
+    ("bpy-symbols-archive=", None, "Where to keep the debug info stripped "
+                                   "from the libraries (default: "
+                                   "bpy-symbols.zip next to the build dir)"),
+    ("bpy-pack-resources", None, "Ship datafiles and scripts as one indexed "
+                                 "archive, extracted by bpy_post_install next "
+                                 "to the install, or into $BPY_RESOURCE_CACHE "
+                                 "when set; only a cache shared between "
+                                 "installs saves files on disk"),
+    ("bpy-source-mirror=", None, "Location of the local mirror of the "
+                                 "Blender sources"),
+    ("bpy-no-source-mirror", None, "Check the Blender sources out directly, "
+                                   "without the local mirror"),
+    ("bpy-offline", None, "Never go online; use the local mirror and the "
+                          "cached compatible versions as they are"),
+    ("bpy-compatibility-ttl=", None, "Hours to reuse the compatible Blender "
+                                     "versions found online")
+]
+
+BPY_BOOLEAN_OPTIONS = ["bpy-no-build-cache", "bpy-sync-hash", "bpy-pack-resources",
+                       "bpy-dedupe-libs", "bpy-strip-libs",
+                       "bpy-no-source-mirror", "bpy-offline"]
+
+BPY_OPTION_NAMES = [option[0].rstrip("=").replace("-", "_") for option in 
+                    BPY_USER_OPTIONS]
+
+def get_sync_manifest_path(build_dir: str, name: str) -> str:
+    """Where the incremental copy of `name` into `build_dir` keeps its manifest
+
+    Kept outside of `build_dir` so that it isn't installed along with the rest
+    """
+
+    return os.path.join(os.path.dirname(os.path.abspath(build_dir)), "bpy-sync",
+                        f"{os.path.basename(build_dir)}-{name}.json")
+
+class CMakeExtension(Extension):
+    """
+    An extension to run the cmake build
+    """
+
+    def __init__(self, name, sources=[]):
+
+        super().__init__(name = name, sources = sources)
+
+class InstallCMakeLibsData(install_data):
+    """
+    Just a wrapper to get the install data into the egg-info
+    """
+
+    def run(self):
+        """
+        Outfiles are the libraries that were built using cmake
+        """
+
+        # There seems to be no other way to do this; I tried listing the
+        # libraries during the execution of the InstallCMakeLibs.run() but
+        # setuptools never tracked them, seems like setuptools wants to
+        # track the libraries through package data more than anything...
+        # help would be appriciated
+
+        self.outfiles = self.distribution.data_files
+
+class InstallCMakeLibs(install_lib):
+    """
+    Get the libraries from the parent distribution, use those as the outfiles
+
+    Skip building anything; everything is already built, forward libraries to
+    the installation step
+    """
+
+    def run(self):
+        """
+        Copy libraries from the bin directory and place them as appropriate
+        """
+
+        self.announce("Moving library files", level=3)
+
+        # We have already built the libraries in the previous build_ext step
+
+        self.skip_build = True
+
+        bin_dir = self.distribution.bin_dir
+
+        libs = list_libraries(bin_dir)
+
+        library_stats = LibraryStats()
+
+        # Libraries with the same contents are shipped once, the other names
+        # are linked back by bpy_post_install
+
+        aliases = find_duplicates(libs, library_stats) if \
+                  self.distribution.bpy_dedupe_libs else {}
+
+        libs = {name: lib for name, lib in libs.items() if name not in aliases}
+
+        # Counted here, since without dedupe nothing else counts them
+        library_stats.libraries = len(libs)
+
+        # Synced rather than moved, so that rebuilding from the same bin dir
+        # only copies the libraries that changed
+
+        with get_build_report(self.distribution).phase("install_lib"):
+
+            stats = sync_files(libs, self.build_dir,
+                               get_sync_manifest_path(self.build_dir, "libs"),
+                               hardlink=True,
+                               use_hash=self.distribution.bpy_sync_hash)
+
+        # An earlier build without dedupe may have left the aliases there,
+        # and install_lib installs whatever is in build_dir
+        for name in aliases:
+
+            alias_path = os.path.join(self.build_dir, name)
+
+            if os.path.lexists(alias_path):
+
+                os.remove(alias_path)
+
+        self.announce(f"Synced library files: {stats}", level=3)
+
+        if self.distribution.bpy_strip_libs:
+
+            with get_build_report(self.distribution).phase("strip_libs") as phase:
+
+                strip_libraries(libs, self.build_dir,
+                                self.distribution.bpy_symbols_archive or
+                                os.path.join(os.path.dirname(
+                                    os.path.abspath(self.build_dir)),
+                                    "bpy-symbols.zip"),
+                                library_stats)
+
+                phase.details.update(library_stats.to_dict())
+
+        self.announce(f"Processed library files: {library_stats}", level=3)
+
+        lib_names = list(libs)
+
+        if aliases:
+
+            lib_names.append(os.path.basename(write_libs_manifest(self.build_dir,
+                                                                  aliases)))
+
+        # Mark the libs for installation, adding them to 
+        # distribution.data_files seems to ensure that setuptools' record 
+        # writer appends them to installed-files.txt in the package's egg-info
+        #
+        # Also tried adding the libraries to the distribution.libraries list, 
+        # but that never seemed to add them to the installed-files.txt in the 
+        # egg-info, and the online recommendation seems to be adding libraries 
+        # into eager_resources in the call to setup(), which I think puts them 
+        # in data_files anyways. 
+        # 
+        # What is the best way?
+
+        self.distribution.data_files = [os.path.join(self.install_dir, name)
+                                        for name in lib_names]
+
+        # Must be forced to run after adding the libs to data_files
+
+        self.distribution.run_command("install_data")
+
+        super().run()
+
+class InstallBlenderScripts(install_scripts):
+    """
+    Install the scripts available from the "version folder" in the build dir
+    """
+
+    def run(self):
+        """
+        Copy the required directory to the build directory and super().run()
+        """
+
+        self.announce("Moving scripts files", level=3)
+
+        self.skip_build = True
+
+        bin_dir = self.distribution.bin_dir
+
+        scripts_dirs = [os.path.join(bin_dir, _dir) for _dir in
+                        os.listdir(bin_dir) if
+                        os.path.isdir(os.path.join(bin_dir, _dir))]
+
+        if self.distribution.bpy_pack_resources:
+
+            self.distribution.scripts = [self.pack_scripts_dir(scripts_dir) for
+                                         scripts_dir in scripts_dirs]
+
+            super().run()
+
+            return
+
+        for scripts_dir in scripts_dirs:
+
+            dst_dir = os.path.join(self.build_dir,
+                                   os.path.basename(scripts_dir))
+
+            with get_build_report(self.distribution).phase("install_scripts",
+                                                           source=scripts_dir):
+
+                # Only copy what changed since the last build; without a
+                # manifest from one the destination is replaced entirely. The
+                # build dir is only read from here on, so hard links to the
+                # built files are fine
+
+                stats = sync_tree(scripts_dir, dst_dir,
+                                  get_sync_manifest_path(self.build_dir,
+                                                         os.path.basename(scripts_dir)),
+                                  hardlink=True,
+                                  use_hash=self.distribution.bpy_sync_hash)
+
+            self.announce(f"Synced {scripts_dir}: {stats}", level=3)
+
+        # Mark the scripts for installation, adding them to 
+        # distribution.scripts seems to ensure that the setuptools' record 
+        # writer appends them to installed-files.txt in the package's egg-info
+
+        self.distribution.scripts = scripts_dirs
+
+        super().run()
+
+    def pack_scripts_dir(self, scripts_dir: str) -> str:
+        """Pack the version folder into one bundle in the build dir
+        """
+
+        os.makedirs(self.build_dir, exist_ok=True)
+
+        bundle_path = os.path.join(self.build_dir,
+                                   os.path.basename(scripts_dir) + BUNDLE_SUFFIX)
+
+        with get_build_report(self.distribution).phase("pack_resources",
+                                                       source=scripts_dir):
+
+            stats = write_bundle(scripts_dir, bundle_path)
+
+        self.announce(f"Packed {scripts_dir}: {stats}", level=3)
+
+        return bundle_path
+
+class CMakeBuild(bdist_wheel):
+    """Create custom build 
+    """
+
+    user_options = bdist_wheel.user_options + BPY_USER_OPTIONS + [
+        ("bpy-build-report=", None, "Where to write the build timing report "
+                                    "(default: next to the wheel)"),
+        ("bpy-parallel-wheel", None, "Compress the wheel with a pool of "
+                                     "threads, storing compressed formats as is"),
+        ("bpy-wheel-workers=", None, "Threads compressing the wheel with "
+                                     "--bpy-parallel-wheel"),
+        ("bpy-wheel-compresslevel=", None, "Deflate level (0-9) used with "
+                                           "--bpy-parallel-wheel")
+    ]
+
+    boolean_options = bdist_wheel.boolean_options + BPY_BOOLEAN_OPTIONS + [
+        "bpy-parallel-wheel"
+    ]
+
+    def initialize_options(self):
+        """Allows for `cmake_extension_prebuild_dir`
+        """
+
+        super().initialize_options()
+
+        for option_name in BPY_OPTION_NAMES:
+
+            setattr(self, option_name, None)
+
+        self.bpy_build_report = None
+        self.bpy_parallel_wheel = None
+        self.bpy_wheel_workers = None
+        self.bpy_wheel_compresslevel = None
+
+    def finalize_options(self):
+
+        super().finalize_options()
+
+        self.bpy_wheel_workers = DEFAULT_COMPRESS_WORKERS if \
+                                 self.bpy_wheel_workers is None else \
+                                 int(self.bpy_wheel_workers)
+
+        self.bpy_wheel_compresslevel = DEFAULT_COMPRESS_LEVEL if \
+                                       self.bpy_wheel_compresslevel is None else \
+                                       int(self.bpy_wheel_compresslevel)
+
+    def run(self):
+        """Time the whole wheel build and write the report next to the wheel
+        """
+
+        report = get_build_report(self.distribution)
+
+        report.metadata.update({"version": VERSION,
+                                "python": sys.version,
+                                "platform": self.plat_name,
+                                "bpy_prebuilt": self.bpy_prebuilt,
+                                "bpy_cmake_configure_args":
+                                self.bpy_cmake_configure_args})
+
+        # bdist_wheel offers no way to choose how the archive is written, so
+        # the class it writes with is swapped for the duration of the build
+        wheel_file_class = wheel.bdist_wheel.WheelFile
+
+        if self.bpy_parallel_wheel:
+
+            wheel.bdist_wheel.WheelFile = make_wheel_file_factory(self.bpy_wheel_workers,
+                                                                  self.bpy_wheel_compresslevel)
+
+        try:
+
+            with report.phase("bdist_wheel"):
+
+                super().run()
+
+                # Started in `write_wheelfile`, right before the zipping
+                if self._archive_phase is not None:
+
+                    self._archive_phase.stop()
+
+        finally:
+
+            wheel.bdist_wheel.WheelFile = wheel_file_class
+
+        report_path = self.bpy_build_report or\
+                      get_build_report_path(self.dist_dir,
+                                            "-".join([self.wheel_dist_name] +
+                                                     list(self.get_tag())))
+
+        report.write(report_path)
+
+        self.announce(f"Wrote build report to {report_path}", level=3)
+
+    def run_command(self, command):
+        """Time the `build` and `install` steps of the wheel build
+        """
+
+        with get_build_report(self.distribution).phase(command):
+
+            super().run_command(command)
+
+    def write_wheelfile(self, *args, **kwargs):
+        """Start timing the wheel archive, which is written right after this
+        """
+
+        super().write_wheelfile(*args, **kwargs)
+
+        self._archive_phase = get_build_report(self.distribution).phase("archive").start()
+
+    _archive_phase = None
+
+class BuildCMakeExt(build_ext):
+    """
+    Builds using cmake instead of the python setuptools implicit build
+    """
+    user_options = build_ext.user_options + BPY_USER_OPTIONS
+
+    boolean_options = build_ext.boolean_options + BPY_BOOLEAN_OPTIONS
+
+    def initialize_options(self):
+        """Allows for `cmake_extension_prebuild_dir`
+        """
+
+        super().initialize_options()
+
+        for option_name in BPY_OPTION_NAMES:
+
+            setattr(self, option_name, None)
+
+    def finalize_options(self):
+        """Grab options from previous call to `build`
+
+        This is required to get the options passed into --build-options
+        during bdist_wheel creation
+        """
+
+        super().finalize_options()
+
+        self.set_undefined_options('bdist_wheel',
+                                   *[(option_name, option_name) for 
+                                     option_name in BPY_OPTION_NAMES])
+
+        if self.bpy_build_cache_size is None:
+
+            self.bpy_build_cache_size = BUILD_CACHE_DEFAULT_SIZE_LIMIT
+
+        self.bpy_build_cache_size = float(self.bpy_build_cache_size)
+
+        if self.bpy_compatibility_ttl is None:
+
+            self.bpy_compatibility_ttl = COMPATIBILITY_CACHE_DEFAULT_TTL
+
+        self.bpy_compatibility_ttl = float(self.bpy_compatibility_ttl)
+
+        if self.bpy_jobs is not None:
+
+            self.bpy_jobs = int(self.bpy_jobs)
+
+        if self.bpy_build_profile is None:
+
+            self.bpy_build_profile = BUILD_PROFILE_AUTO
+
+    def get_cmake_configure_args(self) -> List[str]:
+        """The `--bpy-cmake-configure-args` split into separate arguments
+        """
+
+        if not self.bpy_cmake_configure_args:
+
+            return []
+
+        return shlex.split(self.bpy_cmake_configure_args)
+
+    def run(self):
+        """
+        Perform build_cmake before doing the 'normal' stuff
+        """
+
+        os.makedirs(str(pathlib.Path(self.build_temp).absolute()), 
+                    exist_ok=True)
+
+        for extension in self.extensions:
+
+            extension_path = pathlib.Path(self.get_ext_fullpath(extension.name))
+
+            if isinstance(extension,CMakeExtension):
+
+                self.announce(f"Preparing the build environment for CMake "
+                              f"extension: \"{extension.name}\"", level=3)
+
+                os.makedirs(str(extension_path.parent.absolute()),
+                            exist_ok=True)
+
+            if extension.name == "bpy":
+
+                if self.bpy_prebuilt: # user assumes responsibility
+                                     # for built files
+
+                    self.announce(f"Using supplied prebuilt path "
+                                  f"{self.bpy_prebuilt}", level=3)
+
+                    with get_build_report(self.distribution).phase("copy_bpy"):
+
+                        self.copy_bpy(self.bpy_prebuilt, extension_path)
+
+                else: # we assume responsibility for built files
+
+                    git_checkout_path = pathlib.Path(os.path.join(self.build_temp, "blender"))
+                    build_path = pathlib.Path(os.path.join(self.build_temp, "build"))
+                    bin_path = build_path / "bin"
+
+                    build_cache = None if self.bpy_no_build_cache else \
+                                  BuildCache(self.bpy_build_cache, 
+                                             self.bpy_build_cache_size)
+
+                    build_cache_key = get_build_cache_key(VERSION, 
+                                                          self.get_cmake_configure_args())
+
+                    with get_build_report(self.distribution).phase("build cache restore"):
+
+                        restored = build_cache is not None and \
+                                   build_cache.restore(build_cache_key, str(bin_path))
+
+                    if restored:
+
+                        self.announce(f"Restored Blender binaries from build "
+                                      f"cache {build_cache.root}", level=3)
+
+                    else:
+
+                        os.makedirs(str(git_checkout_path), exist_ok=True)
+                        os.makedirs(str(build_path), exist_ok=True)
+
+                        self.build_bpy(git_checkout_path, self.build_temp, build_path)
+
+                        if build_cache is not None:
+
+                            self.announce(f"Storing Blender binaries in build "
+                                          f"cache {build_cache.root}", level=3)
+
+                            with get_build_report(self.distribution).phase("build cache store"):
+
+                                build_cache.store(build_cache_key, str(bin_path))
+
+                    with get_build_report(self.distribution).phase("copy_bpy"):
+
+                        self.copy_bpy(bin_path, extension_path)
+
+        super().run()
+
+    def build_bpy(self, git_checkout_path: pathlib.Path, 
+                  svn_checkout_path: pathlib.Path, build_path: pathlib.Path):
+        """
+        The steps required to build the extension
+        """
+        # Import bpybuild here because otherwise the script will 
+        # fail before bpybuilt is retrieved
+
+        import bpybuild.sources
+        import bpybuild.make
+
+        report = get_build_report(self.distribution)
+
+        compatibility_cache = CompatibilityCache(ttl=self.bpy_compatibility_ttl,
+                                                 offline=bool(self.bpy_offline))
+
+        if compatibility_cache.load() is None:
+
+            self.announce("Searching for compatible Blender online "
+                          "(this will take a while)", level=3)
+
+        else:
+
+            self.announce(f"Using compatible Blender versions cached in "
+                          f"{compatibility_cache.path}", level=3)
+
+        with report.phase("compatibility search"):
+
+            compatible_bpy = get_compatible_sources(compatibility_cache,
+                                                    bpybuild.sources.get_compatible_sources,
+                                                    bpybuild.sources.BlenderGit,
+                                                    bpybuild.sources.BlenderSvn)
+
+        if not VERSION_TUPLE in compatible_bpy:
+
+            raise Exception(f"{VERSION} bpy is not compatible with "
+                            f"{SYSTEM_OS_NAME} Python {sys.version} "
+                            f"{bpybuild.BITNESS}bit")
+
+        self.announce(f"Found compatible Blender version {VERSION}", level=3)
+
+        git_repo = compatible_bpy[VERSION_TUPLE][0][0]
+        svn_repo = compatible_bpy[VERSION_TUPLE][1][0]
+        # When using compatible_sources you always get a git and svn repo object
+
+        if self.bpy_no_source_mirror:
+
+            self.announce("Cloning Blender source from git "
+                          "(this will take a while)", level=3)
+
+            with report.phase("git clone"):
+
+                git_repo.checkout(git_checkout_path) # Clones into 'blender'
+
+            self.announce("Cloning precompiled libs from svn "
+                          "(this will take a while)", level=3)
+
+            with report.phase("svn checkout"):
+
+                svn_repo.checkout(svn_checkout_path) # Checkout into 'lib' (automatic)
+
+        else:
+
+            mirror = SourceMirror(self.bpy_source_mirror, 
+                                  offline=bool(self.bpy_offline), run=self.spawn)
+
+            self.announce(f"Updating Blender source mirror in {mirror.root} "
+                          f"and cloning from it (slow only the first time)",
+                          level=3)
+
+            with report.phase("git clone"):
+
+                mirror.checkout_git(git_repo.BASE_URL, git_repo.tag, 
+                                    str(git_checkout_path))
+
+            self.announce("Updating precompiled libs mirror and linking them "
+                          "(slow only the first time)", level=3)
+
+            with report.phase("svn checkout"):
+
+                mirror.checkout_svn(svn_repo.url, str(svn_checkout_path))
+
+        self.announce("Configuring cmake project and building binaries "
+                      "(this will take a while)", level=3)
+
+        build_profile = get_build_profile(self.bpy_build_profile, self.bpy_jobs,
+                                          str(build_path))
+
+        self.announce(f"Building with the {build_profile}", level=3)
+
+        report.metadata["build_profile"] = build_profile.to_dict()
+
+        commands = build_profile.apply(
+            bpybuild.make.get_make_commands(source_location= git_checkout_path,
+                                            build_location= build_path,
+                                            cmake_configure_args = self.get_cmake_configure_args()))
+
+        for index, command in enumerate(commands):
+
+            with report.phase(f"{command[0]} ({index + 1}/{len(commands)})",
+                              command=command):
+
+                self.spawn(command)
+
+        # Build finished, now copy the files into the copy directory
+        # The copy directory is the parent directory of the extension (.pyd)
+
+    def copy_bpy(self, source_path: pathlib.Path, dest_path: pathlib.Path):
+        """
+        Move the bpy files
+        """
+
+        self.announce("Searching for Blender python module", level=3)
+
+        bpy_canidates = [os.path.join(source_path, _bpy) for _bpy in
+                         os.listdir(source_path) if
+                         os.path.isfile(os.path.join(source_path, _bpy)) and
+                         os.path.splitext(_bpy)[0].startswith('bpy') and
+                         os.path.splitext(_bpy)[1] in [".pyd", ".so"]]
+
+        if not bpy_canidates:
+
+            raise Exception(f"Could not find Blender python module in {source_path}")
+
+        bpy_path = bpy_canidates[0]
+            
+        self.distribution.bin_dir = source_path
+        self.distribution.bpy_sync_hash = bool(self.bpy_sync_hash)
+        self.distribution.bpy_pack_resources = bool(self.bpy_pack_resources)
+        self.distribution.bpy_dedupe_libs = bool(self.bpy_dedupe_libs)
+        self.distribution.bpy_strip_libs = bool(self.bpy_strip_libs)
+        self.distribution.bpy_symbols_archive = self.bpy_symbols_archive
+
+        self.announce("Moving Blender python module", level=3)
+
+        shutil.copy(str(bpy_path), str(dest_path))
+
+        # After build_ext is run, the following commands will run:
+        # 
+        # install_lib
+        # install_scripts
+        # 
+        # These commands are subclassed above to avoid pitfalls that
+        # setuptools tries to impose when installing these, as it usually
+        # wants to build those libs and scripts as well or move them to a
+        # different place. See comments above for additional information
+
+setup(name='bpy',
+      version="2.93a0",
+      packages=find_packages(),
+      ext_modules=[CMakeExtension(name="bpy")],
+      entry_points={
+          "console_scripts": [
+              "bpy_post_install = "
+              "blenderpy.post_install:post_install",
+              "bpy_pre_uninstall = "
+              "blenderpy.pre_uninstall:pre_uninstall",
+              "bpy_package_wheels = "
+              "blenderpy.package_wheels:main",
+              "bpy_daemon = "
+              "blenderpy.daemon:main"
+          ]
+      },
+      description='Blender as a python module',
+      long_description=open(os.path.join(os.path.dirname(os.path.abspath(__file__)),"README.md"), 'r').read(),
+      long_description_content_type="text/markdown",
+      keywords="Blender, 3D, Animation, Renderer, Rendering",
+      classifiers=["Development Status :: 3 - Alpha",
+                   "Environment :: Win32 (MS Windows)",
+                   "Intended Audience :: Developers",
+                   "License :: OSI Approved :: "
+                   "GNU General Public License v3 (GPLv3)",
+                   "Natural Language :: English",
+                   "Operating System :: MacOS",
+                   "Operating System :: POSIX :: Linux",
+                   "Operating System :: Microsoft :: Windows",
+                   "Programming Language :: C",
+                   "Programming Language :: C++",
+                   "Programming Language :: Python :: Implementation :: "
+                   "CPython",
+                   "Topic :: Artistic Software",
+                   "Topic :: Education",
+                   "Topic :: Multimedia",
+                   "Topic :: Multimedia :: Graphics",
+                   "Topic :: Multimedia :: Graphics :: 3D Modeling",
+                   "Topic :: Multimedia :: Graphics :: 3D Rendering",
+                   "Topic :: Games/Entertainment"],
+      author='Tyler Gubala',
+      author_email='gubalatyler@gmail.com',
+      license='GPL-3.0',
+      python_requires=">=3.7, <3.8",
+      install_requires=["numpy==1.19.3"],
+      url="https://github.com/TylerGubala/blenderpy",
+      cmdclass={
+          'bdist_wheel': CMakeBuild,
+          'build_ext': BuildCMakeExt,
+          'install_data': InstallCMakeLibsData,
+          'install_lib': InstallCMakeLibs,
+          'install_scripts': InstallBlenderScripts
+          },
+      setup_requires=[
+          "bpy-build",
+          "wheel"
+      ]
+     )
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the numpy accessors, with fake collections in place of `bpy`'s
+"""
+
+import numpy
+import pytest
+
+from blenderpy import arrays
+
+class FakeCollection():
+    """Items with one property, stored flat like `bpy` does
+    """
+
+    def __init__(self, count, components, dtype=numpy.float32):
+
+        self.values = numpy.arange(count * components, dtype=dtype)
+
+        self.count = count
+
+    def __len__(self):
+
+        return self.count
+
+    def foreach_get(self, attribute, buffer):
+
+        assert buffer.dtype == self.values.dtype and buffer.size == self.values.size
+
+        buffer[:] = self.values
+
+    def foreach_set(self, attribute, buffer):
+
+        assert buffer.dtype == self.values.dtype and buffer.size == self.values.size
+
+        self.values = numpy.array(buffer)
+
+class FakeObject():
+
+    def __init__(self, offset):
+
+        # Row by row, like `mathutils.Matrix`
+        self.matrix_world = [[offset + row * 4 + column for column in range(4)]
+                             for row in range(4)]
+
+def test_get_and_set():
+
+    pool = arrays.BufferPool()
+
+    vertices = FakeCollection(100, 3)
+
+    coordinates = arrays.get_array(vertices, "co", pool=pool)
+
+    assert coordinates.shape == (100, 3) and coordinates.dtype == numpy.float32
+    assert coordinates[99].tolist() == [297, 298, 299]
+
+    arrays.set_array(vertices, "co", coordinates.astype(numpy.float64) * 2, pool=pool)
+
+    assert arrays.get_array(vertices, "co", pool=pool)[99].tolist() == [594, 596, 598]
+
+    # Reading again, or less, reuses the buffer
+    arrays.get_array(FakeCollection(50, 3), "co", pool=pool)
+
+    assert pool.stats["allocations"] == 1
+
+    out = numpy.empty((100, 3), dtype=numpy.float32)
+
+    assert arrays.get_array(vertices, "co", out=out, pool=pool) is out
+
+    with pytest.raises(ValueError):
+
+        arrays.get_array(vertices, "co", out=numpy.empty((100, 3)), pool=pool)
+
+    indices = arrays.get_array(FakeCollection(10, 1, numpy.int32), "material_index",
+                               pool=pool)
+
+    assert indices.shape == (10,) and indices.dtype == numpy.int32
+
+def test_many():
+
+    pool = arrays.BufferPool()
+
+    meshes = [FakeCollection(count, 2) for count in [3, 0, 5]]
+
+    uvs, offsets = arrays.get_many(meshes, "uv", pool=pool)
+
+    assert offsets.tolist() == [0, 3, 3, 8]
+    assert uvs[offsets[2]:offsets[3]].tolist() == meshes[2].values.reshape(5, 2).tolist()
+
+    arrays.set_many(meshes, "uv", uvs + 1, pool=pool)
+
+    assert meshes[0].values.tolist() == [1, 2, 3, 4, 5, 6]
+
+def test_matrices():
+
+    pool = arrays.BufferPool()
+
+    objects = [FakeObject(0), FakeObject(16)]
+
+    matrices = arrays.get_matrices(objects, pool=pool)
+
+    # Same indexing as the objects' own matrices
+    assert matrices[1].tolist() == objects[1].matrix_world
+
+    arrays.set_matrices(objects, matrices[::-1] * 1, pool=pool)
+
+    assert objects[0].matrix_world == [[16 + row * 4 + column for column in range(4)]
+                                       for row in range(4)]
+
+    # A `bpy` collection of objects is read in one call, column by column
+    collection = FakeCollection(2, 16)
+
+    assert arrays.get_matrices(collection, pool=pool)[0, 0].tolist() == [0, 4, 8, 12]
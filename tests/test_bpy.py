@@ -1,8 +1,8 @@
-import bpy
-
-assert bpy is not None
-assert bpy.types is not None
-
-import bmesh
-
+import bpy
+
+assert bpy is not None
+assert bpy.types is not None
+
+import bmesh
+
 assert bmesh is not None
\ No newline at end of file
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the cache of built Blender binaries
+"""
+
+import os
+import time
+
+from blenderpy.build_cache import BuildCache, get_build_cache_key
+
+def make_bin_tree(root, payload=b"bpy"):
+
+    os.makedirs(os.path.join(str(root), "2.93", "scripts"))
+
+    with open(os.path.join(str(root), "bpy.so"), "wb") as _file:
+
+        _file.write(payload)
+
+    with open(os.path.join(str(root), "2.93", "scripts", "addon.py"), "w") as _file:
+
+        _file.write("pass")
+
+    return str(root)
+
+def test_key_depends_on_configure_args():
+
+    assert get_build_cache_key("2.93", []) == get_build_cache_key("2.93", [])
+    assert get_build_cache_key("2.93", []) != get_build_cache_key("2.93", ["-DWITH_CYCLES=OFF"])
+    assert get_build_cache_key("2.93", []) != get_build_cache_key("2.92", [])
+
+def test_store_and_restore(tmp_path):
+
+    cache = BuildCache(str(tmp_path / "cache"))
+    source = make_bin_tree(tmp_path / "bin")
+
+    assert not cache.restore("key", str(tmp_path / "restored"))
+
+    cache.store("key", source)
+
+    assert cache.restore("key", str(tmp_path / "restored"))
+    assert open(str(tmp_path / "restored" / "bpy.so"), "rb").read() == b"bpy"
+    assert os.path.isfile(str(tmp_path / "restored" / "2.93" / "scripts" / "addon.py"))
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+
+    cache = BuildCache(str(tmp_path / "cache"))
+
+    cache.store("key", make_bin_tree(tmp_path / "bin"))
+
+    with open(os.path.join(cache.entry_path("key"), "bin", "bpy.so"), "wb") as _file:
+
+        _file.write(b"not bpy")
+
+    assert not cache.restore("key", str(tmp_path / "restored"))
+    assert not os.path.exists(str(tmp_path / "restored"))
+    assert cache.entries() == []
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+
+    payload = b"x" * 1024
+
+    # Room for two entries, but not three
+    cache = BuildCache(str(tmp_path / "cache"), size_limit=2.5 * 1024 / 1024 ** 3)
+
+    for key in ["a", "b"]:
+
+        cache.store(key, make_bin_tree(tmp_path / key, payload))
+
+        time.sleep(0.01)
+
+    assert cache.restore("a", str(tmp_path / "restored"))
+
+    time.sleep(0.01)
+
+    cache.store("c", make_bin_tree(tmp_path / "c", payload))
+
+    assert cache.entries() == ["a", "c"]
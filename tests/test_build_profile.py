@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for choosing and applying the build settings
+"""
+
+import os
+
+from blenderpy.build_profile import get_build_profile
+
+GB = 1024 ** 3
+
+def which_none(name):
+
+    return None
+
+def which_all(name):
+
+    return "/usr/bin/" + name
+
+def test_memory_limits_compile_and_link_jobs():
+
+    profile = get_build_profile(cpu_count=64, memory=32 * GB, which=which_none)
+
+    assert profile.jobs == 21
+    assert profile.link_jobs == 4
+
+    profile = get_build_profile("low-memory", cpu_count=4, memory=4 * GB,
+                                which=which_none)
+
+    assert profile.jobs == 1
+    assert profile.link_jobs == 1
+
+    profile = get_build_profile("max", cpu_count=64, memory=32 * GB,
+                                which=which_none)
+
+    assert profile.jobs == 64
+
+def test_jobs_override():
+
+    profile = get_build_profile(jobs=3, cpu_count=64, memory=256 * GB,
+                                which=which_none)
+
+    assert profile.jobs == 3
+    assert profile.link_jobs == 3
+
+def test_apply_with_make():
+
+    profile = get_build_profile(cpu_count=8, memory=64 * GB, which=which_none)
+
+    commands = profile.apply([["cmake", "-DWITH_PYTHON_MODULE=ON", "", "-S/src", "-B/build"],
+                              ["make", "-C", "/build", "install"]])
+
+    assert commands == [["cmake", "-DWITH_PYTHON_MODULE=ON", "-S/src", "-B/build"],
+                        ["make", "-j", "8", "-C", "/build", "install"]]
+
+def test_apply_with_ninja_and_ccache(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("platform.system", lambda: "Linux")
+
+    profile = get_build_profile(cpu_count=8, memory=16 * GB, which=which_all)
+
+    commands = profile.apply([["cmake", "-S/src", "-B/build"],
+                              ["make", "-C", "/build", "install"]])
+
+    assert commands[0][:3] == ["cmake", "-G", "Ninja"]
+    assert "-DCMAKE_JOB_POOLS=compile=8;link=2" in commands[0]
+    assert "-DCMAKE_CXX_COMPILER_LAUNCHER=ccache" in commands[0]
+    assert commands[1] == ["cmake", "--build", "/build", "--target", "install",
+                           "--parallel", "8"]
+
+    # A folder configured for make keeps using make
+    with open(str(tmp_path / "CMakeCache.txt"), "w") as cmake_cache:
+
+        cmake_cache.write("CMAKE_GENERATOR:INTERNAL=Unix Makefiles\n")
+
+    profile = get_build_profile(build_path=str(tmp_path), cpu_count=8,
+                                memory=16 * GB, which=which_all)
+
+    assert profile.generator == "Unix Makefiles"
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the per-phase timings of the wheel build
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from blenderpy import build_report
+
+def test_nested_phases():
+
+    report = build_report.BuildReport()
+
+    with report.phase("build"):
+
+        assert report.current_phase() == "build"
+
+        with report.phase("build_ext", extension="bpy") as inner:
+
+            assert report.current_phase() == "build_ext"
+
+            time.sleep(0.01)
+
+        assert report.current_phase() == "build"
+
+    assert report.current_phase() is None
+
+    # In the order they finished, each naming the phase it ran in
+    inner_result, outer_result = report.phases
+
+    assert inner_result["name"] == "build_ext" and inner_result["parent"] == "build"
+    assert outer_result["name"] == "build" and outer_result["parent"] is None
+    assert inner_result["extension"] == "bpy"
+    assert inner.parent == "build"
+
+    assert 0.01 <= inner_result["wall_time"] <= outer_result["wall_time"]
+    assert inner_result["started"] >= outer_result["started"]
+    assert outer_result["cpu_time"] >= 0
+
+def test_phase_that_raises():
+
+    report = build_report.BuildReport()
+
+    with pytest.raises(ValueError):
+
+        with report.phase("install_lib"):
+
+            with report.phase("strip_libs"):
+
+                raise ValueError("objcopy failed")
+
+    # Both still recorded, and neither left running
+    assert [phase["name"] for phase in report.phases] == ["strip_libs", "install_lib"]
+    assert report.current_phase() is None
+
+def test_started_and_stopped_phase():
+
+    report = build_report.BuildReport()
+
+    phase = report.phase("archive").start()
+
+    assert report.current_phase() == "archive"
+
+    phase.stop()
+
+    assert report.current_phase() is None
+    assert report.phases[0]["name"] == "archive"
+
+def test_written_next_to_the_wheel(tmp_path):
+
+    report = build_report.BuildReport()
+
+    report.metadata["version"] = "2.91a0"
+
+    with report.phase("bdist_wheel"):
+
+        pass
+
+    dist_dir = str(tmp_path / "dist")
+
+    path = build_report.get_build_report_path(dist_dir, "bpy-2.91a0-cp37-cp37m-linux_x86_64")
+
+    report.write(path)
+
+    assert os.listdir(dist_dir) == ["bpy-2.91a0-cp37-cp37m-linux_x86_64" +
+                                    build_report.BUILD_REPORT_SUFFIX]
+
+    with open(path, "r") as report_file:
+
+        written = json.load(report_file)
+
+    assert written["metadata"] == {"version": "2.91a0"}
+    assert [phase["name"] for phase in written["phases"]] == ["bdist_wheel"]
+    assert set(written["phases"][0]) >= {"wall_time", "cpu_time", "child_peak_rss",
+                                         "bytes_written", "started", "parent"}
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the bulk scene builder, with a fake backend in place of `bpy`
+"""
+
+import numpy
+import pytest
+
+from blenderpy import bulk
+
+class FakeBackend():
+    """Records what the builder asks Blender to do
+    """
+
+    def __init__(self):
+
+        self.calls = []
+        self.meshes = {}
+        self.links = []
+
+    def new_mesh(self, name):
+
+        self.calls.append("new_mesh")
+
+        self.meshes[name] = {}
+
+        return name
+
+    def set_geometry(self, mesh, vertices, loop_starts, loop_totals, loop_vertices,
+                     material_indices):
+
+        self.calls.append("set_geometry")
+
+        self.meshes[mesh] = {"vertices": vertices, "loop_starts": loop_starts,
+                             "loop_totals": loop_totals,
+                             "loop_vertices": loop_vertices,
+                             "material_indices": material_indices}
+
+    def add_material(self, mesh, material):
+
+        self.meshes[mesh].setdefault("materials", []).append(material)
+
+    def new_object(self, name, mesh):
+
+        return {"name": name, "mesh": mesh}
+
+    def set_matrices(self, collection, objects, matrices):
+
+        self.calls.append("set_matrices")
+
+        assert self.links[-1] == (collection, [_object["name"] for _object in objects])
+
+        for _object, matrix in zip(objects, matrices):
+
+            _object["matrix"] = matrix
+
+    def new_collection(self, name, parent):
+
+        return name
+
+    def get_scene_collection(self):
+
+        return "Scene Collection"
+
+    def link(self, collection, objects):
+
+        self.calls.append("link")
+
+        self.links.append((collection, [_object["name"] for _object in objects]))
+
+    def update(self):
+
+        self.calls.append("update")
+
+def test_get_loops():
+
+    loop_starts, loop_totals, loop_vertices = bulk.get_loops(([3, 4, 3],
+                                                              range(10)))
+
+    assert loop_starts.tolist() == [0, 3, 7]
+    assert loop_totals.tolist() == [3, 4, 3]
+    assert loop_vertices.dtype == numpy.int32
+
+    loop_starts, loop_totals, _ = bulk.get_loops(numpy.arange(8).reshape(2, 4))
+
+    assert loop_starts.tolist() == [0, 4] and loop_totals.tolist() == [4, 4]
+
+    with pytest.raises(ValueError):
+
+        bulk.get_loops(([3, 3], range(5)))
+
+def test_builder():
+
+    backend = FakeBackend()
+
+    quad = numpy.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+
+    with bulk.SceneBuilder(backend, link_batch_size=4) as builder:
+
+        mesh = builder.add_mesh("Quad", quad, [[0, 1, 2, 3]], material_indices=[1],
+                                materials=["Red", "Blue"])
+
+        transforms = numpy.tile(numpy.eye(4), (5, 1, 1))
+        transforms[:, 0, 3] = numpy.arange(5)
+
+        instances = builder.add_objects(mesh, transforms, name="Instance")
+
+        collection = builder.new_collection("Batch")
+
+        batch = builder.add_batch(numpy.stack([quad, quad + 1, quad + 2]),
+                                  [[0, 1, 2], [0, 2, 3]], collection=collection)
+
+        # Nothing is updated before the end
+        assert "update" not in backend.calls
+
+        with pytest.raises(ValueError):
+
+            builder.add_mesh("Broken", quad, [[0, 1, 4]])
+
+    assert backend.calls.count("update") == 1
+    assert backend.calls[-1] == "update"
+
+    assert backend.meshes["Quad"]["material_indices"].tolist() == [1]
+    assert backend.meshes["Quad"]["materials"] == ["Red", "Blue"]
+    assert backend.meshes["Object.000002"]["vertices"][0].tolist() == [1, 1, 1]
+
+    assert [_object["mesh"] for _object in instances] == ["Quad"] * 5
+    assert instances[3]["matrix"][0, 3] == 3
+    assert [_object["mesh"] for _object in batch] == ["Object.000001",
+                                                      "Object.000002",
+                                                      "Object.000003"]
+
+    # Linked in batches, per collection
+    assert [(collection, len(names)) for collection, names in backend.links] == \
+           [("Scene Collection", 5), ("Batch", 3)]
+
+    assert builder.stats["objects"] == 8
+    assert builder.stats["meshes"] == 4
+    assert builder.stats["updates"] == 1
+
+class FakeObjects(list):
+    """A collection's objects, as matrices, with `foreach_get` and `foreach_set`
+    """
+
+    def foreach_get(self, attribute, buffer):
+
+        buffer[...] = numpy.concatenate([matrix.T.reshape(-1) for matrix in self])
+
+    def foreach_set(self, attribute, buffer):
+
+        self.sets = getattr(self, "sets", 0) + 1
+
+        self[:] = [matrix.reshape(4, 4).T for matrix in
+                   numpy.asarray(buffer).reshape(len(self), 16)]
+
+def test_bpy_backend_matrices():
+
+    class Collection():
+
+        objects = FakeObjects([numpy.full((4, 4), 7.0), numpy.eye(4), numpy.eye(4)])
+
+    transforms = numpy.tile(numpy.eye(4), (2, 1, 1))
+    transforms[:, 0, 3] = [1, 2]
+
+    bulk.BpyBackend(None).set_matrices(Collection, ["a", "b"], transforms)
+
+    # The objects linked before are written back as they were, in one call
+    assert Collection.objects.sets == 1
+    assert (Collection.objects[0] == 7).all()
+    assert [matrix[0, 3] for matrix in Collection.objects[1:]] == [1, 2]
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the cached compatible Blender versions, with stand-ins for the
+`bpybuild` repositories and their online listings
+"""
+
+import json
+import os
+
+import pkg_resources
+import pytest
+
+from blenderpy.compatibility import CompatibilityCache, CompatibilityCacheError,\
+                                    get_compatible_sources
+
+class FakeGit():
+
+    BASE_URL = "git://git.blender.org/blender.git"
+
+    def __init__(self, tag):
+
+        self.tag = tag
+
+class FakeSvn():
+
+    def __init__(self, url):
+
+        self.url = url
+
+class FakeListing():
+    """Stands in for `bpybuild.sources.get_compatible_sources`
+    """
+
+    def __init__(self):
+
+        self.calls = 0
+
+    def __call__(self):
+
+        self.calls += 1
+
+        return {pkg_resources.parse_version("2.93.0"): 
+                ([FakeGit("v2.93.0")], 
+                 [FakeSvn("https://svn.blender.org/svnroot/bf-blender/tags/blender-2.93-release/")])}
+
+def resolve(cache, listing):
+
+    return get_compatible_sources(cache, listing, FakeGit, FakeSvn)
+
+def test_listing_is_only_queried_once(tmp_path):
+
+    listing = FakeListing()
+    cache = CompatibilityCache(str(tmp_path))
+
+    first = resolve(cache, listing)
+    second = resolve(CompatibilityCache(str(tmp_path)), listing)
+
+    assert listing.calls == 1
+
+    version = pkg_resources.parse_version("2.93.0")
+
+    assert list(second) == list(first) == [version]
+    assert second[version][0][0].tag == "v2.93.0"
+    assert second[version][0][0].BASE_URL == FakeGit.BASE_URL
+    assert second[version][1][0].url.endswith("blender-2.93-release/")
+
+def test_expired_cache_is_refreshed_unless_offline(tmp_path):
+
+    listing = FakeListing()
+
+    resolve(CompatibilityCache(str(tmp_path)), listing)
+
+    cache_path = CompatibilityCache(str(tmp_path)).path
+
+    with open(cache_path, "r") as cache_file:
+
+        cached = json.load(cache_file)
+
+    cached["created"] -= 48 * 3600
+
+    with open(cache_path, "w") as cache_file:
+
+        json.dump(cached, cache_file)
+
+    resolve(CompatibilityCache(str(tmp_path), offline=True), listing)
+
+    assert listing.calls == 1
+
+    resolve(CompatibilityCache(str(tmp_path), ttl=24), listing)
+
+    assert listing.calls == 2
+
+def test_offline_without_cache_fails(tmp_path):
+
+    with pytest.raises(CompatibilityCacheError):
+
+        resolve(CompatibilityCache(str(tmp_path), offline=True), FakeListing())
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the worker daemon, with a stand-in module in place of `bpy`
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from blenderpy import daemon, pool
+
+JOBS_MODULE = """
+from blenderpy import pool
+
+def add(a, b):
+
+    return a + b
+
+def count(n):
+
+    for index in range(n):
+
+        pool.report_progress(index)
+
+    return n
+
+def fail():
+
+    raise ValueError("job failed")
+
+def unsendable():
+
+    return {1, 2}
+"""
+
+def start_daemon(tmp_path, module: str):
+
+    warm_pool = pool.WarmPool(workers=2, module=module)
+
+    server = daemon.Daemon(warm_pool, str(tmp_path / "daemon.sock"),
+                           allowed=["daemon_jobs"])
+
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(),))
+    thread.start()
+
+    while not (tmp_path / "daemon.sock").exists():
+
+        time.sleep(0.01)
+
+    return server, thread
+
+@pytest.fixture
+def running_daemon(tmp_path, monkeypatch):
+
+    (tmp_path / "bpy_standin.py").write_text("")
+    (tmp_path / "daemon_jobs.py").write_text(JOBS_MODULE)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    server, thread = start_daemon(tmp_path, "bpy_standin")
+
+    yield server, thread
+
+    if not server.draining:
+
+        with daemon.DaemonClient(server.socket_path) as client:
+
+            client.drain()
+
+    thread.join()
+
+def test_run_jobs(running_daemon):
+
+    server, _ = running_daemon
+
+    with daemon.DaemonClient(server.socket_path) as client:
+
+        assert client.run("daemon_jobs:add", 1, b=2) == 3
+
+        progress = []
+
+        assert client.run("daemon_jobs:count", 3, progress=progress.append) == 3
+        assert progress == [0, 1, 2]
+
+        with pytest.raises(daemon.DaemonError, match="job failed"):
+
+            client.run("daemon_jobs:fail")
+
+        with pytest.raises(daemon.DaemonError, match="Can't send"):
+
+            client.run("daemon_jobs:unsendable")
+
+        with pytest.raises(daemon.DaemonError, match="isn't allowed"):
+
+            client.run("os:getcwd")
+
+        # Not an object: answered rather than dropped
+        client._file.write(b"[1, 2]\n")
+        client._file.flush()
+
+        assert json.loads(client._file.readline())["event"] == "error"
+
+        health = client.health()
+
+    assert health["status"] == "ok"
+    assert health["workers"] == 2
+    assert health["stats"]["tasks"] == 4
+
+def test_drain(running_daemon):
+
+    server, thread = running_daemon
+
+    with daemon.DaemonClient(server.socket_path) as client:
+
+        client.drain()
+
+    thread.join()
+
+    assert server.pool._shutdown
+
+    with pytest.raises((ConnectionError, FileNotFoundError)):
+
+        daemon.DaemonClient(server.socket_path)
+
+def test_broken_pool(tmp_path):
+
+    server, thread = start_daemon(tmp_path, "not_a_module_anywhere")
+
+    server.pool.wait_ready(timeout=60)
+
+    with daemon.DaemonClient(server.socket_path, timeout=60) as client:
+
+        with pytest.raises(daemon.DaemonError, match="PoolBrokenError"):
+
+            client.run("daemon_jobs:add", 1, 2)
+
+        client.drain()
+
+    thread.join()
+
+def test_private_socket_dir(tmp_path, monkeypatch):
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmp_path))
+
+    socket_path = daemon.get_socket_path()
+
+    daemon._check_socket_dir(socket_path, create=True)
+
+    assert os.stat(os.path.dirname(socket_path)).st_mode & 0o777 == 0o700
+
+    # Made by someone else, or open to them
+    os.chmod(os.path.dirname(socket_path), 0o755)
+
+    with pytest.raises(daemon.DaemonError, match="private"):
+
+        daemon._check_socket_dir(socket_path, create=True)
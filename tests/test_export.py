@@ -0,0 +1,115 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the streaming geometry export, with fake meshes in place of
+`bpy`'s
+"""
+
+import os
+
+import numpy
+import pytest
+
+from blenderpy import export
+
+class FakeCollection():
+
+    def __init__(self, values):
+
+        self.values = numpy.asarray(values)
+
+    def __len__(self):
+
+        return len(self.values)
+
+    def foreach_get(self, attribute, buffer):
+
+        buffer[:] = self.values.reshape(-1)
+
+class FakeMesh():
+
+    def __init__(self, count, start):
+
+        self.vertices = FakeCollection(numpy.arange(start, start + count * 3)
+                                       .reshape(count, 3))
+
+class FakeObject():
+
+    type = "MESH"
+
+    def __init__(self, name, count, start=0):
+
+        self.name = name
+        self.data = FakeMesh(count, start)
+
+ATTRIBUTES = [export.ExportAttribute("co", lambda _object, mesh: mesh.vertices, "co"),
+              export.ExportAttribute("index", lambda _object, mesh: mesh.vertices,
+                                     "index", (3,), numpy.int32)]
+
+class Interrupted(Exception):
+
+    pass
+
+def interrupted(meshes, after):
+
+    for index, mesh in enumerate(meshes):
+
+        if index == after:
+
+            raise Interrupted()
+
+        yield mesh
+
+def test_export_and_resume(tmp_path):
+
+    objects = [FakeObject(f"Object{index}", count, index * 100) for
+               index, count in enumerate([4, 0, 7, 1])]
+
+    with export.GeometryExporter(str(tmp_path), ATTRIBUTES) as exporter:
+
+        with pytest.raises(Interrupted):
+
+            exporter.export(interrupted(export.iter_meshes(objects), 2))
+
+    # Half written data of an object that never made it into the index
+    with open(str(tmp_path / "co.npy"), "ab") as npy:
+
+        npy.write(b"\0" * 40)
+
+    with export.GeometryExporter(str(tmp_path), ATTRIBUTES) as exporter:
+
+        assert exporter.export(export.iter_meshes(objects)) == 2
+
+    # A last index line cut short: its object is exported again, once
+    index_path = str(tmp_path / export.INDEX_NAME)
+
+    os.truncate(index_path, os.path.getsize(index_path) - 20)
+
+    for exported in (1, 0):
+
+        with export.GeometryExporter(str(tmp_path), ATTRIBUTES) as exporter:
+
+            assert exporter.export(export.iter_meshes(objects)) == exported
+
+    reader = export.GeometryReader(str(tmp_path))
+
+    assert reader.names == ["Object0", "Object1", "Object2", "Object3"]
+
+    for _object in objects:
+
+        assert reader.read(_object.name, "co").tolist() == \
+               _object.data.vertices.values.tolist()
+
+    assert reader.read("Object2", "index").dtype == numpy.int32
+
+    # Plain `.npy` files of everything
+    assert numpy.load(str(tmp_path / "co.npy")).shape == (12, 3)
+
+def test_other_attributes(tmp_path):
+
+    with export.GeometryExporter(str(tmp_path), ATTRIBUTES) as exporter:
+
+        exporter.export(export.iter_meshes([FakeObject("Object", 3)]))
+
+    with pytest.raises(ValueError):
+
+        export.GeometryExporter(str(tmp_path), ATTRIBUTES[:1])
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for copying and moving Blender file trees
+"""
+
+import os
+
+import pytest
+
+from blenderpy import fileops
+
+def make_tree(root):
+
+    files = {"a.py": "a", os.path.join("addons", "b.py"): "b",
+             os.path.join("datafiles", "fonts", "c.ttf"): "c" * 4096}
+
+    for path, content in files.items():
+
+        os.makedirs(os.path.dirname(os.path.join(str(root), path)), exist_ok=True)
+
+        with open(os.path.join(str(root), path), "w") as _file:
+
+            _file.write(content)
+
+    os.makedirs(os.path.join(str(root), "empty"))
+
+    return files
+
+def read_tree(root):
+
+    dirs, files = fileops.list_tree(str(root))
+
+    return sorted(dirs), {path: open(os.path.join(str(root), path)).read() for
+                          path in files}
+
+def test_copy_tree_matches_source(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    stats = fileops.copy_tree(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+    assert read_tree(tmp_path / "src") == read_tree(tmp_path / "dst")
+    assert stats.files == 3
+    assert stats.bytes == 4098
+
+def test_copy_tree_hardlinks_on_same_filesystem(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    stats = fileops.copy_tree(str(tmp_path / "src"), str(tmp_path / "dst"),
+                              hardlink=True)
+
+    assert stats.methods == {fileops.COPY_METHOD_LINK: 3}
+    assert os.path.samefile(str(tmp_path / "src" / "a.py"), 
+                            str(tmp_path / "dst" / "a.py"))
+
+def test_single_worker_falls_back_to_copytree(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    stats = fileops.copy_tree(str(tmp_path / "src"), str(tmp_path / "dst"),
+                              workers=1)
+
+    assert read_tree(tmp_path / "src") == read_tree(tmp_path / "dst")
+    assert stats.methods == {fileops.COPY_METHOD_COPY: 3}
+
+def test_move_files(tmp_path):
+
+    make_tree(tmp_path / "src")
+    os.makedirs(str(tmp_path / "dst"))
+
+    stats = fileops.move_files([(str(tmp_path / "src" / "a.py"),
+                                 str(tmp_path / "dst" / "a.py"))])
+
+    assert stats.methods == {fileops.COPY_METHOD_MOVE: 1}
+    assert not os.path.exists(str(tmp_path / "src" / "a.py"))
+    assert open(str(tmp_path / "dst" / "a.py")).read() == "a"
+
+def test_sync_tree_only_copies_changes(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    manifest = str(tmp_path / "manifest.json")
+
+    stats = fileops.sync_tree(str(tmp_path / "src"), str(tmp_path / "dst"), manifest)
+
+    assert stats.files == 3
+
+    with open(str(tmp_path / "src" / "a.py"), "w") as _file:
+
+        _file.write("changed")
+
+    os.remove(str(tmp_path / "src" / "addons" / "b.py"))
+
+    with open(str(tmp_path / "src" / "new.py"), "w") as _file:
+
+        _file.write("new")
+
+    stats = fileops.sync_tree(str(tmp_path / "src"), str(tmp_path / "dst"), manifest)
+
+    assert stats.files == 2
+    assert stats.unchanged == 1
+    assert stats.methods[fileops.COPY_METHOD_REMOVE] == 1
+    assert read_tree(tmp_path / "src")[1] == read_tree(tmp_path / "dst")[1]
+
+def test_sync_with_hash_skips_touched_files(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    manifest = str(tmp_path / "manifest.json")
+
+    fileops.sync_tree(str(tmp_path / "src"), str(tmp_path / "dst"), manifest,
+                      use_hash=True)
+
+    os.utime(str(tmp_path / "src" / "a.py"), (0, 0))
+
+    stats = fileops.sync_tree(str(tmp_path / "src"), str(tmp_path / "dst"), 
+                              manifest, use_hash=True)
+
+    assert stats.files == 0
+    assert stats.unchanged == 3
+
+def test_sync_files_leaves_unmanaged_files(tmp_path):
+
+    make_tree(tmp_path / "src")
+    os.makedirs(str(tmp_path / "dst"))
+
+    with open(str(tmp_path / "dst" / "bpy.so"), "w") as _file:
+
+        _file.write("bpy")
+
+    manifest = str(tmp_path / "manifest.json")
+
+    fileops.sync_files({"a.py": str(tmp_path / "src" / "a.py")},
+                       str(tmp_path / "dst"), manifest)
+
+    fileops.sync_files({}, str(tmp_path / "dst"), manifest)
+
+    assert os.listdir(str(tmp_path / "dst")) == ["bpy.so"]
+
+def test_relocate_tree_renames_on_same_filesystem(tmp_path):
+
+    make_tree(tmp_path / "src")
+
+    expected = read_tree(tmp_path / "src")
+
+    stats = fileops.relocate_tree(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+    assert stats.methods == {fileops.COPY_METHOD_MOVE: 1}
+    assert not os.path.exists(str(tmp_path / "src"))
+    assert read_tree(tmp_path / "dst") == expected
+
+def test_relocate_tree_resumes_across_devices(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(fileops, "same_filesystem", lambda src, dst: False)
+
+    make_tree(tmp_path / "src")
+
+    expected = read_tree(tmp_path / "src")
+
+    # An earlier relocation stopped after copying one file
+    os.makedirs(str(tmp_path / ".dst.staging"))
+
+    with open(str(tmp_path / ".dst.staging" / "a.py"), "w") as _file:
+
+        _file.write("a")
+
+    with open(str(tmp_path / ".dst.staging.journal"), "w") as journal:
+
+        journal.write("a.py\n" + os.path.join("addons", "b.py"))
+
+    os.makedirs(str(tmp_path / "dst" / "old"))
+
+    stats = fileops.relocate_tree(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+    assert stats.unchanged == 1
+    assert stats.files == 2
+    assert read_tree(tmp_path / "dst") == expected
+    assert sorted(os.listdir(str(tmp_path))) == ["dst"]
+
+def test_relocate_tree_interrupted_removal(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(fileops, "same_filesystem", lambda src, dst: False)
+
+    make_tree(tmp_path / "src")
+
+    expected = read_tree(tmp_path / "src")
+
+    rmtree = fileops.shutil.rmtree
+
+    def interrupted_rmtree(path, *args, **kwargs):
+
+        if path.endswith(".removing"):
+
+            raise KeyboardInterrupt
+
+        rmtree(path, *args, **kwargs)
+
+    monkeypatch.setattr(fileops.shutil, "rmtree", interrupted_rmtree)
+
+    with pytest.raises(KeyboardInterrupt):
+
+        fileops.relocate_tree(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+    # No partial `src` to be found and relocated over `dst` next time
+    assert not os.path.exists(str(tmp_path / "src"))
+    assert read_tree(tmp_path / "dst") == expected
+
+def test_remove_tree_with_and_without_file_list(tmp_path):
+
+    files = make_tree(tmp_path / "listed")
+
+    # Created after the list was made, as __pycache__ would be
+    os.makedirs(str(tmp_path / "listed" / "__pycache__"))
+
+    stats = fileops.remove_tree(str(tmp_path / "listed"), list(files))
+
+    assert stats.files == 3
+
+    make_tree(tmp_path / "walked")
+
+    stats = fileops.remove_tree(str(tmp_path / "walked"))
+
+    assert stats.files == 3
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the `bpy` import front end, with a stand-in `bpy` that adds
+Blender's scripts folders to `sys.path` the way the real one does
+"""
+
+import os
+import sys
+
+import pytest
+
+from blenderpy import importer
+
+STANDIN_BPY = """
+import os
+import sys
+
+SCRIPTS = os.environ["BPY_STANDIN_SCRIPTS"]
+
+sys.path.extend([os.path.join(SCRIPTS, "modules"),
+                 os.path.join(SCRIPTS, "startup"),
+                 os.path.join(SCRIPTS, "modules"),
+                 os.path.join(SCRIPTS, "addons", "modules")])
+"""
+
+STANDIN_BMESH = """
+import bpy
+
+def new():
+
+    return "bmesh"
+"""
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+
+    (tmp_path / "bpy.py").write_text(STANDIN_BPY)
+    (tmp_path / "bmesh.py").write_text(STANDIN_BMESH)
+
+    for folder in ("datafiles", "scripts/modules", "scripts/startup",
+                   "scripts/addons/modules"):
+
+        (tmp_path / "2.93" / folder).mkdir(parents=True)
+
+    scripts = str(tmp_path / "2.93" / "scripts")
+
+    # As a parent that looked the scripts directory up would have left them
+    monkeypatch.setenv(importer.SCRIPTS_DIR_ENV, str(tmp_path / "2.93"))
+    monkeypatch.setenv(importer.SCRIPTS_DIR_SECONDS_ENV, "1.5")
+    monkeypatch.delenv(importer.EAGER_SECONDS_ENV, raising=False)
+    monkeypatch.setenv("BPY_STANDIN_SCRIPTS", scripts)
+    monkeypatch.setattr(sys, "path", [str(tmp_path), os.path.join(scripts, "modules")] +
+                        sys.path)
+    monkeypatch.setattr(importer, "REPORT", importer.ImportReport())
+    monkeypatch.setattr(importer, "_lazy_modules", {})
+
+    for name in ("bpy", "bmesh"):
+
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    yield scripts
+
+    for name in ("bpy", "bmesh"):
+
+        sys.modules.pop(name, None)
+
+def test_is_addon_path():
+
+    scripts = os.path.join("site-packages", "2.93", "scripts")
+
+    assert importer.is_addon_path(os.path.join(scripts, "addons"))
+    assert importer.is_addon_path(os.path.join(scripts, "addons_contrib"))
+    assert importer.is_addon_path(os.path.join(scripts, "addons", "modules"))
+    assert not importer.is_addon_path(os.path.join(scripts, "modules"))
+    assert not importer.is_addon_path(os.path.join("site-packages", "addons"))
+
+def test_import_bpy(standin):
+
+    bpy = importer.import_bpy(defer_addons=True)
+
+    assert bpy.__file__.endswith("bpy.py")
+    assert importer.import_bpy() is bpy
+
+    # Added back once, without the add-on folders
+    scripts_paths = [entry for entry in sys.path if importer.is_blender_scripts_path(entry)]
+
+    assert scripts_paths == [os.path.join(standin, "modules"),
+                             os.path.join(standin, "startup")]
+    assert importer.REPORT.deferred_paths == [os.path.join(standin, "addons", "modules"),
+                                              os.path.join(standin, "addons")]
+
+    importer.restore_addon_paths()
+
+    assert os.path.join(standin, "addons", "modules") in sys.path
+
+    # Reused from the environment rather than looked up again
+    assert importer.REPORT.scripts_dir == os.path.dirname(standin)
+    assert importer.REPORT.scripts_dir_saved == 1.5
+    assert importer.REPORT.scripts_dir_seconds == 0.0
+
+def test_import_bpy_keeps_addons_by_default(standin):
+
+    importer.import_bpy()
+
+    assert os.path.join(standin, "addons", "modules") in sys.path
+    assert importer.REPORT.deferred_paths == []
+
+def test_build_sys_path(tmp_path):
+
+    scripts_dir = tmp_path / "2.93"
+
+    for folder in ("scripts/modules", "scripts/startup"):
+
+        (scripts_dir / folder).mkdir(parents=True)
+
+    stale = str(tmp_path / "old" / "2.92" / "scripts" / "modules")
+    modules = str(scripts_dir / "scripts" / "modules")
+
+    path = importer.build_sys_path(["site-packages", stale, modules, modules],
+                                   str(scripts_dir))
+
+    # Only the resolved directory's folders, each once, missing ones added
+    assert path == ["site-packages", modules, str(scripts_dir / "scripts" / "startup")]
+
+def test_saved_seconds(standin, monkeypatch):
+
+    monkeypatch.setenv(importer.EAGER_SECONDS_ENV, '{"bmesh": 0.25, "mathutils": 0.5}')
+
+    assert importer.measure_eager_imports() == {"bmesh": 0.25, "mathutils": 0.5}
+
+    importer.import_bpy()
+
+    assert importer.REPORT.saved_seconds == 1.5 + 0.25 + 0.5
+
+    importer.lazy_import("bmesh").new()
+
+    # No longer saved once used
+    assert importer.REPORT.saved_seconds == 1.5 + 0.5
+
+def test_lazy_modules(standin):
+
+    bmesh = importer.lazy_import("bmesh")
+
+    assert "bpy" not in sys.modules
+    assert importer.REPORT.deferred_modules == list(importer.LAZY_MODULES)
+
+    assert bmesh.new() == "bmesh"
+    assert "bpy" in sys.modules
+    assert "bmesh" in importer.REPORT.lazy_seconds
+    assert "bmesh" not in importer.REPORT.deferred_modules
+
+    from blenderpy.importer import bmesh as imported
+
+    assert imported is bmesh
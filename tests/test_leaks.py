@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the data-block leak tracker, with a fake `bpy.data`
+"""
+
+import types
+
+import pytest
+
+from blenderpy import leaks
+
+class FakeID():
+
+    def __init__(self, name, uses=()):
+
+        self.name = name
+        self.uses = list(uses)
+        self.users = 0
+        self.use_fake_user = False
+
+        for used in self.uses:
+
+            used.users += 1
+
+    def as_pointer(self):
+
+        return id(self)
+
+class FakeData():
+
+    def __init__(self):
+
+        self.meshes = []
+        self.materials = []
+        self.objects = []
+
+    def batch_remove(self, ids):
+
+        for block in ids:
+
+            for used in block.uses:
+
+                used.users -= 1
+
+            for blocks in (self.meshes, self.materials, self.objects):
+
+                if block in blocks:
+
+                    blocks.remove(block)
+
+def test_reports_and_purges_leaks():
+
+    bpy = types.SimpleNamespace(data=FakeData())
+
+    bpy.data.meshes.append(FakeID("Existing"))
+
+    tracker = leaks.LeakTracker(bpy, purge=True)
+
+    with tracker.track("job") as report:
+
+        material = FakeID("Material")
+        mesh = FakeID("Mesh", [material])
+        kept = FakeID("Kept")
+        kept.use_fake_user = True
+
+        bpy.data.materials.append(material)
+        bpy.data.meshes.extend([mesh, kept])
+
+    # The mesh was an orphan, then the material it used was
+    assert report.purged == 2
+    assert report.leaked == {"meshes": ["Kept"]}
+    assert [block.name for block in bpy.data.meshes] == ["Existing", "Kept"]
+
+    metrics = tracker.sink.to_dict()
+
+    assert metrics["counters"]["leaked.meshes"] == 1
+    assert metrics["counters"]["purged"] == 2
+    assert metrics["histograms"]["leaked_blocks"]["count"] == 1
+
+def test_reused_pointer_is_new():
+
+    bpy = types.SimpleNamespace(data=FakeData())
+
+    removed = FakeID("Removed")
+    removed.use_fake_user = True
+
+    bpy.data.meshes.append(removed)
+
+    tracker = leaks.LeakTracker(bpy)
+
+    with tracker.track("job") as report:
+
+        bpy.data.meshes.remove(removed)
+
+        # Allocated where the removed mesh was
+        reused = FakeID("Reused")
+        reused.use_fake_user = True
+        reused.as_pointer = removed.as_pointer
+
+        bpy.data.meshes.append(reused)
+
+    assert report.leaked == {"meshes": ["Reused"]}
+
+def test_instrument_and_recycle(monkeypatch):
+
+    bpy = types.SimpleNamespace(data=FakeData())
+
+    requests = []
+
+    monkeypatch.setattr(leaks.pool, "request_recycle", lambda: requests.append(True))
+
+    tracker = leaks.LeakTracker(bpy, max_leaked=1)
+
+    @tracker.instrument
+    def job(name):
+
+        bpy.data.objects.append(FakeID(name))
+
+        if name == "fail":
+
+            raise ValueError(name)
+
+    job("first")
+
+    assert not tracker.should_recycle
+
+    with pytest.raises(ValueError):
+
+        job("fail")
+
+    assert tracker.last_report.leaked == {"objects": ["fail"]}
+    assert tracker.should_recycle
+    assert requests == [True]
+
+def test_histogram():
+
+    histogram = leaks.Histogram([1, 10])
+
+    for value in [0, 1, 5, 50]:
+
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert (histogram.count, histogram.sum, histogram.min, histogram.max) == (4, 56, 0, 50)
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for deduplicating and stripping the shipped libraries
+"""
+
+import os
+import shutil
+import subprocess
+import zipfile
+
+import pytest
+
+from blenderpy import libs
+
+@pytest.fixture
+def bin_dir(tmp_path):
+
+    root = tmp_path / "bin"
+    root.mkdir()
+
+    (root / "libfoo.so.1.2").write_bytes(b"foo" * 100)
+    os.symlink("libfoo.so.1.2", str(root / "libfoo.so.1"))
+    shutil.copy(str(root / "libfoo.so.1.2"), str(root / "libfoo.so"))
+    (root / "libbar.so").write_bytes(b"bar" * 100)
+    (root / "bpy.so").write_bytes(b"foo" * 100)
+    (root / "python37.dll").write_bytes(b"foo" * 100)
+    (root / "readme.txt").write_bytes(b"foo" * 100)
+
+    return root
+
+def test_find_duplicates(bin_dir):
+
+    found = libs.list_libraries(str(bin_dir))
+
+    assert sorted(found) == ["libbar.so", "libfoo.so", "libfoo.so.1", "libfoo.so.1.2"]
+
+    stats = libs.LibraryStats()
+
+    # The name the link points to is kept
+    assert libs.find_duplicates(found, stats) == {"libfoo.so": "libfoo.so.1.2",
+                                                  "libfoo.so.1": "libfoo.so.1.2"}
+    assert (stats.libraries, stats.duplicates, stats.dedupe_saved) == (2, 2, 600)
+
+def test_link_libraries(tmp_path):
+
+    (tmp_path / "libfoo.so.1.2").write_bytes(b"foo")
+
+    libs.write_libs_manifest(str(tmp_path), {"libfoo.so": "libfoo.so.1.2"})
+
+    assert libs.link_libraries(str(tmp_path)) == [str(tmp_path / "libfoo.so")]
+    assert (tmp_path / "libfoo.so").read_bytes() == b"foo"
+
+    # Nothing to do the second time
+    assert libs.link_libraries(str(tmp_path)) == []
+
+    assert libs.unlink_libraries(str(tmp_path)) == [str(tmp_path / "libfoo.so")]
+    assert (tmp_path / "libfoo.so.1.2").exists()
+
+@pytest.mark.skipif(shutil.which("cc") is None or shutil.which("objcopy") is None,
+                    reason="needs a C compiler and objcopy")
+def test_strip_libraries(tmp_path):
+
+    (tmp_path / "foo.c").write_text("int foo(int a) { return a * 2; }\n")
+
+    src = tmp_path / "libfoo.so"
+
+    subprocess.run(["cc", "-g", "-shared", "-fPIC", "-o", str(src),
+                    str(tmp_path / "foo.c")], check=True)
+
+    build_dir = tmp_path / "build"
+    build_dir.mkdir()
+
+    # As synced into the build dir
+    os.link(str(src), str(build_dir / "libfoo.so"))
+
+    original = src.read_bytes()
+
+    stats = libs.strip_libraries({"libfoo.so": str(src)}, str(build_dir),
+                                 str(tmp_path / "symbols.zip"))
+
+    assert src.read_bytes() == original
+    assert (build_dir / "libfoo.so").stat().st_size < len(original)
+    assert stats.stripped == 1 and stats.strip_saved > 0
+
+    with zipfile.ZipFile(str(tmp_path / "symbols.zip")) as archive:
+
+        assert archive.namelist() == ["libfoo.so.debug"]
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the content-hash result cache
+"""
+
+import os
+
+from blenderpy import memo, pool
+
+CALLS = []
+
+def thumbnail(path, output, size=64):
+
+    CALLS.append(path)
+
+    with open(path, "rb") as blend, open(output, "wb") as image:
+
+        image.write(blend.read()[::-1] * size)
+
+    return {"size": size}
+
+def other_thumbnail(path, output, size=64):
+
+    return thumbnail(path, output, size)
+
+def test_run_caches_by_contents(tmp_path):
+
+    cache = memo.ResultCache(str(tmp_path / "cache"), bpy_build_id="test")
+
+    blend = tmp_path / "scene.blend"
+    blend.write_bytes(b"scene")
+
+    output = str(tmp_path / "thumb.png")
+
+    CALLS.clear()
+
+    assert cache.run(thumbnail, str(blend), output, inputs=[str(blend)],
+                     outputs=[output]) == {"size": 64}
+
+    os.remove(output)
+
+    # The output file comes back from the cache without calling again
+    assert cache.run(thumbnail, str(blend), output, inputs=[str(blend)],
+                     outputs=[output]) == {"size": 64}
+    assert open(output, "rb").read() == b"enecs" * 64
+    assert len(CALLS) == 1
+
+    # Other parameters, script or contents are other entries
+    cache.run(thumbnail, str(blend), output, size=32, inputs=[str(blend)],
+              outputs=[output])
+    cache.run(other_thumbnail, str(blend), output, inputs=[str(blend)],
+              outputs=[output])
+
+    blend.write_bytes(b"changed scene")
+
+    cache.run(thumbnail, str(blend), output, inputs=[str(blend)], outputs=[output])
+
+    assert len(CALLS) == 4
+    assert (cache.stats["hits"], cache.stats["misses"], cache.stats["stores"]) == (1, 4, 4)
+    assert cache.hit_rate == 0.2
+
+    # Another build of bpy doesn't share entries
+    other_build = memo.ResultCache(cache.root, bpy_build_id="other")
+
+    assert other_build.key(thumbnail, [], [str(blend)]) != \
+           cache.key(thumbnail, [], [str(blend)])
+
+def test_evicts_least_recently_used(tmp_path):
+
+    cache = memo.ResultCache(str(tmp_path), size_limit=0, bpy_build_id="test")
+
+    cache.size_limit = 2500
+
+    for key in ["a", "b", "c"]:
+
+        cache.put(key, b"x" * 1000)
+
+    assert cache.entries() == ["b", "c"]
+    assert cache.stats["evictions"] == 1
+
+    assert cache.get("b") == (True, b"x" * 1000)
+
+    cache.put("d", b"x" * 1000)
+
+    assert cache.entries() == ["b", "d"]
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith(".")]
+
+    # A second store of the same key keeps the first
+    cache.put("d", b"y")
+
+    assert cache.get("d") == (True, b"x" * 1000)
+
+def test_scans_only_past_the_limit(tmp_path, monkeypatch):
+
+    cache = memo.ResultCache(str(tmp_path), bpy_build_id="test")
+
+    cache.size_limit = 2500
+
+    scans = []
+
+    scan = cache._scan
+
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+
+    for key in ["a", "b"]:
+
+        cache.put(key, b"x" * 1000)
+
+    # Once to learn the size, then not while what was stored fits
+    assert len(scans) == 1
+
+    cache.put("c", b"x" * 1000)
+
+    assert len(scans) == 2
+    assert cache.stats["evictions"] == 1
+
+def square(value):
+
+    return value * value
+
+def test_submit_skips_the_pool_on_hits(tmp_path, monkeypatch):
+
+    (tmp_path / "bpy_standin.py").write_text("")
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    cache = memo.ResultCache(str(tmp_path / "cache"), bpy_build_id="test")
+
+    with pool.WarmPool(workers=1, module="bpy_standin") as warm_pool:
+
+        assert cache.submit(warm_pool, square, 3).result() == 9
+
+        # Stored before the result is handed back
+        assert cache.submit(warm_pool, square, 3).result() == 9
+
+    assert warm_pool.stats["tasks"] == 1
+    assert cache.stats["hits"] == 1
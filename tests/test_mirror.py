@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the local mirror of the Blender sources, run against `file://`
+repositories so no network is needed
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from blenderpy.mirror import SourceMirror, SourceMirrorError,\
+                             path_to_url, resolve_submodule_url
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, 
+                                reason="git is not installed")
+
+def git(*args, cwd=None):
+
+    subprocess.check_call(["git", "-c", "user.name=test", "-c", "user.email=test@test",
+                           "-c", "protocol.file.allow=always"] + list(args), 
+                          cwd=cwd, stdout=subprocess.DEVNULL, 
+                          stderr=subprocess.DEVNULL)
+
+def make_repo(path, files):
+
+    os.makedirs(path)
+    git("init", "-q", path)
+
+    for name, content in files.items():
+
+        with open(os.path.join(path, name), "w") as _file:
+
+            _file.write(content)
+
+    git("add", "-A", cwd=path)
+    git("commit", "-q", "-m", "commit", cwd=path)
+
+@pytest.fixture
+def upstream(tmp_path):
+    """A `blender` repository with a relative `addons` submodule, tagged
+    """
+
+    addons = str(tmp_path / "upstream" / "addons.git")
+    blender = str(tmp_path / "upstream" / "blender.git")
+
+    make_repo(addons, {"addon.py": "pass"})
+    make_repo(blender, {"CMakeLists.txt": "project(blender)"})
+
+    git("submodule", "add", "../addons.git", "release/addons", cwd=blender)
+    git("commit", "-q", "-m", "add submodule", cwd=blender)
+    git("tag", "v2.93.0", cwd=blender)
+    git("tag", "v2.93.0", cwd=addons)
+
+    return path_to_url(blender)
+
+def test_resolve_submodule_url():
+
+    assert resolve_submodule_url("git://git.blender.org/blender.git",
+                                 "../blender-addons.git") == \
+           "git://git.blender.org/blender-addons.git"
+    assert resolve_submodule_url("git://a/b.git", "https://c/d.git") == "https://c/d.git"
+
+def test_checkout_from_mirror(tmp_path, upstream):
+
+    mirror = SourceMirror(str(tmp_path / "mirror"))
+
+    checkout = str(tmp_path / "checkout")
+
+    mirror.checkout_git(upstream, "v2.93.0", checkout)
+
+    assert os.path.isfile(os.path.join(checkout, "CMakeLists.txt"))
+    assert os.path.isfile(os.path.join(checkout, "release", "addons", "addon.py"))
+    assert os.path.isdir(mirror.git_mirror_path(upstream))
+
+def test_offline_uses_existing_mirror_only(tmp_path, upstream):
+
+    offline = SourceMirror(str(tmp_path / "mirror"), offline=True)
+
+    with pytest.raises(SourceMirrorError):
+
+        offline.checkout_git(upstream, "v2.93.0", str(tmp_path / "checkout"))
+
+    SourceMirror(str(tmp_path / "mirror")).checkout_git(upstream, "v2.93.0",
+                                                        str(tmp_path / "checkout"))
+
+    # The upstream going away must not matter once mirrored
+    shutil.rmtree(str(tmp_path / "upstream"))
+
+    offline.checkout_git(upstream, "v2.93.0", str(tmp_path / "checkout"))
+
+    assert os.path.isfile(str(tmp_path / "checkout" / "release" / "addons" / "addon.py"))
+
+@pytest.mark.skipif(shutil.which("svn") is None, reason="svn is not installed")
+def test_svn_checkout_is_linked(tmp_path):
+
+    repo = str(tmp_path / "svnrepo")
+
+    subprocess.check_call(["svnadmin", "create", repo])
+    subprocess.check_call(["svn", "mkdir", "-q", "-m", "lib", 
+                           path_to_url(repo) + "/lib"])
+
+    mirror = SourceMirror(str(tmp_path / "mirror"))
+
+    mirror.checkout_svn(path_to_url(repo), str(tmp_path / "checkout"))
+
+    assert not os.path.exists(str(tmp_path / "checkout" / ".svn"))
+
+def test_svn_checkout_keeps_symlinks(tmp_path, monkeypatch):
+
+    working_copy = tmp_path / "mirror" / "svn" / "lib"
+
+    (working_copy / ".svn").mkdir(parents=True)
+    (working_copy / "python" / "lib").mkdir(parents=True)
+    (working_copy / "python" / "lib" / "libpython.so.3.9").write_text("so")
+
+    os.symlink("libpython.so.3.9", str(working_copy / "python" / "lib" / "libpython.so"))
+    os.symlink("python", str(working_copy / "python3.9"))
+    os.symlink("missing", str(working_copy / "dangling"))
+
+    mirror = SourceMirror(str(tmp_path / "mirror"))
+
+    monkeypatch.setattr(mirror, "update_svn", lambda url: str(working_copy))
+
+    checkout = tmp_path / "checkout"
+
+    stats = mirror.checkout_svn("file:///lib", str(checkout))
+
+    # Made again as links, not followed into copies
+    assert os.readlink(str(checkout / "python" / "lib" / "libpython.so")) == \
+           "libpython.so.3.9"
+    assert os.readlink(str(checkout / "python3.9")) == "python"
+    assert os.readlink(str(checkout / "dangling")) == "missing"
+    assert not os.path.islink(str(checkout / "python" / "lib" / "libpython.so.3.9"))
+    assert not os.path.exists(str(checkout / ".svn"))
+
+    assert stats.methods["symlinked"] == 3
+
+    # Checked out again over the previous checkout
+    mirror.checkout_svn("file:///lib", str(checkout))
+
+    assert os.readlink(str(checkout / "python3.9")) == "python"
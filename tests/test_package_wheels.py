@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for reusing the result of `auditwheel repair` between wheels
+"""
+
+import os
+import sys
+import zipfile
+
+import pytest
+
+pytest.importorskip("wheel")
+
+from wheel.wheelfile import WheelFile
+
+from blenderpy import package_wheels
+from blenderpy.package_wheels import RepairCache, get_shared_libraries_key,\
+                                     retag_wheel_metadata
+
+def make_wheel(path, files, tag):
+
+    with WheelFile(str(path), "w") as wf:
+
+        for name, content in files.items():
+
+            wf.writestr(name, content)
+
+        wf.writestr("bpy-2.93a0.dist-info/METADATA", b"Name: bpy\nVersion: 2.93a0\n")
+        wf.writestr("bpy-2.93a0.dist-info/WHEEL",
+                    f"Wheel-Version: 1.0\nRoot-Is-Purelib: false\nTag: {tag}\n"
+                    .encode("utf-8"))
+
+    return str(path)
+
+def test_repair_cache(tmp_path):
+
+    files = {"bpy.so": b"\x7fELF needs libfoo", "addon.py": b"pass\n",
+             "bundled.so": b"\x7fELF unused"}
+
+    original = make_wheel(tmp_path / "bpy-2.93a0-cp37-cp37m-linux_x86_64.whl",
+                          files, "cp37-cp37m-linux_x86_64")
+
+    # What auditwheel would make of it
+    repaired = make_wheel(tmp_path / "bpy-2.93a0-cp37-cp37m-manylinux2014_x86_64.whl",
+                          {"bpy.so": b"\x7fELF needs libfoo-1a2b.so",
+                           "addon.py": b"pass\n",
+                           "bpy.libs/libfoo-1a2b.so": b"\x7fELF libfoo"},
+                          "cp37-cp37m-manylinux2014_x86_64")
+
+    other = make_wheel(tmp_path / "bpy-2.93a0-cp37-cp37dm-linux_x86_64.whl",
+                       files, "cp37-cp37dm-linux_x86_64")
+
+    key = get_shared_libraries_key(original, "manylinux2014_x86_64", "auditwheel 3")
+
+    assert get_shared_libraries_key(other, "manylinux2014_x86_64", "auditwheel 3") == key
+    assert get_shared_libraries_key(repaired, "manylinux2014_x86_64", "auditwheel 3") != key
+    assert get_shared_libraries_key(other, "manylinux2010_x86_64", "auditwheel 3") != key
+
+    cache = RepairCache(str(tmp_path / "cache"))
+
+    assert cache.load(key) is None
+
+    cache.store(key, original, repaired)
+
+    manifest = cache.load(key)
+
+    assert manifest["platform"] == "manylinux2014_x86_64"
+    assert sorted(manifest["files"]) == ["bpy.libs/libfoo-1a2b.so", "bpy.so"]
+    assert manifest["removed"] == ["bundled.so"]
+
+    result = cache.apply(key, other, str(tmp_path / "wheelhouse"))
+
+    assert os.path.basename(result) == "bpy-2.93a0-cp37-cp37dm-manylinux2014_x86_64.whl"
+
+    # Reading through WheelFile checks every file against RECORD
+    with WheelFile(result) as wf:
+
+        contents = {name: wf.read(name) for name in wf.namelist()}
+
+    assert contents["bpy.so"] == b"\x7fELF needs libfoo-1a2b.so"
+    assert contents["bpy.libs/libfoo-1a2b.so"] == b"\x7fELF libfoo"
+    assert contents["addon.py"] == b"pass\n"
+    assert "bundled.so" not in contents
+    assert b"Tag: cp37-cp37dm-manylinux2014_x86_64\n" in \
+           contents["bpy-2.93a0.dist-info/WHEEL"]
+
+    assert zipfile.ZipFile(result).namelist()[-1] == "bpy-2.93a0.dist-info/RECORD"
+
+def test_retag_wheel_metadata():
+
+    assert retag_wheel_metadata(b"Wheel-Version: 1.0\nTag: cp37-cp37m-linux_x86_64\n",
+                                "manylinux_2_17_x86_64.manylinux2014_x86_64") == \
+           (b"Wheel-Version: 1.0\nTag: cp37-cp37m-manylinux_2_17_x86_64\n"
+            b"Tag: cp37-cp37m-manylinux2014_x86_64\n")
+
+def test_without_wheel(monkeypatch):
+
+    # As in a plain virtual environment, which `bpy` alone doesn't need it in
+    monkeypatch.setitem(sys.modules, "wheel.wheelfile", None)
+
+    with pytest.raises(package_wheels.PackageWheelsError, match="pip install wheel"):
+
+        package_wheels._import_wheel_file()
+
+    with pytest.raises(SystemExit, match="pip install wheel"):
+
+        package_wheels.main(["source", "--bpy-prebuilt", "prebuilt"])
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the warm worker pool, with a stand-in module in place of `bpy`
+"""
+
+import concurrent.futures
+import os
+import time
+
+import pytest
+
+from blenderpy import importer, pool
+
+STANDIN_MODULE = """
+import os
+import time
+
+STARTED_AT = time.time()
+
+def initialize(value):
+
+    global INITIALIZED
+
+    INITIALIZED = value
+"""
+
+ADDONS_BPY = """
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "2.93", "scripts", "addons"))
+"""
+
+CRASHING_MODULE = """
+import os
+
+os._exit(1)
+"""
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+
+    (tmp_path / "bpy_standin.py").write_text(STANDIN_MODULE)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    return "bpy_standin"
+
+def initialize(value):
+
+    pool.get_module().initialize(value)
+
+def describe(_):
+
+    module = pool.get_module()
+
+    return os.getpid(), module.__name__, module.STARTED_AT, module.INITIALIZED
+
+def recycle_after(item):
+
+    if item == 1:
+
+        pool.request_recycle()
+
+    return os.getpid()
+
+def get_sys_path(_):
+
+    import sys
+
+    return list(sys.path)
+
+def crash():
+
+    os._exit(3)
+
+def fail():
+
+    raise ValueError("task failed")
+
+def test_fix_sys_path():
+
+    scripts = os.path.join("venv", "lib", "site-packages", "2.93", "scripts")
+
+    assert pool.fix_sys_path(["", "site-packages", os.path.join(scripts, "modules"),
+                              "site-packages", os.path.join(scripts, "startup"),
+                              os.path.join("site-packages", "2.93")]) == \
+           ["", "site-packages", os.path.join("site-packages", "2.93")]
+
+def test_imports_once_per_worker(standin):
+
+    with pool.WarmPool(workers=2, module=standin, initializer=initialize,
+                       initargs=("warm",)) as warm_pool:
+
+        results = list(warm_pool.map(describe, range(20)))
+
+        health = warm_pool.health()
+
+    assert all(name == standin and initialized == "warm" for
+               _, name, _, initialized in results)
+
+    # One import per worker, however many tasks each ran
+    assert len({(pid, started_at) for pid, _, started_at, _ in results}) <= 2
+    assert warm_pool.stats["tasks"] == 20
+    assert health["workers"] == 2 and health["pending"] == 0 and health["busy"] == 0
+    assert health["stats"]["tasks"] == 20 and not health["broken"]
+
+def test_recycles_after_max_tasks(standin):
+
+    with pool.WarmPool(workers=1, module=standin, initializer=initialize,
+                       initargs=(None,), max_tasks=2) as warm_pool:
+
+        pids = [pid for pid, _, _, _ in warm_pool.map(describe, range(6))]
+
+    assert len(set(pids)) == 3
+    assert pids[0] == pids[1] and pids[2] == pids[3] and pids[4] == pids[5]
+    assert warm_pool.stats["workers_recycled"] == 3
+
+def test_recycles_past_max_rss(standin):
+
+    with pool.WarmPool(workers=1, module=standin, initializer=initialize,
+                       initargs=(None,), max_rss=1) as warm_pool:
+
+        pids = [pid for pid, _, _, _ in warm_pool.map(describe, range(3))]
+
+    assert len(set(pids)) == 3
+
+def test_recycles_on_request(standin):
+
+    with pool.WarmPool(workers=1, module=standin, initializer=initialize,
+                       initargs=(None,)) as warm_pool:
+
+        pids = list(warm_pool.map(recycle_after, range(4)))
+
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+    assert warm_pool.stats["workers_recycled"] == 1
+
+def test_errors(standin):
+
+    with pool.WarmPool(workers=1, module=standin, initializer=initialize,
+                       initargs=(None,)) as warm_pool:
+
+        with pytest.raises(ValueError):
+
+            warm_pool.submit(fail).result()
+
+        with pytest.raises(pool.WorkerError):
+
+            warm_pool.submit(crash).result()
+
+        timed_out = warm_pool._submit(pool._Task(time.sleep, (30,), {}, timeout=0.5))
+
+        with pytest.raises(concurrent.futures.TimeoutError):
+
+            timed_out.result()
+
+        # The pool replaced the workers and carries on
+        assert warm_pool.submit(describe, 0).result()[1] == standin
+
+    assert warm_pool.stats["workers_crashed"] == 1
+    assert warm_pool.stats["tasks_timed_out"] == 1
+
+def test_broken_without_module():
+
+    warm_pool = pool.WarmPool(workers=1, module="not_a_module_anywhere")
+
+    with pytest.raises(pool.PoolBrokenError):
+
+        warm_pool.submit(describe, 0).result()
+
+    warm_pool.shutdown()
+
+def test_broken_when_workers_die_on_import(tmp_path, monkeypatch):
+
+    (tmp_path / "bpy_crashing.py").write_text(CRASHING_MODULE)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    warm_pool = pool.WarmPool(workers=2, module="bpy_crashing")
+
+    with pytest.raises(pool.PoolBrokenError):
+
+        warm_pool.submit(describe, 0).result(timeout=60)
+
+    warm_pool.shutdown()
+
+    # Given up on after a few, rather than restarted forever
+    assert warm_pool.stats["workers_started"] <= pool.MAX_STARTUP_CRASHES + 2
+
+def test_broken_when_manager_fails(standin):
+
+    warm_pool = pool.WarmPool(workers=1, module=standin, initializer=initialize,
+                              initargs=(None,))
+
+    warm_pool.wait_ready(timeout=60)
+
+    def start_worker():
+
+        raise OSError("can't start a worker")
+
+    warm_pool._start_worker = start_worker
+
+    crashed = warm_pool.submit(crash)
+    pending = warm_pool.submit(describe, 0)
+
+    with pytest.raises(pool.WorkerError):
+
+        crashed.result(timeout=60)
+
+    with pytest.raises(pool.PoolBrokenError):
+
+        pending.result(timeout=60)
+
+    with pytest.raises(pool.PoolBrokenError):
+
+        warm_pool.submit(describe, 0)
+
+    warm_pool.shutdown()
+
+    assert warm_pool.stats["manager_errors"] == 1
+
+@pytest.mark.parametrize("defer_addons", [False, True])
+def test_defer_addons(tmp_path, monkeypatch, defer_addons):
+
+    (tmp_path / "bpy.py").write_text(ADDONS_BPY)
+
+    for folder in ("datafiles", "scripts/addons", "scripts/startup"):
+
+        (tmp_path / "2.93" / folder).mkdir(parents=True)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(importer, "REPORT", importer.ImportReport())
+    monkeypatch.setenv(importer.SCRIPTS_DIR_ENV, str(tmp_path / "2.93"))
+
+    with pool.WarmPool(workers=1, module="bpy", defer_addons=defer_addons) as warm_pool:
+
+        sys_path = warm_pool.submit(get_sys_path, 0).result()
+
+    # Only taken off `sys.path` when asked to
+    assert (str(tmp_path / "2.93" / "scripts" / "addons") in sys_path) != defer_addons
+
+    # Built from the scripts directory the pool handed over
+    assert str(tmp_path / "2.93" / "scripts" / "startup") in sys_path
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the packed resource bundle
+"""
+
+import concurrent.futures
+import os
+
+import pytest
+
+import blenderpy
+from blenderpy import resources
+
+@pytest.fixture
+def version_dir(tmp_path):
+
+    root = tmp_path / "source" / "2.93"
+
+    (root / "datafiles" / "fonts").mkdir(parents=True)
+    (root / "scripts" / "startup").mkdir(parents=True)
+    (root / "scripts" / "addons").mkdir(parents=True)
+
+    (root / "datafiles" / "fonts" / "font.ttf").write_bytes(os.urandom(5000))
+    (root / "scripts" / "startup" / "startup.py").write_text("print('startup')\n" * 100)
+
+    return root
+
+def test_bundle(version_dir, tmp_path):
+
+    bundle_path = str(tmp_path / "2.93.bpypack")
+
+    stats = resources.write_bundle(str(version_dir), bundle_path)
+
+    assert (stats["files"], stats["compressed"]) == (2, 1)
+
+    with resources.ResourceBundle(bundle_path, str(tmp_path / "cache")) as bundle:
+
+        assert bundle.name == "2.93"
+        assert bundle.listdir() == ["datafiles", "scripts"]
+        assert bundle.listdir("scripts") == ["addons", "startup"]
+        assert bundle.listdir("scripts/addons") == []
+        assert bundle.isdir("datafiles/fonts")
+        assert bundle.isfile("scripts/startup/startup.py")
+
+        font = (version_dir / "datafiles" / "fonts" / "font.ttf").read_bytes()
+
+        # Stored as is, so mapped straight from the bundle
+        assert bytes(bundle.view("datafiles/fonts/font.ttf")) == font
+        assert bundle.read("scripts/startup/startup.py") == \
+               (version_dir / "scripts" / "startup" / "startup.py").read_bytes()
+
+        with pytest.raises(resources.BundleError):
+
+            bundle.view("scripts/startup/startup.py")
+
+        with pytest.raises(resources.BundleError):
+
+            bundle.read("missing")
+
+        # One file at a time, on first use
+        path = bundle.extract("datafiles/fonts/font.ttf")
+
+        assert path.startswith(bundle.cache_dir)
+        assert open(path, "rb").read() == font
+        assert not bundle.is_extracted()
+
+def test_install_bundle(version_dir, tmp_path):
+
+    scripts_dir = tmp_path / "bin"
+    scripts_dir.mkdir()
+
+    bundle_path = str(scripts_dir / "2.93.bpypack")
+
+    resources.write_bundle(str(version_dir), bundle_path)
+
+    assert resources.find_bundles(str(scripts_dir)) == [bundle_path]
+
+    cache_root = str(tmp_path / "cache")
+
+    # Processes installing at the same time share one extraction
+    with concurrent.futures.ProcessPoolExecutor(4) as executor:
+
+        roots = list(executor.map(extract_all, [bundle_path] * 4, [cache_root] * 4))
+
+    assert len(set(roots)) == 1
+
+    install_dir = tmp_path / "site-packages"
+    install_dir.mkdir()
+
+    installed = resources.install_bundle(bundle_path, str(install_dir), cache_root)
+
+    assert os.path.islink(installed)
+    assert blenderpy.is_blender_scripts_directory(installed)
+    assert os.listdir(os.path.join(installed, "scripts", "addons")) == []
+    assert sorted(name for name in os.listdir(roots[0]) if name.startswith(".")) == \
+           [resources.COMPLETE_MARKER, resources.LINKS_DIR_NAME]
+
+def extract_all(bundle_path, cache_root):
+
+    with resources.ResourceBundle(bundle_path, cache_root) as bundle:
+
+        return bundle.extract_all()
+
+def test_install_and_uninstall(version_dir, tmp_path, monkeypatch):
+
+    monkeypatch.delenv("BPY_RESOURCE_CACHE", raising=False)
+
+    bundle_path = str(tmp_path / "2.93.bpypack")
+
+    resources.write_bundle(str(version_dir), bundle_path)
+
+    # Extracted under the install's own prefix by default
+    install_dir = tmp_path / "prefix" / "site-packages"
+    install_dir.mkdir(parents=True)
+
+    installed = resources.install_bundle(bundle_path, str(install_dir))
+
+    cache_root = str(install_dir / resources.INSTALL_CACHE_DIR_NAME)
+
+    assert os.path.realpath(installed).startswith(os.path.realpath(cache_root))
+
+    resources.uninstall_bundle(installed)
+
+    assert os.listdir(str(install_dir)) == []
+
+    # A cache shared by two installs goes with the last of them
+    shared_root = str(tmp_path / "shared")
+    installs = [str(tmp_path / name) for name in ("one", "two")]
+
+    for install in installs:
+
+        os.mkdir(install)
+
+        resources.install_bundle(bundle_path, install, shared_root)
+
+    resources.uninstall_bundle(os.path.join(installs[0], "2.93"))
+
+    assert blenderpy.is_blender_scripts_directory(os.path.join(installs[1], "2.93"))
+
+    resources.uninstall_bundle(os.path.join(installs[1], "2.93"))
+
+    assert os.listdir(shared_root) == []
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for routing jobs to the workers that have their `.blend` loaded,
+with a fake loader in place of `bpy`
+"""
+
+import concurrent.futures
+import os
+import queue
+import time
+
+import pytest
+
+from blenderpy import scheduler
+
+class FakeLoader():
+    """Stands in for `BpyBlendLoader`, counting what it does
+    """
+
+    def __init__(self, module):
+
+        self.module = module
+
+        self.loads = []
+        self.unloads = []
+        self.resets = 0
+
+    def load(self, path):
+
+        self.loads.append(path)
+
+        return scheduler.LoadedBlend(path, {path})
+
+    def prepare(self, blend):
+
+        pass
+
+    def reset(self, blend):
+
+        self.resets += 1
+
+    def unload(self, blend):
+
+        self.unloads.append(blend.path)
+
+def describe(blend, delay=0):
+
+    time.sleep(delay)
+
+    loader = scheduler._blend_cache.loader
+
+    return os.getpid(), blend.path, len(loader.loads), time.monotonic()
+
+def fail(blend):
+
+    raise ValueError(blend.path)
+
+@pytest.fixture
+def blends(tmp_path):
+
+    paths = []
+
+    for name in ["a.blend", "b.blend", "c.blend"]:
+
+        (tmp_path / name).write_bytes(b"BLENDER")
+
+        paths.append(str(tmp_path / name))
+
+    return paths
+
+def test_router():
+
+    router = scheduler.AffinityRouter(cache_size=2)
+
+    assert router.route("a", ["w1", "w2"]) == "w1"
+    assert router.record("w1", "a") == (False, None)
+
+    # Goes where it's loaded, or waits for it while asked to
+    assert router.route("a", ["w2", "w1"]) == "w1"
+    assert router.route("a", ["w2"], wait_for_holder=True) is None
+    assert router.route("a", ["w2"]) == "w2"
+
+    router.record("w2", "c")
+    router.record("w2", "d")
+    router.record("w1", "b")
+    router.record("w1", "a")
+
+    # Both are full; w2's least recently used file is older than w1's
+    assert router.route("e", ["w1", "w2"]) == "w2"
+    assert router.record("w2", "e") == (False, "c")
+    assert router.record("w2", "e") == (True, None)
+
+    assert router.stats == {"hits": 2, "misses": 5, "evictions": 1}
+
+    router.forget("w2")
+
+    assert router.holders("e") == []
+
+def test_router_changed_file():
+
+    router = scheduler.AffinityRouter(cache_size=2)
+
+    assert router.record("w1", "a", 1.0) == (False, None)
+    assert router.record("w1", "a", 1.0) == (True, None)
+
+    # Loaded again by the worker, as its `BlendCache` does
+    assert router.record("w1", "a", 2.0) == (False, None)
+    assert router.record("w1", "a", 2.0) == (True, None)
+
+    assert router.stats == {"hits": 2, "misses": 2}
+    assert router.holders("a") == ["w1"]
+
+def test_blend_cache(blends):
+
+    cache = scheduler.BlendCache(FakeLoader(None), size=2)
+
+    assert cache.get(blends[0])[1] is False
+    assert cache.get(blends[1])[1] is False
+    assert cache.get(blends[0])[1] is True
+
+    cache.get(blends[2])
+
+    assert cache.paths == [blends[0], blends[2]]
+    assert cache.loader.unloads == [blends[1]]
+
+    # Changed on disk since it was loaded
+    os.utime(blends[0], (0, 0))
+
+    assert cache.get(blends[0])[1] is False
+    assert cache.loader.loads == [blends[0], blends[1], blends[2], blends[0]]
+
+def make_scheduler(**kwargs):
+
+    job_scheduler = scheduler.BlendScheduler(module="json", loader_factory=FakeLoader,
+                                             **kwargs)
+
+    assert job_scheduler.wait_ready(timeout=30)
+
+    return job_scheduler
+
+def test_affinity(blends):
+
+    with make_scheduler(workers=2, cache_size=1, affinity_wait=30) as job_scheduler:
+
+        futures = [job_scheduler.submit_job(blends[index % 2], describe)
+                   for index in range(20)]
+
+        results = [future.result() for future in futures]
+
+        metrics = job_scheduler.metrics()
+
+    # Each file loaded once, always on the same worker
+    assert len({(pid, path) for pid, path, _, _ in results}) == 2
+    assert max(loads for _, _, loads, _ in results) == 1
+
+    assert metrics["cache_misses"] == 2
+    assert metrics["cache_hits"] == 18
+    assert metrics["cache_evictions"] == 0
+
+def test_map(blends):
+
+    with make_scheduler(workers=2) as job_scheduler:
+
+        results = list(job_scheduler.map(describe, blends, [0, 0.1, 0]))
+
+        # Plain calls have no file to run on
+        with pytest.raises(TypeError):
+
+            job_scheduler.submit(describe)
+
+    assert [path for _, path, _, _ in results] == blends
+
+def test_priority_timeout_and_backpressure(blends):
+
+    with make_scheduler(workers=1, max_pending=2) as job_scheduler:
+
+        blocker = job_scheduler.submit_job(blends[0], describe, (0.5,))
+
+        time.sleep(0.2) # running, so not queued
+
+        low = job_scheduler.submit_job(blends[0], describe, priority=0)
+        high = job_scheduler.submit_job(blends[0], describe, priority=5)
+
+        with pytest.raises(queue.Full):
+
+            job_scheduler.submit_job(blends[0], describe, block=False)
+
+        assert high.result()[3] < low.result()[3]
+
+        blocker.result()
+
+        with pytest.raises(concurrent.futures.TimeoutError):
+
+            job_scheduler.submit_job(blends[1], describe, (30,), timeout=0.5).result()
+
+        with pytest.raises(ValueError):
+
+            job_scheduler.submit_job(blends[2], fail).result()
+
+        # Neither file is loaded anywhere any longer
+        assert job_scheduler.router.holders(os.path.abspath(blends[1])) == []
+        assert job_scheduler.router.holders(os.path.abspath(blends[2])) == []
+
+        assert job_scheduler.submit_job(blends[0], describe).result()[1] == blends[0]
+
+        assert job_scheduler.metrics()["tasks_timed_out"] == 1
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for locating the Blender scripts directory
+"""
+
+import json
+import os
+
+import blenderpy
+
+def make_scripts_dir(parent, name="2.93"):
+
+    scripts_dir = os.path.join(str(parent), name)
+
+    for entry in ["datafiles", "scripts"]:
+
+        os.makedirs(os.path.join(scripts_dir, entry))
+
+    return scripts_dir
+
+def test_finds_scripts_dir_in_site_packages(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(blenderpy, "BLENDER_SCRIPTS_INDEX_PATH",
+                        str(tmp_path / "index.json"))
+
+    site_packages = tmp_path / "venv" / "lib" / "python3.7" / "site-packages"
+    os.makedirs(str(site_packages / "numpy" / "core"))
+    scripts_dir = make_scripts_dir(site_packages)
+
+    assert blenderpy.find_blender_scripts_directory(str(tmp_path)) == scripts_dir
+
+def test_search_is_depth_limited(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(blenderpy, "BLENDER_SCRIPTS_INDEX_PATH",
+                        str(tmp_path / "index.json"))
+
+    make_scripts_dir(tmp_path / "a" / "b" / "c")
+
+    assert blenderpy.search_blender_scripts_directory(str(tmp_path), 
+                                                      max_depth=3) is None
+    assert blenderpy.search_blender_scripts_directory(str(tmp_path), 
+                                                      max_depth=4) is not None
+
+def test_search_survives_symlink_cycles(tmp_path):
+
+    os.makedirs(str(tmp_path / "a"))
+    os.symlink(str(tmp_path), str(tmp_path / "a" / "loop"))
+
+    assert blenderpy.search_blender_scripts_directory(str(tmp_path)) is None
+
+def test_index_is_used_and_stale_index_falls_back(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(blenderpy, "BLENDER_SCRIPTS_INDEX_PATH",
+                        str(tmp_path / "index.json"))
+
+    indexed_dir = make_scripts_dir(tmp_path / "indexed")
+    searched_dir = make_scripts_dir(tmp_path / "other" / "deeper")
+
+    blenderpy.write_blender_scripts_index(indexed_dir)
+
+    assert blenderpy.find_blender_scripts_directory(str(tmp_path)) == indexed_dir
+
+    # Outside the search root the index does not apply
+    assert blenderpy.find_blender_scripts_directory(str(tmp_path / "other")) == searched_dir
+
+    with open(str(tmp_path / "index.json"), "w") as index_file:
+
+        json.dump({"scripts_dir": str(tmp_path / "gone" / "2.93")}, index_file)
+
+    assert blenderpy.read_blender_scripts_index() is None
+    assert blenderpy.find_blender_scripts_directory(str(tmp_path)) in [indexed_dir, 
+                                                                       searched_dir]
+
+    blenderpy.remove_blender_scripts_index()
+
+    assert not os.path.exists(str(tmp_path / "index.json"))
+
+def test_post_install_and_pre_uninstall_round_trip(tmp_path, monkeypatch):
+
+    from blenderpy import post_install, pre_uninstall
+
+    monkeypatch.setattr(blenderpy, "BLENDER_SCRIPTS_INDEX_PATH",
+                        str(tmp_path / "index.json"))
+    monkeypatch.setattr(blenderpy, "BLENDER_SCRIPTS_MANIFEST_PATH",
+                        str(tmp_path / "manifest.txt"))
+
+    scripts_root = tmp_path / "prefix" / "bin"
+    site_packages = tmp_path / "prefix" / "lib" / "site-packages"
+
+    os.makedirs(str(site_packages))
+
+    scripts_dir = make_scripts_dir(scripts_root)
+
+    with open(os.path.join(scripts_dir, "scripts", "addon.py"), "w") as _file:
+
+        _file.write("pass")
+
+    for module in [post_install, pre_uninstall]:
+
+        monkeypatch.setattr(module, "get_python_scripts_directory",
+                            lambda: str(tmp_path / "prefix"))
+        monkeypatch.setattr(module, "get_blender_scripts_install_dir",
+                            lambda: str(site_packages))
+
+    post_install.install_scripts_directory()
+
+    assert blenderpy.read_blender_scripts_index() == str(site_packages / "2.93")
+    assert blenderpy.read_blender_scripts_manifest() == [os.path.join("scripts", "addon.py")]
+
+    pre_uninstall.pre_uninstall()
+
+    assert os.listdir(str(site_packages)) == []
+    assert blenderpy.read_blender_scripts_index() is None
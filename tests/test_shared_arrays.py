@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for sharing arrays between a worker and its parent, with a fake
+collection in place of `bpy`'s
+"""
+
+import os
+
+import numpy
+import pytest
+
+from blenderpy import pool, shared_arrays
+
+class FakeCollection():
+    """Has `foreach_get` and `foreach_set` over a float property like `co`
+    """
+
+    def __init__(self, values):
+
+        self.values = numpy.asarray(values, dtype=numpy.float32)
+
+    def __len__(self):
+
+        return len(self.values)
+
+    def foreach_get(self, attribute, buffer):
+
+        buffer[:] = self.values.reshape(-1)
+
+    def foreach_set(self, attribute, buffer):
+
+        self.values = numpy.array(buffer, dtype=numpy.float32).reshape(self.values.shape)
+
+def get_coordinates(arena, count):
+
+    collection = FakeCollection(numpy.arange(count * 3).reshape(count, 3))
+
+    return arena.foreach_get(collection, "co", 3)
+
+def set_coordinates(arena, handle):
+
+    collection = FakeCollection(numpy.zeros(handle.shape))
+
+    arena.foreach_set(collection, "co", handle)
+
+    return float(collection.values.sum())
+
+def crash(arena):
+
+    arena.create((10,))
+
+    os._exit(3)
+
+def test_round_trip(tmp_path):
+
+    with shared_arrays.ArrayArena(str(tmp_path)) as arena, \
+         pool.WarmPool(workers=1, module="json") as warm_pool:
+
+        handle = warm_pool.submit(get_coordinates, arena, 1000).result()
+
+        assert handle.shape == (1000, 3)
+
+        coordinates = arena.attach(handle, release=True)
+
+        assert not os.path.exists(handle.path)
+        assert coordinates[999].tolist() == [2997, 2998, 2999]
+
+        handle = arena.from_array(coordinates * 2)
+
+        assert warm_pool.submit(set_coordinates, arena, handle).result() == \
+               float(coordinates.sum() * 2)
+
+        with pytest.raises(pool.WorkerError):
+
+            warm_pool.submit(crash, arena).result()
+
+        # Left behind by the worker until the arena goes
+        assert len(os.listdir(arena.path)) == 2
+
+    assert not os.path.exists(arena.path)
+
+    # Mapped views outlive the arena
+    assert coordinates.sum() == sum(range(3000))
+
+def test_remove_stale_arenas(tmp_path):
+
+    os.makedirs(str(tmp_path / f"{shared_arrays.ARENA_PREFIX}999999999-x"))
+
+    arena = shared_arrays.ArrayArena(str(tmp_path))
+
+    assert os.listdir(str(tmp_path)) == [os.path.basename(arena.path)]
+
+    arena.close()
+
+def test_stale_arenas_on_windows_never_kill(tmp_path, monkeypatch):
+
+    os.makedirs(str(tmp_path / f"{shared_arrays.ARENA_PREFIX}1234-x"))
+    os.makedirs(str(tmp_path / f"{shared_arrays.ARENA_PREFIX}5678-x"))
+
+    def kill(pid, signum):
+
+        raise AssertionError("os.kill terminates processes on Windows")
+
+    monkeypatch.setattr(shared_arrays.sys, "platform", "win32")
+    monkeypatch.setattr(shared_arrays.os, "kill", kill)
+    monkeypatch.setattr(shared_arrays, "_windows_pid_exists", lambda pid: pid == 1234)
+
+    assert shared_arrays.remove_stale_arenas(str(tmp_path)) == 1
+
+    assert os.listdir(str(tmp_path)) == [f"{shared_arrays.ARENA_PREFIX}1234-x"]
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Tests for the parallel wheel writer, compared against `WheelFile`
+"""
+
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("wheel")
+
+from wheel.wheelfile import WheelFile
+
+from blenderpy import wheel_writer
+
+def make_wheel_tree(root):
+
+    files = {os.path.join("bpy-2.93.dist-info", "METADATA"): b"Name: bpy\n",
+             os.path.join("bpy-2.93.dist-info", "WHEEL"): b"Wheel-Version: 1.0\n",
+             "bpy.so": os.urandom(4096),
+             "big.dat": b"0123456789" * 2000,
+             os.path.join("bpy-2.93.data", "scripts", "2.93", "addon.py"): b"pass\n" * 1000,
+             os.path.join("bpy-2.93.data", "scripts", "2.93", "icon.png"): b"\x89PNG" * 1000}
+
+    for path, content in files.items():
+
+        os.makedirs(os.path.dirname(os.path.join(str(root), path)), exist_ok=True)
+
+        with open(os.path.join(str(root), path), "wb") as _file:
+
+            _file.write(content)
+
+def write_wheel(wheel_file, root, path):
+
+    with wheel_file(path, "w") as wf:
+
+        wf.write_files(str(root))
+
+    return zipfile.ZipFile(path)
+
+def test_matches_wheelfile(tmp_path, monkeypatch):
+
+    # Stream the largest file to cover both ways of writing
+    monkeypatch.setattr(wheel_writer, "STREAM_SIZE", 16384)
+
+    make_wheel_tree(tmp_path / "tree")
+
+    expected = write_wheel(WheelFile, tmp_path / "tree",
+                           str(tmp_path / "bpy-2.93-cp37-cp37m-linux_x86_64.whl"))
+
+    os.makedirs(str(tmp_path / "parallel"))
+
+    actual = write_wheel(wheel_writer.make_wheel_file_factory(workers=2), 
+                         tmp_path / "tree",
+                         str(tmp_path / "parallel" / "bpy-2.93-cp37-cp37m-linux_x86_64.whl"))
+
+    assert actual.testzip() is None
+    assert actual.namelist() == expected.namelist()
+
+    for name in expected.namelist():
+
+        assert actual.read(name) == expected.read(name)
+
+    infos = {info.filename: info for info in actual.infolist()}
+
+    assert infos["bpy-2.93.data/scripts/2.93/icon.png"].compress_type == zipfile.ZIP_STORED
+    assert infos["bpy-2.93.data/scripts/2.93/addon.py"].compress_type == zipfile.ZIP_DEFLATED
+    assert infos["bpy.so"].compress_type == zipfile.ZIP_STORED
+    assert infos["big.dat"].compress_type == zipfile.ZIP_DEFLATED
+
+    # Reading through WheelFile checks every file against RECORD
+    with WheelFile(str(tmp_path / "parallel" / "bpy-2.93-cp37-cp37m-linux_x86_64.whl")) as wf:
+
+        for name in wf.namelist():
+
+            wf.read(name)
+
+def test_zip64_entries(tmp_path, monkeypatch):
+
+    tree = tmp_path / "tree"
+
+    make_wheel_tree(tree)
+
+    path = str(tmp_path / "bpy-2.93-cp37-cp37m-linux_x86_64.whl")
+
+    # Entries past the limit need the zip64 extra field; a low limit gives
+    # them without writing gigabytes
+    with monkeypatch.context() as patch:
+
+        patch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+
+        write_wheel(wheel_writer.make_wheel_file_factory(workers=2), tree, path).close()
+
+    with zipfile.ZipFile(path) as archive:
+
+        assert archive.testzip() is None
+
+        info = archive.getinfo("bpy.so")
+
+        # The zip64 extra field's tag
+        assert info.extra[:2] == b"\x01\x00"
+
+        with open(str(tree / "bpy.so"), "rb") as _file:
+
+            assert archive.read("bpy.so") == _file.read()
+
+    with WheelFile(path) as wf:
+
+        for name in wf.namelist():
+
+            wf.read(name)